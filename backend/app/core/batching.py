@@ -0,0 +1,135 @@
+# Dynamic micro-batching for single-row inference.
+# Concurrent requests for the same key (model id) are collected for a short
+# window, scored as one matrix in a worker thread, and the results fanned back
+# out to the waiting requests.
+import asyncio
+import bisect
+import logging
+import os
+import threading
+import time
+
+BATCHING_ENABLED = os.getenv("INSIGHTLENS_PREDICT_BATCHING", "0") == "1"
+BATCH_WINDOW_MS = float(os.getenv("INSIGHTLENS_BATCH_WINDOW_MS", "5"))
+BATCH_MAX_ROWS = int(os.getenv("INSIGHTLENS_BATCH_MAX_ROWS", "64"))
+
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram:
+    """
+    Cumulative fixed-bucket histogram (Prometheus semantics: `le` upper bounds).
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative, running = {}, 0
+        for bound, count in zip(self.buckets + ("+Inf",), counts):
+            running += count
+            cumulative[str(bound)] = running
+        return {"buckets": cumulative, "count": running, "sum": total}
+
+
+class MicroBatcher:
+    """
+    `score_fn(key, rows)` runs in a worker thread and must return one result per row.
+    A batch is flushed after `window_ms` or as soon as it holds `max_rows` rows.
+    """
+
+    def __init__(self, score_fn, window_ms=BATCH_WINDOW_MS, max_rows=BATCH_MAX_ROWS):
+        self.score_fn = score_fn
+        self.window = window_ms / 1000.0
+        self.max_rows = max_rows
+        self.latency_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.batch_size = Histogram(BATCH_SIZE_BUCKETS)
+        self._pending = {}
+        self._timers = {}
+        self._tasks = set() # Running batches: the loop only keeps weak references to tasks
+
+    async def submit(self, key, row):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.setdefault(key, [])
+        batch.append((row, future, time.perf_counter()))
+
+        if len(batch) >= self.max_rows:
+            self._flush(key)
+        elif len(batch) == 1:
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+        return await future
+
+    def _flush(self, key):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, None)
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(key, batch))
+            self._tasks.add(task)
+            task.add_done_callback(lambda t: self._batch_done(t, batch))
+
+    def _batch_done(self, task, batch):
+        self._tasks.discard(task)
+        if task.cancelled() or task.exception() is None:
+            return
+        # A failure outside scoring (scoring errors are per-row results): fail the waiting
+        # requests instead of leaving them pending forever
+        error = task.exception()
+        logger.error("Prediction batch failed", exc_info=error)
+        for _, future, _ in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    async def _run(self, key, batch):
+        rows = [row for row, _, _ in batch]
+        self.batch_size.observe(len(rows))
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(None, self.score_fn, key, rows)
+        except Exception:
+            # One bad row must not fail its neighbours: rescore rows one by one
+            results = await loop.run_in_executor(None, self._score_each, key, rows)
+
+        now = time.perf_counter()
+        for (_, future, enqueued), result in zip(batch, results):
+            self.latency_ms.observe((now - enqueued) * 1000.0)
+            if future.done(): # Caller went away (e.g. request cancelled)
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _score_each(self, key, rows):
+        results = []
+        for row in rows:
+            try:
+                results.append(self.score_fn(key, [row])[0])
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def stats(self):
+        return {
+            "window_ms": self.window * 1000.0,
+            "max_rows": self.max_rows,
+            "latency_ms": self.latency_ms.snapshot(),
+            "batch_size": self.batch_size.snapshot(),
+        }
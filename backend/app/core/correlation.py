@@ -0,0 +1,196 @@
+# Correlation engine for wide datasets.
+# Pearson correlations are computed on standardised float32 columns, one block of
+# columns against another with BLAS matrix products, so the columns x columns matrix
+# never has to exist at once: the strongest pairs are kept with a running partial
+# selection (argpartition). Missing values use pairwise-complete observations like
+# DataFrame.corr. An optional row sample trades accuracy for speed and reports 95%
+# error bounds. Results are cached per dataset version in the store.
+import os
+import threading
+import warnings
+from collections import defaultdict
+from statistics import NormalDist
+import numpy as np
+from app.core.store import DATASETS
+from app.core.metrics import stage
+
+BLOCK_COLUMNS = int(os.getenv("INSIGHTLENS_CORR_BLOCK_COLUMNS", "256"))
+STANDARDIZE_BLOCK_COLUMNS = 32 # float64 working set while converting to float32
+# Widest dataset whose full matrix is served (and cached); top pairs have no limit
+MAX_MATRIX_COLUMNS = int(os.getenv("INSIGHTLENS_CORR_MAX_MATRIX_COLUMNS", "500"))
+MAX_TOP_K = 100 # Pairs kept per cached result; requests slice it
+MATRIX_DECIMALS = 4
+Z_95 = 1.959964
+SAMPLE_SEED = 42
+
+_locks = defaultdict(threading.Lock)
+
+
+def _standardize(df, block_columns=STANDARDIZE_BLOCK_COLUMNS):
+    """
+    float32 matrix of the columns centred and scaled (on their observed values),
+    missing entries set to 0, plus the observed-value mask (None without NaNs).
+    Converted a few columns at a time: no float64 copy of the whole frame.
+    """
+    rows, p = df.shape
+    Z = np.empty((rows, p), dtype=np.float32)
+    M = None
+    for start in range(0, p, block_columns):
+        block = slice(start, min(start + block_columns, p))
+        values = df.iloc[:, block].to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+        missing = np.isnan(values)
+        if missing.any():
+            if M is None:
+                M = np.ones((rows, p), dtype=np.float32)
+            M[:, block] = ~missing
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning) # All-NaN columns
+                mean = np.nan_to_num(np.nanmean(values, axis=0))
+                std = np.nanstd(values, axis=0)
+        else:
+            mean, std = values.mean(axis=0), values.std(axis=0)
+        std[~(std > 0)] = 1.0
+        values -= mean
+        values /= std
+        values[missing] = 0.0
+        Z[:, block] = values
+    return Z, M
+
+
+def _block(Z, M, rows, a, b):
+    """
+    Correlations and pair counts of column block `a` (slice) against block `b`.
+    """
+    Za, Zb = Z[:, a], Z[:, b]
+    if M is None:
+        sxy = (Za.T @ Zb).astype(np.float64)
+        sxx = np.einsum("ij,ij->j", Za, Za, dtype=np.float64)
+        syy = sxx if a == b else np.einsum("ij,ij->j", Zb, Zb, dtype=np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = sxy / np.sqrt(np.outer(sxx, syy))
+        return corr, np.full(corr.shape, rows, dtype=np.float64)
+
+    # Pairwise-complete: sums restricted to the rows where both columns are observed
+    Ma, Mb = M[:, a], M[:, b]
+    n = (Ma.T @ Mb).astype(np.float64)
+    sxy = (Za.T @ Zb).astype(np.float64)
+    sx = (Za.T @ Mb).astype(np.float64)
+    sy = (Ma.T @ Zb).astype(np.float64)
+    sxx = ((Za * Za).T @ Mb).astype(np.float64)
+    syy = (Ma.T @ (Zb * Zb)).astype(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = sxy - sx * sy / n
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n
+        corr = cov / np.sqrt(var_x * var_y)
+    corr[(n < 2) | ~(var_x > 0) | ~(var_y > 0)] = np.nan
+    return corr, n
+
+
+def _select(candidates, k):
+    # Keep the k strongest (by |r|) of the candidate arrays, unsorted
+    strength = candidates[0]
+    if len(strength) <= k:
+        return candidates
+    keep = np.argpartition(strength, -k)[-k:]
+    return tuple(c[keep] for c in candidates)
+
+
+def compute_correlations(df, k=MAX_TOP_K, full=False, sample_rows=None, block_columns=BLOCK_COLUMNS):
+    """
+    Pearson correlations of the numeric columns of `df`: the `k` strongest pairs,
+    and the full matrix as a list of rows when `full` (NaN for undefined pairs).
+    With `sample_rows`, a uniform row sample is used and every pair carries a 95%
+    confidence interval (Fisher z); `error_bound` bounds |sampled r - r| for all
+    pairs at once with 95% confidence.
+    """
+    numeric = df.select_dtypes(include=["number"])
+    columns = list(numeric.columns)
+    total_rows = len(numeric)
+    sampled = sample_rows is not None and total_rows > sample_rows
+    if sampled:
+        rng = np.random.default_rng(SAMPLE_SEED)
+        numeric = numeric.iloc[np.sort(rng.choice(total_rows, sample_rows, replace=False))]
+
+    Z, M = _standardize(numeric)
+    rows, p = Z.shape
+    matrix = np.full((p, p), np.nan, dtype=np.float32) if full else None
+    # Running top-k: (|r|, r, i, j, n)
+    empty = np.empty(0)
+    best = (empty, empty, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), empty)
+    min_n = float(rows) # Fewest complete observations behind any defined pair
+    for start_a in range(0, p, block_columns):
+        a = slice(start_a, min(start_a + block_columns, p))
+        for start_b in range(start_a, p, block_columns):
+            b = slice(start_b, min(start_b + block_columns, p))
+            corr, n = _block(Z, M, rows, a, b)
+            if full:
+                matrix[a, b] = corr
+                matrix[b, a] = corr.T
+            ii, jj = np.nonzero(np.triu(np.ones(corr.shape, dtype=bool), k=1) if a == b else np.ones(corr.shape, dtype=bool))
+            values = corr[ii, jj]
+            defined = ~np.isnan(values)
+            ii, jj, values = ii[defined], jj[defined], values[defined]
+            if len(values):
+                min_n = min(min_n, float(n[ii, jj].min()))
+            best = _select(tuple(np.concatenate(pair) for pair in zip(best, (
+                np.abs(values), values, ii + start_a, jj + start_b, n[ii, jj],
+            ))), k)
+
+    order = np.argsort(-best[0], kind="stable")
+    top = []
+    for idx in order:
+        pair = {"x": columns[best[2][idx]], "y": columns[best[3][idx]], "value": float(np.clip(best[1][idx], -1, 1))}
+        if sampled:
+            pair["ci"] = _interval(pair["value"], best[4][idx])
+        top.append(pair)
+
+    result = {
+        "columns": columns,
+        "rows": rows,
+        "total_rows": total_rows,
+        "sampled": sampled,
+        "error_bound": None,
+        "top": top,
+    }
+    if sampled and p > 1 and min_n > 3:
+        # Simultaneous 95% bound over all pairs (Bonferroni), so it also covers the pairs
+        # that made the top of a noisy ranking. Fisher z half-width at the smallest pair
+        # count; tanh is 1-Lipschitz, so it bounds the error in r too
+        z = -NormalDist().inv_cdf(0.025 / (p * (p - 1) / 2))
+        result["error_bound"] = z / float(np.sqrt(min_n - 3))
+    if full:
+        np.clip(matrix, -1, 1, out=matrix)
+        result["matrix"] = np.round(matrix.astype(np.float64), MATRIX_DECIMALS).tolist()
+    return result
+
+
+def _interval(r, n):
+    if n <= 3:
+        return None
+    z = np.arctanh(np.clip(r, -0.999999, 0.999999))
+    half = Z_95 / np.sqrt(n - 3)
+    return [float(np.tanh(z - half)), float(np.tanh(z + half))]
+
+
+def _artifact_name(sample_rows, full):
+    return f"correlations.{sample_rows or 'all'}{'.matrix' if full else ''}"
+
+
+def get_correlations(dataset_id, k=10, full=False, sample_rows=None):
+    """
+    Cached correlations of a dataset (see compute_correlations). The top MAX_TOP_K
+    pairs are cached per sample size and sliced to `k`; the matrix is cached separately.
+    Blocking: call from a worker thread. Concurrent callers share one computation.
+    """
+    name = _artifact_name(sample_rows, full)
+    cached = DATASETS.get_artifact(dataset_id, name)
+    if cached is None:
+        with _locks[dataset_id]:
+            cached = DATASETS.get_artifact(dataset_id, name)
+            if cached is None:
+                version = DATASETS.version(dataset_id)
+                with stage("correlation.compute"):
+                    cached = compute_correlations(DATASETS.get_frame(dataset_id), MAX_TOP_K, full, sample_rows)
+                DATASETS.put_artifact(dataset_id, name, cached, version=version)
+    return {**cached, "top": cached["top"][:k]}
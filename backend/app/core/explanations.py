@@ -0,0 +1,255 @@
+# SHAP explanations.
+# Explainers are built once per model version and kept in a small LRU. Global feature
+# importances are cached per (model version, dataset version, sample size) as a dataset
+# artifact, and are precomputed in the background as soon as a training job finishes.
+# They run in a process pool, as TreeExplainer holds the GIL for the whole computation:
+# the training pool for precomputation, a small pool of their own for /explain/
+# requests so they never queue behind training jobs. Local (per-row) explanations
+# reuse the in-process explainers.
+import logging
+import os
+import threading
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from app.core.store import DATASETS
+from app.core.registry import MODELS
+from app.core.jobs import ProcessPool, submit_task
+from app.core.metrics import stage
+
+SAMPLE_SIZE = int(os.getenv("INSIGHTLENS_SHAP_SAMPLE", "100"))
+SAMPLE_SEED = 42
+# Rows per vectorized SHAP call for local explanations
+LOCAL_BATCH_ROWS = 1000
+EXPLAINER_CACHE_SIZE = 8
+EXPLAIN_WORKERS = int(os.getenv("INSIGHTLENS_EXPLAIN_WORKERS", "1"))
+
+logger = logging.getLogger(__name__)
+
+_explainers = OrderedDict() # (model_id, model version) -> explainer
+_explainers_lock = threading.Lock()
+_locks = defaultdict(threading.Lock)
+
+# Queues background precomputation (the work itself runs in the process pool);
+# one thread so explanations never take over every pool worker
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shap")
+# Interactive requests (cache misses of /explain/)
+_pool = ProcessPool(EXPLAIN_WORKERS)
+
+
+def is_tree_model(model_info):
+    return "XGB" in model_info["name"] or "Random Forest" in model_info["name"]
+
+
+class ExplanationInputError(ValueError):
+    """
+    The rows or the model cannot be explained as given (e.g. columns do not match).
+    """
+
+
+class ExplanationError(RuntimeError):
+    """
+    SHAP failed on valid input.
+    """
+
+
+def _sample_positions(n, size=SAMPLE_SIZE, seed=SAMPLE_SEED):
+    rng = np.random.RandomState(seed)
+    return rng.choice(n, min(size, n), replace=False)
+
+
+def sample_rows(X, size=SAMPLE_SIZE, seed=SAMPLE_SEED):
+    """
+    Deterministic row sample of an encoded matrix (all rows if it is small),
+    always dense: SHAP explainers expect dense input.
+    """
+    import scipy.sparse as sp
+
+    sample = X[_sample_positions(X.shape[0], size, seed)]
+    return sample.toarray() if sp.issparse(sample) else sample
+
+
+def _explainer_input(model_info, X):
+    """
+    The encoded rows as the model scores them. XGBoost reads unstored sparse entries
+    as missing, not zero, so its CSR input is explained as is (TreeExplainer hands it
+    to XGBoost); the other explainers get a dense copy.
+    """
+    import scipy.sparse as sp
+
+    if not sp.issparse(X) or "XGB" in model_info["name"]:
+        return X
+    return X.toarray()
+
+
+def get_explainer(model_id, background=None):
+    """
+    Cached explainer for a model. TreeExplainer for tree ensembles; otherwise the
+    generic (linear) explainer over the background sample stored at training time,
+    or `background` for models trained before one was stored.
+    """
+    import shap
+
+    model_info = MODELS[model_id]
+    key = (model_id, model_info.get("version"))
+    with _explainers_lock:
+        if key in _explainers:
+            _explainers.move_to_end(key)
+            return _explainers[key]
+
+    if is_tree_model(model_info):
+        explainer = shap.TreeExplainer(model_info["model"])
+    else:
+        background = model_info.get("background", background)
+        if background is None:
+            raise ExplanationInputError("Model has no background sample; run /explain/ once with its dataset")
+        explainer = shap.Explainer(model_info["model"], background)
+
+    with _explainers_lock:
+        _explainers[key] = explainer
+        while len(_explainers) > EXPLAINER_CACHE_SIZE:
+            _explainers.popitem(last=False)
+    return explainer
+
+
+def shap_values(explainer, X):
+    """
+    SHAP values as an ndarray: (rows, features) or (rows, features, classes).
+    """
+    import shap
+
+    if isinstance(explainer, shap.TreeExplainer):
+        values = explainer.shap_values(X)
+    else:
+        values = explainer(X).values
+    if isinstance(values, list): # Older SHAP: one array per class
+        values = np.stack(values, axis=-1)
+    return np.asarray(values)
+
+
+def feature_importance(model_info, values):
+    """
+    Mean |SHAP| per feature (averaged over classes for multi-output models), strongest first.
+    """
+    if values.ndim > 2:
+        values = np.mean(np.abs(values), axis=2)
+    mean_shap = np.mean(np.abs(values), axis=0)
+    importance = sorted(zip(model_info["features"], mean_shap), key=lambda item: item[1], reverse=True)
+    return [{"feature": k, "importance": float(v)} for k, v in importance]
+
+
+def compute_importance(model_id, X_sample):
+    """
+    Global importance of a model over an encoded sample. Runs in a pool worker,
+    which loads the model from the registry and keeps its own explainer cache.
+    """
+    model_info = MODELS[model_id]
+    values = shap_values(get_explainer(model_id, background=X_sample), X_sample)
+    return feature_importance(model_info, values)
+
+
+def _artifact_name(model_id, model_version):
+    # A refit model keeps its id but gets a new version
+    return f"shap_{model_id}_{model_version}_{SAMPLE_SIZE}"
+
+
+def get_global_importance(model_id, dataset_id, submit=None):
+    """
+    Cached global importance of a model on the current dataset version.
+    Blocking: call from a worker thread. Concurrent callers share one computation.
+    `submit(fn, *args)` runs it in a process pool: the explain pool by default.
+    """
+    submit = submit or _pool.submit
+    model_info = MODELS[model_id]
+    name = _artifact_name(model_id, model_info.get("version", "0"))
+    cached = DATASETS.get_artifact(dataset_id, name)
+    if cached is not None:
+        return cached
+
+    with _locks[(model_id, dataset_id)]:
+        cached = DATASETS.get_artifact(dataset_id, name)
+        if cached is not None:
+            return cached
+
+        version = DATASETS.version(dataset_id)
+        # Same rows as sampling the encoded complete rows, but only the sample is encoded,
+        # exactly like training with the fitted pipeline stored alongside the model
+        df = DATASETS.get_frame(dataset_id)
+        complete = np.flatnonzero(df.notna().all(axis=1).to_numpy())
+        try:
+            with stage("explain.preprocess"):
+                X_sample = _explainer_input(
+                    model_info, model_info["pipeline"].transform(df.iloc[complete[_sample_positions(len(complete))]])
+                )
+        except Exception as e:
+            raise ExplanationInputError(f"Data mismatch or preprocessing error: {str(e)}") from e
+
+        try:
+            with stage("explain.shap"):
+                importance = submit(compute_importance, model_id, X_sample).result()
+        except Exception as e:
+            logger.exception("Global SHAP importance failed for model %s", model_id)
+            raise ExplanationError(f"Explainability failed: {str(e)}") from e
+
+        DATASETS.put_artifact(dataset_id, name, importance, version=version)
+        return importance
+
+
+def precompute_global_importance(model_id, dataset_id):
+    """
+    Warm the importance cache for a freshly trained model in the background,
+    in the training pool (the job that trained it is done).
+    """
+    return _executor.submit(get_global_importance, model_id, dataset_id, submit_task)
+
+
+def explain_rows(model_id, rows):
+    """
+    Per-row SHAP contributions for a list of feature dicts, scored in vectorized
+    batches through the cached explainer. Multi-class models explain each row's
+    predicted class; binary and regression models a single output.
+    """
+    model_info = MODELS[model_id]
+    try:
+        X = model_info["pipeline"].transform_records(rows)
+    except Exception as e:
+        raise ExplanationInputError(f"Data mismatch or preprocessing error: {str(e)}") from e
+    n_rows = X.shape[0]
+
+    try:
+        explainer = get_explainer(model_id)
+        with stage("explain.local_shap"):
+            values = np.concatenate([
+                shap_values(explainer, _explainer_input(model_info, X[start:start + LOCAL_BATCH_ROWS]))
+                for start in range(0, n_rows, LOCAL_BATCH_ROWS)
+            ])
+    except ExplanationInputError:
+        raise
+    except Exception as e:
+        logger.exception("Local SHAP explanation failed for model %s", model_id)
+        raise ExplanationError(f"Explainability failed: {str(e)}") from e
+
+    model = model_info["model"]
+    base_values = np.atleast_1d(np.asarray(explainer.expected_value, dtype=np.float64))
+    classes = getattr(model, "classes_", None) if model_info["type"] == "classification" else None
+    if values.ndim > 2:
+        # One output per class: pick the predicted class of every row
+        explained = np.argmax(model.predict_proba(X), axis=1)
+        values = values[np.arange(n_rows), :, explained]
+        base = base_values[explained]
+    else:
+        explained = np.full(n_rows, len(classes) - 1 if classes is not None else 0)
+        base = np.full(n_rows, base_values[-1])
+
+    features = model_info["features"]
+    explanations = []
+    for i in range(n_rows):
+        order = np.argsort(-np.abs(values[i]))
+        explanation = {
+            "base_value": float(base[i]),
+            "contributions": [{"feature": features[j], "value": float(values[i, j])} for j in order],
+        }
+        if classes is not None:
+            explanation["explained_class"] = classes[explained[i]]
+        explanations.append(explanation)
+    return explanations
@@ -0,0 +1,287 @@
+# Out-of-core training for datasets larger than memory.
+# The stored dataset is streamed in chunks whose size follows from a memory budget,
+# so peak memory depends on the budget instead of the row count. XGBoost builds an
+# external-memory quantile matrix from a DataIter (pages cached on disk); SGD linear
+# models learn with partial_fit over a few epochs. The test split is held out by
+# hashing the row position: every pass sees the same split without an index of it.
+# `fit_out_of_core` runs inside the training process pool and reads the dataset
+# itself, so it needs a store shared between processes (INSIGHTLENS_STORE=disk).
+# Only the sampling helpers run in the API process; the model libraries are imported
+# by the fits.
+import os
+import tempfile
+import time
+import numpy as np
+from app.core.store import DATASETS
+from app.core.preprocessing import CURRENCY_PATTERN, rows_with_missing
+
+MEMORY_BUDGET_MB = float(os.getenv("INSIGHTLENS_TRAIN_MEMORY_MB", "512"))
+SAMPLE_ROWS = int(os.getenv("INSIGHTLENS_OUT_OF_CORE_SAMPLE_ROWS", "20000"))
+SGD_EPOCHS = int(os.getenv("INSIGHTLENS_SGD_EPOCHS", "5"))
+TEST_FRACTION = 0.2
+MIN_CHUNK_ROWS = 1000
+# Share of the budget given to one chunk; the rest covers copies made while encoding
+# and XGBoost's own buffers
+CHUNK_BUDGET_FRACTION = 0.5
+
+CANDIDATES = {
+    "classification": ["SGD Classifier", "XGBoost"],
+    "regression": ["SGD Regressor", "XGBoost"],
+}
+XGBOOST_ROUNDS = 100 # Same as the default XGBClassifier/XGBRegressor
+
+
+def held_out(positions, seed=42):
+    """
+    Boolean mask of the row positions that belong to the test split (TEST_FRACTION
+    of them), from a splitmix64 hash: stable across passes and processes.
+    """
+    with np.errstate(over="ignore"):
+        h = np.asarray(positions, dtype=np.uint64) + np.uint64(seed) * np.uint64(0x9E3779B97F4A7C15)
+        h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        h ^= h >> np.uint64(31)
+    return (h >> np.uint64(11)).astype(np.float64) / float(1 << 53) < TEST_FRACTION
+
+
+def encode_target(series, spec):
+    """
+    Apply the target encoding resolved on the whole column (see routers/train.resolve_target)
+    to one chunk: formatted-number coercion and class codes of a text target.
+    """
+    import pandas as pd
+
+    if spec["coerced"]:
+        series = pd.to_numeric(series.astype(str).str.replace(CURRENCY_PATTERN, '', regex=True), errors="coerce")
+    if spec["categories"] is not None:
+        return pd.Categorical(series, categories=spec["categories"]).codes
+    return series.to_numpy()
+
+
+def sample_frame(dataset_id, rows=SAMPLE_ROWS):
+    """
+    About `rows` rows spread evenly over the dataset, read one batch at a time.
+    """
+    import pandas as pd
+
+    total = DATASETS.metadata(dataset_id)["shape"][0]
+    step = max(1, total // max(rows, 1))
+    parts = [chunk[chunk.index % step == 0] for chunk in DATASETS.iter_batches(dataset_id, 64 * 1024)]
+    return pd.concat(parts) if parts else pd.DataFrame()
+
+
+def chunk_rows_for_budget(sample, pipeline, budget_mb):
+    """
+    Rows per chunk such that a raw chunk (sized from `sample`), its encoded matrix
+    and their working copies stay within CHUNK_BUDGET_FRACTION of the budget.
+    """
+    raw_bytes = sample.memory_usage(index=False, deep=True).sum() / max(len(sample), 1)
+    if pipeline.encoding == "sparse":
+        # Dense block plus one stored entry (value and column index) per one-hot column
+        encoded_bytes = pipeline._n_dense * 8 + len(pipeline.categorical_columns) * 12
+    else:
+        encoded_bytes = len(pipeline.feature_names) * 8
+    per_row = 3 * raw_bytes + 3 * encoded_bytes
+    rows = int(budget_mb * 1024 * 1024 * CHUNK_BUDGET_FRACTION / max(per_row, 1))
+    return max(MIN_CHUNK_ROWS, rows)
+
+
+def iter_chunks(dataset_id, target_column, spec, pipeline, chunk_rows, split):
+    """
+    Yield encoded (X, y) chunks of the "train" or "test" split. Rows with missing
+    values are dropped, like the in-memory path, also after encoding (values a
+    column coerced from text cannot parse).
+    """
+    for chunk in DATASETS.iter_batches(dataset_id, chunk_rows):
+        chunk = chunk.dropna()
+        test = held_out(chunk.index.to_numpy())
+        chunk = chunk[test if split == "test" else ~test]
+        if chunk.empty:
+            continue
+        X = pipeline.transform(chunk.drop(columns=[target_column]))
+        y = np.asarray(encode_target(chunk[target_column], spec))
+        keep = ~rows_with_missing(X)
+        if not keep.all():
+            X, y = X[keep], y[keep]
+        if X.shape[0]:
+            yield X, y
+
+
+class StreamingScores:
+    """
+    Leaderboard metrics (as training.score_predictions) accumulated chunk by chunk:
+    a confusion matrix for classification, sums of squares for regression.
+    """
+
+    def __init__(self, problem_type, classes=None):
+        self.problem_type = problem_type
+        self.n = 0
+        if problem_type == "classification":
+            self.classes = np.asarray(classes)
+            self.confusion = np.zeros((len(classes), len(classes)), dtype=np.int64)
+        else:
+            self.sum = self.sum_squares = self.sse = 0.0
+
+    def update(self, y_true, preds):
+        y_true = np.asarray(y_true)
+        preds = np.asarray(preds)
+        self.n += len(y_true)
+        if self.problem_type == "classification":
+            true_codes = np.searchsorted(self.classes, y_true)
+            pred_codes = np.searchsorted(self.classes, preds)
+            np.add.at(self.confusion, (true_codes, pred_codes), 1)
+        else:
+            y_true = y_true.astype(np.float64)
+            self.sum += float(y_true.sum())
+            self.sum_squares += float(np.dot(y_true, y_true))
+            self.sse += float(np.sum((y_true - preds) ** 2))
+
+    def result(self):
+        if not self.n:
+            raise ValueError("The test split is empty: not enough complete rows")
+        if self.problem_type == "classification":
+            tp = np.diag(self.confusion).astype(np.float64)
+            support = self.confusion.sum(axis=1)
+            denominator = support + self.confusion.sum(axis=0)
+            f1 = np.divide(2 * tp, denominator, out=np.zeros_like(tp), where=denominator > 0)
+            return {
+                "accuracy": float(tp.sum() / self.n),
+                "f1": float((f1 * support).sum() / self.n),
+            }
+        total = self.sum_squares - self.sum ** 2 / self.n
+        if total > 0:
+            r2 = 1 - self.sse / total
+        else:
+            # sklearn's r2_score for a constant target
+            r2 = 1.0 if self.sse == 0 else 0.0
+        return {"r2": float(r2), "mse": float(self.sse / self.n)}
+
+
+def _fit_xgboost(problem_type, chunks, classes):
+    import xgboost as xgb
+
+    class ChunkIter(xgb.DataIter):
+        """
+        Feeds the training chunks to XGBoost; each reset restarts the stream.
+        """
+
+        def __init__(self, cache_prefix):
+            self._it = None
+            super().__init__(cache_prefix=cache_prefix)
+
+        def next(self, input_data):
+            if self._it is None:
+                self._it = chunks()
+            try:
+                X, y = next(self._it)
+            except StopIteration:
+                return False
+            input_data(data=X, label=y)
+            return True
+
+        def reset(self):
+            self._it = None
+
+    if problem_type == "classification":
+        if len(classes) > 2:
+            params = {"objective": "multi:softprob", "num_class": len(classes), "eval_metric": "mlogloss"}
+        else:
+            params = {"objective": "binary:logistic", "eval_metric": "logloss"}
+        model = xgb.XGBClassifier(eval_metric="logloss")
+    else:
+        params = {"objective": "reg:squarederror"}
+        model = xgb.XGBRegressor()
+
+    with tempfile.TemporaryDirectory(prefix="insightlens-xgb-") as cache_dir:
+        it = ChunkIter(os.path.join(cache_dir, "cache"))
+        dtrain = xgb.ExtMemQuantileDMatrix(it)
+        booster = xgb.train({**params, "tree_method": "hist"}, dtrain, num_boost_round=XGBOOST_ROUNDS)
+        rows = dtrain.num_row()
+        del dtrain
+
+    # The sklearn wrapper keeps predict/predict_proba, SHAP and tree compilation working
+    model.load_model(bytearray(booster.save_raw("json")))
+    return model, rows
+
+
+def _fit_sgd(problem_type, chunks, classes, epochs, seed=42):
+    import scipy.sparse as sp
+    from sklearn.linear_model import SGDClassifier, SGDRegressor
+
+    # First pass: per-feature mean and scale of the training rows (and of the target
+    # for regression). Sparse matrices are only scaled so that they stay sparse.
+    rows, sums, squares, y_sum, y_squares = 0, 0.0, 0.0, 0.0, 0.0
+    sparse = False
+    for X, y in chunks():
+        sparse = sp.issparse(X)
+        rows += X.shape[0]
+        sums = sums + np.asarray(X.sum(axis=0)).ravel()
+        squares = squares + np.asarray((X.multiply(X) if sparse else X * X).sum(axis=0)).ravel()
+        if problem_type == "regression":
+            y = y.astype(np.float64)
+            y_sum += float(y.sum())
+            y_squares += float(np.dot(y, y))
+    if not rows:
+        raise ValueError("The training split is empty: not enough complete rows")
+    mean = np.zeros_like(sums) if sparse else sums / rows
+    scale = np.sqrt(np.maximum(squares / rows - mean ** 2, 0))
+    scale[scale == 0] = 1.0
+    y_mean = y_sum / rows
+    y_scale = np.sqrt(max(y_squares / rows - y_mean ** 2, 0)) or 1.0
+
+    if problem_type == "classification":
+        model = SGDClassifier(loss="log_loss", random_state=seed)
+    else:
+        model = SGDRegressor(random_state=seed)
+    rng = np.random.default_rng(seed)
+    for _ in range(epochs):
+        for X, y in chunks():
+            order = rng.permutation(X.shape[0])
+            X = X.multiply(1 / scale).tocsr() if sparse else (X - mean) / scale
+            X, y = X[order], y[order]
+            if problem_type == "classification":
+                model.partial_fit(X, y, classes=classes)
+            else:
+                model.partial_fit(X, (y - y_mean) / y_scale)
+
+    # Fold the standardisation into the coefficients: the stored model takes the
+    # pipeline's output directly, like every other leaderboard model
+    coef = model.coef_ / scale
+    intercept = model.intercept_ - coef @ mean
+    if problem_type == "regression":
+        coef, intercept = coef * y_scale, intercept * y_scale + y_mean
+    model.coef_, model.intercept_ = coef, intercept
+    return model, rows
+
+
+def fit_out_of_core(name, problem_type, dataset_id, target_column, spec, pipeline, chunk_rows, epochs=SGD_EPOCHS):
+    """
+    Fit one out-of-core candidate on the streamed training split and evaluate it
+    on the streamed test split. Returns the same fields as training.fit_candidate
+    plus the number of training rows.
+    """
+    def chunks(split="train"):
+        return iter_chunks(dataset_id, target_column, spec, pipeline, chunk_rows, split)
+
+    classes = np.asarray(spec["classes"]) if problem_type == "classification" else None
+    start = time.perf_counter()
+    if name == "XGBoost":
+        model, rows = _fit_xgboost(problem_type, chunks, classes)
+    elif name in ("SGD Classifier", "SGD Regressor"):
+        model, rows = _fit_sgd(problem_type, chunks, classes, epochs)
+    else:
+        raise ValueError(f"Unknown out-of-core model '{name}'")
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scores = StreamingScores(problem_type, classes)
+    for X, y in chunks("test"):
+        scores.update(y, model.predict(X))
+    predict_seconds = time.perf_counter() - start
+    return {
+        "model": model,
+        "metrics": scores.result(),
+        "fit_seconds": fit_seconds,
+        "predict_seconds": predict_seconds,
+        "training_rows": rows,
+    }
@@ -0,0 +1,231 @@
+# Streaming ingestion for dataset uploads.
+# The upload is copied to a spool file in fixed-size chunks (never held in memory
+# as one bytes object), the schema and preview come from a small sample, and the
+# full parse runs in a background thread. Endpoints that need the data await the
+# pending parse through `require_dataset`. Parsed frames are compacted before they
+# are stored: formatted numbers become numeric, integers are downcast and repeated
+# strings become categoricals (`optimize_dtypes`).
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from fastapi import HTTPException
+from app.core.store import DATASETS
+from app.core.preprocessing import CURRENCY_PATTERN, is_text_column
+from app.core.profiling import get_profile
+from app.core.metrics import stage
+
+SPOOL_CHUNK_BYTES = 1024 * 1024
+SAMPLE_ROWS = 1000
+# Files at least this large return before the full parse finishes
+ASYNC_INGEST_MB = float(os.getenv("INSIGHTLENS_ASYNC_INGEST_MB", "16"))
+# How long a request waits for a dataset another worker process is still parsing
+PENDING_WAIT_SECONDS = float(os.getenv("INSIGHTLENS_PENDING_WAIT_SECONDS", "600"))
+OPTIMIZE_DTYPES = os.getenv("INSIGHTLENS_OPTIMIZE_DTYPES", "1") == "1"
+# Text columns with at most this share of distinct values are stored as categoricals
+CATEGORY_MAX_RATIO = float(os.getenv("INSIGHTLENS_CATEGORY_MAX_RATIO", "0.5"))
+COERCE_PROBE_ROWS = 100 # Values checked before a full numeric conversion is attempted
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("INSIGHTLENS_INGEST_WORKERS", "2")),
+    thread_name_prefix="ingest",
+)
+
+# dataset_id -> Future of the background parse (failed parses stay to report the error)
+PENDING = {}
+
+SUPPORTED_EXTENSIONS = (".csv", ".xls", ".xlsx", ".json")
+
+
+def spool_upload(upload):
+    """
+    Copy an UploadFile to a named temporary file chunk by chunk. Returns the path.
+    """
+    suffix = os.path.splitext(upload.filename or "")[1]
+    upload.file.seek(0)
+    with tempfile.NamedTemporaryFile(prefix="insightlens-upload-", suffix=suffix, delete=False) as spool:
+        try:
+            shutil.copyfileobj(upload.file, spool, SPOOL_CHUNK_BYTES)
+        except BaseException:
+            os.remove(spool.name)
+            raise
+        return spool.name
+
+
+def read_sample(path, filename, nrows=SAMPLE_ROWS):
+    """
+    Parse only the first rows: enough for the schema and a preview. Returns
+    (sample, frame): formats that cannot be read partially (JSON) are parsed whole,
+    and `frame` hands that result to start_ingest; otherwise it is None.
+    """
+    import pandas as pd
+
+    if filename.endswith(".csv"):
+        return pd.read_csv(path, nrows=nrows), None
+    if filename.endswith((".xls", ".xlsx")):
+        return pd.read_excel(path, nrows=nrows), None
+    df = read_file(path, filename)
+    return df.head(nrows), df
+
+
+def read_file(path, filename):
+    """
+    Parse a whole spooled file. CSVs use the multithreaded pyarrow reader when available.
+    """
+    import pandas as pd
+
+    if filename.endswith(".csv"):
+        try:
+            return pd.read_csv(path, engine="pyarrow")
+        except Exception:
+            # pyarrow engine is stricter (e.g. ragged rows) or not installed
+            return pd.read_csv(path)
+    if filename.endswith((".xls", ".xlsx")):
+        return pd.read_excel(path)
+    return pd.read_json(path)
+
+
+def _to_number(values):
+    """
+    Formatted numbers ("1,234", "$500") to floats; None if any value is not a number.
+    """
+    import pandas as pd
+
+    cleaned = values.astype(str).str.replace(CURRENCY_PATTERN, '', regex=True)
+    numbers = pd.to_numeric(cleaned, errors="coerce")
+    if numbers[values.notna()].isna().any():
+        return None
+    return numbers
+
+
+def _downcast(series):
+    import pandas as pd
+
+    if pd.api.types.is_integer_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return pd.to_numeric(series, downcast="integer")
+    if pd.api.types.is_float_dtype(series) and series.dtype != np.float32:
+        # Only when every value survives the round trip: float32 would change most decimals
+        values = series.to_numpy()
+        narrow = values.astype(np.float32)
+        if np.array_equal(narrow.astype(values.dtype), values, equal_nan=True):
+            return pd.Series(narrow, index=series.index, name=series.name)
+    return series
+
+
+def optimize_dtypes(df):
+    """
+    Compact a freshly parsed frame in place: text columns holding formatted numbers
+    become numeric (the coercion training used to repeat per request), integers and
+    losslessly representable floats are downcast, and text columns with few distinct
+    values become categoricals. Returns the frame and a report of the changes with
+    the memory usage before and after.
+    """
+    before = int(df.memory_usage(index=False, deep=True).sum())
+    report = {"coerced": [], "downcast": [], "categorical": []}
+    for col in df.columns:
+        original = series = df[col]
+        try:
+            if is_text_column(series):
+                # Cheap rejection on a few values before converting the whole column
+                probe = series.dropna().head(COERCE_PROBE_ROWS)
+                numbers = _to_number(series) if len(probe) and _to_number(probe) is not None else None
+                if numbers is None:
+                    if series.nunique() <= CATEGORY_MAX_RATIO * len(series):
+                        categorical = series.astype("category")
+                        # Mixed-type categories (JSON uploads) have no Arrow dictionary type
+                        if (categorical.cat.categories.inferred_type == "string" and
+                                categorical.memory_usage(index=False, deep=True) < series.memory_usage(index=False, deep=True)):
+                            df[col] = categorical
+                            report["categorical"].append(col)
+                    continue
+                series = numbers
+                report["coerced"].append(col)
+            narrow = _downcast(series)
+            if narrow.dtype != series.dtype:
+                report["downcast"].append(col)
+            if narrow is not original:
+                df[col] = narrow
+        except (TypeError, ValueError):
+            # Mixed-type values (JSON uploads) stay as they are
+            continue
+    after = int(df.memory_usage(index=False, deep=True).sum())
+    report.update({"before_bytes": before, "after_bytes": after})
+    return df, report
+
+
+def _ingest(dataset_id, path, filename, df=None):
+    try:
+        if df is None:
+            with stage("data.load"):
+                df = read_file(path, filename)
+        memory = None
+        if OPTIMIZE_DTYPES:
+            with stage("data.optimize"):
+                df, memory = optimize_dtypes(df)
+        DATASETS[dataset_id] = {
+            "id": dataset_id,
+            "filename": filename,
+            "data": df,
+            "columns": df.columns.tolist(),
+            # Known without loading the data (e.g. to size a correlation matrix)
+            "numeric_columns": df.select_dtypes(include=["number"]).columns.tolist(),
+            "shape": df.shape,
+            "memory": memory,
+        }
+        DATASETS.clear_pending(dataset_id)
+        return df
+    except Exception as e:
+        DATASETS.mark_pending(dataset_id, error=str(e))
+        raise
+    finally:
+        os.remove(path)
+
+
+def start_ingest(dataset_id, path, filename, df=None):
+    """
+    Parse and store the spooled file in the background (`df`: the file already
+    parsed by read_sample). Returns the Future.
+    """
+    DATASETS.mark_pending(dataset_id)
+    future = _executor.submit(_ingest, dataset_id, path, filename, df)
+    PENDING[dataset_id] = future
+
+    def _done(f):
+        # The outcome is in the store by now: the dataset, or the error in its pending state
+        PENDING.pop(dataset_id, None)
+        if f.exception() is None:
+            # Warm the profile cache so the first /data/profile is instant
+            _executor.submit(get_profile, dataset_id)
+
+    future.add_done_callback(_done)
+    return future
+
+
+def should_wait(path):
+    return os.path.getsize(path) < ASYNC_INGEST_MB * 1024 * 1024
+
+
+async def require_dataset(dataset_id):
+    """
+    Raise 404 for unknown datasets and wait for a dataset that is still being parsed.
+    """
+    future = PENDING.get(dataset_id)
+    if future is not None:
+        try:
+            await asyncio.wrap_future(future)
+        except Exception as e:
+            raise HTTPException(status_code=422, detail=f"Failed to process file: {str(e)}")
+    elif dataset_id not in DATASETS:
+        # Possibly uploaded to another worker process that is still parsing it, or failed to parse
+        deadline = time.monotonic() + PENDING_WAIT_SECONDS
+        while (state := DATASETS.pending(dataset_id)) is not None and dataset_id not in DATASETS:
+            if state["error"] is not None:
+                raise HTTPException(status_code=422, detail=f"Failed to process file: {state['error']}")
+            if time.monotonic() > deadline:
+                raise HTTPException(status_code=503, detail="Dataset is still being processed")
+            await asyncio.sleep(0.1)
+    if dataset_id not in DATASETS:
+        raise HTTPException(status_code=404, detail="Dataset not found")
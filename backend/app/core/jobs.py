@@ -0,0 +1,323 @@
+# Background job system for CPU-heavy work (model training).
+# Tasks run in a shared process pool so the uvicorn event loop is never blocked;
+# job state is polled by the /train/jobs endpoint. With INSIGHTLENS_STORE=disk the
+# state is also written to a SQLite catalog in INSIGHTLENS_DATA_DIR, so every uvicorn
+# worker process can report on jobs started by another one.
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from app.core.store import STORE_BACKEND, DATA_DIR
+from app.core.responses import dumps
+
+MAX_WORKERS = int(os.getenv("INSIGHTLENS_TRAIN_WORKERS", "0")) or os.cpu_count() or 1
+MAX_FINISHED_JOBS = 100
+
+
+class ProcessPool:
+    """
+    A process pool created on first use.
+    Uses the 'spawn' start method: forking a process that already runs
+    uvicorn/XGBoost threads is unsafe.
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def reset(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def submit(self, fn, *args):
+        """
+        Run `fn(*args)` in the pool and return its Future.
+        """
+        try:
+            return self.get().submit(fn, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM-killed); start a fresh pool and retry once
+            self.reset()
+            return self.get().submit(fn, *args)
+
+
+# Shared by every training job
+TRAIN_POOL = ProcessPool(MAX_WORKERS)
+
+
+def submit_task(fn, *args):
+    """
+    Run `fn(*args)` in the shared training pool and return its Future.
+    """
+    return TRAIN_POOL.submit(fn, *args)
+
+
+class SQLiteJobCatalog:
+    """
+    Job and task state shared between processes. One short-lived connection per
+    operation (WAL mode): safe from any thread or process on this host.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, created_at REAL, finished_at REAL, info TEXT)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS tasks (job_id TEXT, name TEXT, position INTEGER, status TEXT, "
+                "result TEXT, error TEXT, PRIMARY KEY (job_id, name))"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def save(self, job):
+        """
+        Write a job with all its tasks (one transaction).
+        """
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?)",
+                (job["job_id"], job["created_at"], job["finished_at"], dumps(job["info"]).decode()),
+            )
+            db.executemany(
+                "INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (job["job_id"], name, i, task["status"],
+                     dumps(task["result"]).decode() if task["result"] is not None else None, task["error"])
+                    for i, (name, task) in enumerate(job["tasks"].items())
+                ],
+            )
+
+    def mark_running(self, job_id, name):
+        with self._connect() as db:
+            db.execute("UPDATE tasks SET status = 'running' WHERE job_id = ? AND name = ? AND status = 'queued'", (job_id, name))
+
+    def load(self, job_id):
+        """
+        The job in the in-memory layout (without futures), or None.
+        """
+        with self._connect() as db:
+            row = db.execute("SELECT created_at, finished_at, info FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            tasks = db.execute(
+                "SELECT name, status, result, error FROM tasks WHERE job_id = ? ORDER BY position", (job_id,)
+            ).fetchall()
+        return {
+            "job_id": job_id,
+            "created_at": row[0],
+            "finished_at": row[1],
+            "info": json.loads(row[2]),
+            "tasks": {
+                name: {"status": status, "result": json.loads(result) if result else None, "error": error, "future": None}
+                for name, status, result, error in tasks
+            },
+        }
+
+    def __contains__(self, job_id):
+        with self._connect() as db:
+            return db.execute("SELECT 1 FROM jobs WHERE job_id = ?", (job_id,)).fetchone() is not None
+
+    def prune(self, keep):
+        with self._connect() as db:
+            db.execute(
+                "DELETE FROM jobs WHERE job_id IN (SELECT job_id FROM jobs WHERE finished_at IS NOT NULL "
+                "ORDER BY finished_at DESC LIMIT -1 OFFSET ?)",
+                (keep,),
+            )
+            db.execute("DELETE FROM tasks WHERE job_id NOT IN (SELECT job_id FROM jobs)")
+
+
+def _run_tracked(job_id, name, fn, args):
+    # Runs in a pool worker: mark the task as started for every process reading the catalog
+    JOBS.mark_running(job_id, name)
+    return fn(*args)
+
+
+class JobManager:
+    """
+    Tracks jobs made of named tasks running in the process pool.
+
+    Each task reports its own status ("queued", "running", "completed", "failed");
+    a job is finished once every task is. `on_task_done(job, task_name, result)` is
+    called in a pool management thread when a task succeeds and may return a
+    dict that is stored as that task's public result. `on_job_done(job_id, tasks)`
+    is called once when the last task finishes, with {name: public result or None}.
+
+    Callbacks run in the process that submitted the job. With a `catalog`, every state
+    change is also saved there and jobs of other processes are read from it.
+    """
+
+    def __init__(self, catalog=None):
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.catalog = catalog
+
+    def submit(self, tasks, on_task_done=None, on_job_done=None, **info):
+        """
+        Submit `tasks` ({name: (fn, args)}) as one job.
+        Extra keyword arguments are stored as public job metadata.
+        """
+        job_id = str(uuid.uuid4())
+        job = {
+            "job_id": job_id,
+            "created_at": time.time(),
+            "finished_at": None,
+            "info": info,
+            "tasks": {name: {"status": "queued", "result": None, "error": None, "future": None} for name in tasks},
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            self._prune()
+        self._save(job)
+
+        for name, (fn, args) in tasks.items():
+            if self.catalog is not None:
+                future = submit_task(_run_tracked, job_id, name, fn, args)
+            else:
+                future = submit_task(fn, *args)
+            job["tasks"][name]["future"] = future
+            future.add_done_callback(
+                lambda f, name=name: self._task_finished(job, name, f, on_task_done, on_job_done)
+            )
+        return job_id
+
+    def _task_finished(self, job, name, future, on_task_done, on_job_done):
+        task = job["tasks"][name]
+        try:
+            result = future.result()
+            if on_task_done is not None:
+                result = on_task_done(job, name, result)
+            with self._lock:
+                task["status"] = "completed"
+                task["result"] = result
+        except Exception as e:
+            with self._lock:
+                task["status"] = "failed"
+                task["error"] = str(e) or e.__class__.__name__
+        with self._lock:
+            # The future holds the raw result (e.g. a fitted model) and, through its
+            # callbacks, whatever the job's callbacks captured: keep only the public result
+            task["future"] = None
+        with self._lock:
+            # finished_at guards against two tasks finishing at once both firing on_job_done
+            finished = job["finished_at"] is None and all(
+                t["status"] in ("completed", "failed") for t in job["tasks"].values()
+            )
+            if finished:
+                job["finished_at"] = time.time()
+                results = {n: t["result"] for n, t in job["tasks"].items()}
+        self._save(job)
+        if finished and on_job_done is not None:
+            on_job_done(job["job_id"], results)
+
+    def _save(self, job):
+        if self.catalog is None:
+            return
+        with self._lock:
+            # Futures stay in this process; the catalog gets a plain copy
+            tasks = {n: dict(t) for n, t in job["tasks"].items()}
+            for task in tasks.values():
+                if task["status"] == "queued" and task["future"] is not None and task["future"].running():
+                    task["status"] = "running"
+            job = {**job, "tasks": tasks, "info": dict(job["info"])}
+        self.catalog.save(job)
+
+    def mark_running(self, job_id, name):
+        if self.catalog is not None:
+            self.catalog.mark_running(job_id, name)
+
+    def _prune(self):
+        # Keep memory bounded: drop the oldest finished jobs beyond the limit
+        finished = [j for j in self._jobs.values() if j["finished_at"] is not None]
+        if len(finished) > MAX_FINISHED_JOBS:
+            finished.sort(key=lambda j: j["finished_at"])
+            for j in finished[:len(finished) - MAX_FINISHED_JOBS]:
+                del self._jobs[j["job_id"]]
+            if self.catalog is not None:
+                self.catalog.prune(MAX_FINISHED_JOBS)
+
+    def update(self, job_id, **info):
+        """
+        Add or replace public job metadata (e.g. a follow-up job started after it finished).
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job["info"].update(info)
+        if job is None:
+            # Submitted by another process (its catalog copy is the only one here)
+            job = self.catalog.load(job_id)
+            job["info"].update(info)
+        self._save(job)
+
+    def __contains__(self, job_id):
+        return job_id in self._jobs or (self.catalog is not None and job_id in self.catalog)
+
+    def snapshot(self, job_id):
+        """
+        Return a JSON-friendly view of a job: overall status, per-task status and
+        the results of the tasks that have already completed.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            job = self.catalog.load(job_id) if self.catalog is not None else None
+            if job is None:
+                raise KeyError(job_id)
+        with self._lock:
+            tasks = []
+            for name, task in job["tasks"].items():
+                status = task["status"]
+                if status == "queued" and task["future"] is not None and task["future"].running():
+                    status = "running"
+                tasks.append({"name": name, "status": status, "result": task["result"], "error": task["error"]})
+
+        statuses = [t["status"] for t in tasks]
+        done = sum(s in ("completed", "failed") for s in statuses)
+        if done < len(tasks):
+            status = "running" if any(s != "queued" for s in statuses) else "queued"
+        elif "completed" in statuses:
+            status = "completed"
+        else:
+            status = "failed"
+
+        return {
+            "job_id": job_id,
+            "status": status,
+            "progress": {"completed": done, "total": len(tasks)},
+            "elapsed_seconds": (job["finished_at"] or time.time()) - job["created_at"],
+            "tasks": tasks,
+            **job["info"],
+        }
+
+
+def create_job_manager(backend=STORE_BACKEND):
+    # Shared state goes with the shared dataset store: INSIGHTLENS_STORE=disk enables `uvicorn --workers N`
+    if backend == "disk":
+        return JobManager(SQLiteJobCatalog(os.path.join(DATA_DIR, "jobs.sqlite3")))
+    return JobManager()
+
+
+JOBS = create_job_manager()
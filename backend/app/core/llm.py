@@ -0,0 +1,231 @@
+# LLM client for insight and story generation.
+# Provider calls are blocking, so they run in a dedicated thread pool, never on the
+# event loop, behind a concurrency limit and a timeout. Responses are cached by
+# prompt hash (TTL + LRU) and concurrent identical prompts share one call.
+# `stream` forwards chunks as the provider produces them and stops the provider
+# call when the consumer goes away (e.g. the HTTP client disconnected).
+# INSIGHTLENS_LLM_PROVIDER=mock selects an offline provider for tests and benchmarks.
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from app.core.metrics import stage, observe_stage
+
+GEMINI_MODEL = os.getenv("INSIGHTLENS_GEMINI_MODEL", "gemini-2.5-flash")
+LLM_CONCURRENCY = int(os.getenv("INSIGHTLENS_LLM_CONCURRENCY", "4"))
+LLM_TIMEOUT = float(os.getenv("INSIGHTLENS_LLM_TIMEOUT", "30"))
+LLM_CACHE_SIZE = int(os.getenv("INSIGHTLENS_LLM_CACHE_SIZE", "128"))
+LLM_CACHE_TTL = float(os.getenv("INSIGHTLENS_LLM_CACHE_TTL", "3600"))
+MOCK_LATENCY = float(os.getenv("INSIGHTLENS_LLM_MOCK_LATENCY", "0.2"))
+
+
+class LLMTimeoutError(TimeoutError):
+    pass
+
+
+class GeminiProvider:
+    name = "gemini"
+
+    def __init__(self, api_key, model_name=GEMINI_MODEL):
+        # Imported here: the SDK is slow to import and unused in simulation mode
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self._model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt):
+        return self._model.generate_content(prompt).text
+
+    def stream(self, prompt):
+        for chunk in self._model.generate_content(prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+
+class MockProvider:
+    """
+    Offline provider: answers after `latency` seconds with text derived from the prompt.
+    Prompts asking for a 'sections' JSON object get a minimal valid story.
+    `stream` yields the same text word by word, spread over the same `latency`.
+    """
+
+    name = "mock"
+
+    def __init__(self, latency=MOCK_LATENCY):
+        self.latency = latency
+        self.calls = 0
+
+    def generate(self, prompt):
+        self.calls += 1
+        time.sleep(self.latency)
+        return self._respond(prompt)
+
+    def stream(self, prompt):
+        self.calls += 1
+        words = self._respond(prompt).split(" ")
+        for i, word in enumerate(words):
+            time.sleep(self.latency / len(words))
+            yield word if i == 0 else " " + word
+
+    @staticmethod
+    def _respond(prompt):
+        digest = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+        if "'sections'" in prompt:
+            titles = ("The Beginning", "The Discovery", "The Intelligence", "The Future")
+            return json.dumps({"sections": [
+                {"title": title, "text": f"Mock section {i + 1} ({digest}).", "align": "left" if i % 2 == 0 else "right"}
+                for i, title in enumerate(titles)
+            ]})
+        return f"Mock insight ({digest}): the top features drive the predictions; review them against domain knowledge."
+
+
+class LLMClient:
+    """
+    `await client.generate(prompt)` returns the response text. At most `max_concurrency`
+    provider calls run at once; each caller waits at most `timeout` seconds (a timed-out
+    call finishes in the background and is still cached). Raises LLMTimeoutError on timeout.
+    """
+
+    def __init__(self, provider, max_concurrency=LLM_CONCURRENCY, timeout=LLM_TIMEOUT,
+                 cache_size=LLM_CACHE_SIZE, cache_ttl=LLM_CACHE_TTL):
+        self.provider = provider
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        # Pool size is the concurrency limit: excess calls queue instead of piling up threads
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+        self._cache = OrderedDict() # prompt hash -> (expires at, text)
+        self._inflight = {} # prompt hash -> concurrent Future shared by identical prompts
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, prompt):
+        return hashlib.sha256(f"{self.provider.name}\0{prompt}".encode()).hexdigest()
+
+    def cached(self, prompt):
+        """
+        Cached response text for `prompt`, or None.
+        """
+        key = self._key(prompt)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return entry[1]
+
+    def _store(self, key, text):
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.cache_ttl, text)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _call(self, key, prompt):
+        try:
+            with stage(f"llm.{self.provider.name}"):
+                text = self.provider.generate(prompt)
+            self._store(key, text)
+            return text
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def generate(self, prompt):
+        text = self.cached(prompt)
+        if text is not None:
+            self.hits += 1
+            return text
+        self.misses += 1
+        key = self._key(prompt)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._inflight[key] = self._executor.submit(self._call, key, prompt)
+        try:
+            # shield: a caller that gives up must not cancel the call other callers share
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), self.timeout)
+        except asyncio.TimeoutError:
+            raise LLMTimeoutError(f"LLM call timed out after {self.timeout:g}s") from None
+
+    async def stream(self, prompt):
+        """
+        Async iterator of response chunks. A cached response comes back as one chunk.
+        The provider iterator runs in the pool and is abandoned at the next chunk once
+        the consumer stops iterating; only complete responses are cached.
+        Raises LLMTimeoutError when no chunk arrives within `timeout` seconds.
+        """
+        text = self.cached(prompt)
+        if text is not None:
+            self.hits += 1
+            yield text
+            return
+        self.misses += 1
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        cancelled = threading.Event()
+        done = object()
+
+        def produce():
+            chunks = []
+            try:
+                with stage(f"llm.{self.provider.name}.stream"):
+                    for chunk in self.provider.stream(prompt):
+                        if cancelled.is_set():
+                            return
+                        chunks.append(chunk)
+                        loop.call_soon_threadsafe(queue.put_nowait, chunk)
+                self._store(self._key(prompt), "".join(chunks))
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+            except Exception as e:
+                if not cancelled.is_set():
+                    loop.call_soon_threadsafe(queue.put_nowait, e)
+
+        self._executor.submit(produce)
+        start = time.perf_counter()
+        first = True
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), self.timeout)
+                except asyncio.TimeoutError:
+                    raise LLMTimeoutError(f"LLM stream stalled for {self.timeout:g}s") from None
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                if first:
+                    observe_stage(f"llm.{self.provider.name}.first_chunk", time.perf_counter() - start)
+                    first = False
+                yield item
+        finally:
+            # Consumer finished, failed or went away: stop the provider at its next chunk
+            cancelled.set()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._cache)
+        return {"provider": self.provider.name, "cache_size": size, "hits": self.hits, "misses": self.misses}
+
+
+def build_client(provider=None, api_key=None):
+    """
+    Client for INSIGHTLENS_LLM_PROVIDER ("gemini", the default when GEMINI_API_KEY is
+    set, or "mock"), or None for simulation mode. Read at call time so .env applies.
+    """
+    provider = provider or os.getenv("INSIGHTLENS_LLM_PROVIDER")
+    api_key = api_key or os.getenv("GEMINI_API_KEY")
+    if provider == "mock":
+        return LLMClient(MockProvider())
+    if provider in (None, "", "gemini") and api_key:
+        return LLMClient(GeminiProvider(api_key))
+    return None
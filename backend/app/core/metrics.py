@@ -0,0 +1,209 @@
+# Request and stage timings.
+# `MetricsMiddleware` times every request; `stage(...)` blocks inside the routers and
+# core modules time data loading, preprocessing, fitting, SHAP, serialization and LLM
+# calls. Both are exposed as Prometheus histograms at GET /metrics.
+# With INSIGHTLENS_PROFILING=1 a request sent with an `X-Profile: 1` header is also
+# run under cProfile (pyinstrument when installed); the report is returned in place
+# of the response, or saved to INSIGHTLENS_PROFILE_DIR.
+import contextlib
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+import uuid
+from app.core.batching import Histogram
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+PROFILING_ENABLED = os.getenv("INSIGHTLENS_PROFILING", "0") == "1"
+PROFILE_DIR = os.getenv("INSIGHTLENS_PROFILE_DIR") # Save profiles here instead of returning them
+PROFILE_HEADER = b"x-profile"
+
+
+class HistogramFamily:
+    """
+    Histograms sharing a name and label names, one child per label combination.
+    """
+
+    def __init__(self, name, description, labelnames, buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.buckets = buckets
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, Histogram(self.buckets))
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for values, histogram in children:
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, values))
+            snapshot = histogram.snapshot()
+            for bound, count in snapshot["buckets"].items():
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {snapshot['sum']}")
+            lines.append(f"{self.name}_count{{{labels}}} {snapshot['count']}")
+        return lines
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUEST_SECONDS = HistogramFamily(
+    "insightlens_request_duration_seconds", "HTTP request latency.", ("method", "route", "status")
+)
+STAGE_SECONDS = HistogramFamily(
+    "insightlens_stage_duration_seconds", "Time spent in named processing stages.", ("stage",)
+)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """
+    Time the enclosed block as stage `name` (also when it raises).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(name).observe(time.perf_counter() - start)
+
+
+def observe_stage(name, seconds):
+    """
+    Record a stage timed elsewhere (e.g. a model fit measured inside a pool worker).
+    """
+    STAGE_SECONDS.labels(name).observe(seconds)
+
+
+def render_prometheus():
+    return "\n".join(REQUEST_SECONDS.render() + STAGE_SECONDS.render()) + "\n"
+
+
+class _Profiler:
+    """
+    pyinstrument when installed (async-aware, HTML output), else cProfile (text report).
+    """
+
+    def __init__(self):
+        try:
+            from pyinstrument import Profiler
+            self._profiler, self.kind = Profiler(async_mode="enabled"), "pyinstrument"
+        except ImportError:
+            self._profiler, self.kind = cProfile.Profile(), "cprofile"
+
+    def start(self):
+        if self.kind == "pyinstrument":
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+
+    def stop(self):
+        if self.kind == "pyinstrument":
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+
+    def report(self):
+        """
+        Returns (bytes, content type, file extension).
+        """
+        if self.kind == "pyinstrument":
+            return self._profiler.output_html().encode(), b"text/html; charset=utf-8", "html"
+        out = io.StringIO()
+        pstats.Stats(self._profiler, stream=out).sort_stats("cumulative").print_stats(60)
+        return out.getvalue().encode(), b"text/plain; charset=utf-8", "txt"
+
+
+# Only one profiled request at a time: profilers are process-wide
+_profile_lock = threading.Lock()
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (streaming responses are timed until their last chunk).
+    Requests are labelled with their route template, e.g. /predict/metadata/{model_id}.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = PROFILING_ENABLED and dict(scope["headers"]).get(PROFILE_HEADER, b"0") not in (b"", b"0")
+        if profile and _profile_lock.acquire(blocking=False):
+            try:
+                await self._profiled(scope, receive, send)
+            finally:
+                _profile_lock.release()
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self._observe(scope, status, time.perf_counter() - start)
+
+    def _observe(self, scope, status, seconds):
+        route = scope.get("route")
+        # Unmatched paths share one label so random URLs cannot grow the metric set
+        path = getattr(route, "path", "unmatched")
+        REQUEST_SECONDS.labels(scope["method"], path, status).observe(seconds)
+
+    async def _profiled(self, scope, receive, send):
+        # Work pushed to thread/process pools is only visible as time spent waiting
+        messages = []
+
+        async def buffer(message):
+            messages.append(message)
+
+        profiler = _Profiler()
+        start = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, buffer)
+        finally:
+            profiler.stop()
+        status = next((m["status"] for m in messages if m["type"] == "http.response.start"), 500)
+        self._observe(scope, status, time.perf_counter() - start)
+        body, content_type, extension = profiler.report()
+
+        if PROFILE_DIR:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.{extension}")
+            with open(path, "wb") as f:
+                f.write(body)
+            for message in messages:
+                if message["type"] == "http.response.start":
+                    message = {**message, "headers": list(message.get("headers", [])) + [(b"x-profile-path", path.encode())]}
+                await send(message)
+            return
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode()), (b"x-profile", profiler.kind.encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,301 @@
+# Fitted feature pipeline shared by training, prediction and explainability.
+# Fitting happens once at training time; the fitted object is stored with each
+# model so every later request applies exactly the same encoding.
+# pandas, scipy and sklearn are imported where they are used: this module is loaded
+# at application startup, well before the first training or prediction request.
+import numpy as np
+
+CURRENCY_PATTERN = r'[$,]'
+MAX_CATEGORIES = 50 # Threshold for "too many categories"
+ENCODINGS = ("dense", "sparse")
+HIGH_CARDINALITY = ("drop", "frequency", "target")
+TARGET_SMOOTHING = 10 # m-estimate weight of the global mean in target encoding
+TARGET_FOLDS = 5 # Out-of-fold target encoding of the training rows
+
+
+def is_text_column(series):
+    """
+    True for object/string columns (pandas >= 3 infers a dedicated string dtype).
+    """
+    import pandas as pd
+
+    return not isinstance(series.dtype, pd.CategoricalDtype) and (
+        pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)
+    )
+
+
+def coerce_numeric(series):
+    """
+    Convert a text column that holds formatted numbers (e.g. "1,234", "$500")
+    to numbers. Returns None if any value is not numeric after cleaning.
+    """
+    import pandas as pd
+
+    try:
+        cleaned = series.astype(str).str.replace(CURRENCY_PATTERN, '', regex=True)
+        return pd.to_numeric(cleaned)
+    except (ValueError, TypeError):
+        return None
+
+
+def rows_with_missing(X):
+    """
+    Boolean mask of rows holding a NaN, for dense or scipy sparse matrices.
+    """
+    import scipy.sparse as sp
+
+    if sp.issparse(X):
+        X = X.tocsr()
+        mask = np.zeros(X.shape[0], dtype=bool)
+        positions = np.flatnonzero(np.isnan(X.data))
+        mask[np.searchsorted(X.indptr, positions, side="right") - 1] = True
+        return mask
+    return np.isnan(X).any(axis=1)
+
+
+class FeaturePipeline:
+    """
+    Numeric coercion, high-cardinality handling and one-hot encoding with a fixed
+    category vocabulary (drop_first semantics, matching `pd.get_dummies`).
+
+    Columns with more than `max_categories` values are dropped, frequency encoded
+    or (smoothed, out-of-fold) target encoded depending on `high_cardinality`.
+    `transform` accepts a DataFrame or any mapping of column -> values and
+    returns a float matrix whose columns are `feature_names`: dense, or scipy
+    CSR with `encoding="sparse"` (wide one-hot blocks are mostly zeros).
+    """
+
+    # Defaults for pipelines pickled before these options existed
+    encoding = "dense"
+    high_cardinality = "drop"
+    encoded_columns = []
+
+    def __init__(self, max_categories=MAX_CATEGORIES, encoding="dense", high_cardinality="drop"):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"encoding must be one of {ENCODINGS}")
+        if high_cardinality not in HIGH_CARDINALITY:
+            raise ValueError(f"high_cardinality must be one of {HIGH_CARDINALITY}")
+        self.max_categories = max_categories
+        self.encoding = encoding
+        self.high_cardinality = high_cardinality
+
+    def fit(self, X, y=None, problem_type=None):
+        """
+        Learn the column layout. `y` (numeric; class codes for classification)
+        and `problem_type` are needed for target encoding and ignored otherwise.
+        """
+        import pandas as pd
+
+        self.coerced_columns = []
+        self.numeric_columns = []
+        self.categorical_columns = []
+        self.encoded_columns = [] # High-cardinality columns mapped to one number
+        self.dropped_columns = []
+        self.input_schema = []
+        self._vocab = {}
+        self._encodings = {} # col -> (pd.Series value -> number, fallback for unseen values)
+
+        target = self._target_values(y, problem_type)
+        for col in X.columns:
+            series = X[col]
+            if is_text_column(series):
+                numeric = coerce_numeric(series)
+                if numeric is not None:
+                    self.coerced_columns.append(col)
+                    series = numeric
+
+            if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+                self.numeric_columns.append(col)
+                self.input_schema.append({"name": col, "type": "numeric"})
+                continue
+
+            if series.nunique() > self.max_categories:
+                if self.high_cardinality == "drop":
+                    # Drop high-cardinality columns (e.g., IDs, Names) to prevent MemoryError
+                    # from a massive one-hot expansion (e.g., 23k+ columns)
+                    self.dropped_columns.append(col)
+                    continue
+                self.encoded_columns.append(col)
+                self._encodings[col] = self._fit_encoding(series, target)
+                # Too many values for a dropdown: free-text input
+                self.input_schema.append({"name": col, "type": "categorical", "options": []})
+                continue
+
+            self.categorical_columns.append(col)
+            self._vocab[col] = pd.Index(self._categories(series))
+            self.input_schema.append({
+                "name": col,
+                "type": "categorical",
+                "options": series.dropna().unique().tolist()
+            })
+
+        # Same column layout as pd.get_dummies(drop_first=True): passthrough columns first,
+        # then one block per categorical column without its first category
+        self._encoding_kind = "target" if target is not None else "frequency"
+        self.feature_names = list(self.numeric_columns)
+        self.feature_names.extend(f"{col}_{self._encoding_kind}" for col in self.encoded_columns)
+        self._n_dense = len(self.feature_names)
+        self._offsets = {}
+        for col in self.categorical_columns:
+            self._offsets[col] = len(self.feature_names)
+            self.feature_names.extend(f"{col}_{cat}" for cat in self._vocab[col][1:])
+        self._numeric_index = {col: i for i, col in enumerate(self.numeric_columns)}
+        return self
+
+    def fit_transform(self, X, y=None, problem_type=None):
+        """
+        Fit, then transform the training rows. Target-encoded columns use
+        out-of-fold values so no row is encoded with its own label.
+        """
+        import pandas as pd
+        from sklearn.model_selection import KFold
+
+        self.fit(X, y, problem_type)
+        if not self.encoded_columns or self._encoding_kind != "target":
+            return self.transform(X)
+
+        target = self._target_values(y, problem_type)
+        folds = KFold(min(TARGET_FOLDS, len(X)), shuffle=True, random_state=42) if len(X) > 1 else None
+        encoded = {}
+        for col in self.encoded_columns:
+            values = np.asarray(X[col], dtype=object)
+            encoded[col] = np.full(len(X), self._encodings[col][1])
+            if folds is None:
+                continue
+            for fit_rows, held_out in folds.split(values):
+                mapping, fallback = self._fit_encoding(pd.Series(values[fit_rows]), target[fit_rows])
+                encoded[col][held_out] = self._apply_encoding(mapping, fallback, values[held_out])
+        return self._transform(X, encoded)
+
+    def _target_values(self, y, problem_type):
+        if self.high_cardinality != "target" or y is None:
+            return None
+        y = np.asarray(y)
+        if problem_type == "classification":
+            classes = np.unique(y)
+            if len(classes) != 2:
+                # One rate per class does not fit one column: multi-class falls back to frequency
+                return None
+            # Binary: encode the rate of the second class
+            return (y == classes[1]).astype(np.float64)
+        return y.astype(np.float64)
+
+    def _fit_encoding(self, series, target):
+        import pandas as pd
+
+        values = series.astype(object)
+        if target is None:
+            frequencies = values.value_counts(normalize=True, dropna=True)
+            return frequencies, 0.0
+        # m-estimate: categories with few rows shrink towards the global mean
+        prior = float(np.mean(target))
+        stats = pd.DataFrame({"value": values.to_numpy(), "target": target}).groupby("value")["target"].agg(["sum", "count"])
+        return (stats["sum"] + TARGET_SMOOTHING * prior) / (stats["count"] + TARGET_SMOOTHING), prior
+
+    @staticmethod
+    def _apply_encoding(mapping, fallback, values):
+        codes = mapping.index.get_indexer(np.asarray(values, dtype=object))
+        return np.where(codes >= 0, mapping.to_numpy(dtype=np.float64)[codes], fallback)
+
+    @staticmethod
+    def _categories(series):
+        import pandas as pd
+
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            return list(series.cat.categories)
+        values = series.dropna().unique()
+        try:
+            return sorted(values)
+        except TypeError:
+            # Mixed types cannot be ordered; keep order of appearance
+            return list(values)
+
+    def _numeric_values(self, col, values):
+        import pandas as pd
+
+        values = pd.Series(values)
+        # Text input (batch CSVs, form values) may be formatted even when the training
+        # column was already converted to numbers on upload
+        if col in self.coerced_columns or is_text_column(values):
+            cleaned = values.astype(str).str.replace(CURRENCY_PATTERN, '', regex=True)
+            if values.dtype == object:
+                # Mixed input (e.g. JSON booleans or numbers next to strings): only clean the strings
+                cleaned = cleaned.where(values.map(lambda v: isinstance(v, str)), values)
+            values = cleaned
+        return pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64)
+
+    def transform(self, X):
+        return self._transform(X)
+
+    def _transform(self, X, encoded=None):
+        import pandas as pd
+        import scipy.sparse as sp
+
+        # `encoded` overrides the values of target-encoded columns (out-of-fold at fit time)
+        encoded = encoded or {}
+        if isinstance(X, pd.DataFrame):
+            n_rows = len(X)
+        else:
+            n_rows = len(next(iter(X.values()))) if X else 0
+        sparse = self.encoding == "sparse"
+        width = self._n_dense if sparse else len(self.feature_names)
+        out = np.zeros((n_rows, width), dtype=np.float64)
+
+        for col, i in self._numeric_index.items():
+            # Columns missing from the input stay 0, like reindex(fill_value=0)
+            if col in X:
+                out[:, i] = self._numeric_values(col, X[col])
+
+        for j, col in enumerate(self.encoded_columns):
+            if col in encoded:
+                out[:, len(self.numeric_columns) + j] = encoded[col]
+            elif col in X:
+                mapping, fallback = self._encodings[col]
+                out[:, len(self.numeric_columns) + j] = self._apply_encoding(mapping, fallback, X[col])
+
+        one_hot_rows, one_hot_cols = [], []
+        for col in self.categorical_columns:
+            if col not in X:
+                continue
+            codes = self._vocab[col].get_indexer(np.asarray(X[col], dtype=object))
+            # Code 0 is the dropped first category; -1 (unseen value) encodes as all zeros
+            rows = np.flatnonzero(codes > 0)
+            if sparse:
+                one_hot_rows.append(rows)
+                one_hot_cols.append(self._offsets[col] + codes[rows] - 1)
+            else:
+                out[rows, self._offsets[col] + codes[rows] - 1] = 1.0
+        if not sparse:
+            return out
+
+        rows = np.concatenate(one_hot_rows) if one_hot_rows else np.empty(0, dtype=np.int64)
+        cols = np.concatenate(one_hot_cols) if one_hot_cols else np.empty(0, dtype=np.int64)
+        one_hot = sp.csr_matrix(
+            (np.ones(len(rows)), (rows, cols - self._n_dense)),
+            shape=(n_rows, len(self.feature_names) - self._n_dense),
+        )
+        return sp.hstack([sp.csr_matrix(out), one_hot], format="csr")
+
+    def transform_records(self, records):
+        """
+        Transform a list of {column: value} rows without building a DataFrame.
+        A key missing from a row encodes like a column missing from the input (0, no
+        one-hot bit), whichever rows it is transformed with.
+        """
+        import scipy.sparse as sp
+
+        columns, encoded = {}, {}
+        for col in self.numeric_columns + self.encoded_columns + self.categorical_columns:
+            present = np.array([col in r for r in records], dtype=bool)
+            if not present.any():
+                continue
+            # None is in no category vocabulary: the row gets no one-hot bit
+            default = 0 if col in self._numeric_index else None
+            columns[col] = [r.get(col, default) for r in records]
+            if col in self.encoded_columns and not present.all():
+                mapping, fallback = self._encodings[col]
+                encoded[col] = np.where(present, self._apply_encoding(mapping, fallback, columns[col]), 0.0)
+        if not columns:
+            empty = np.zeros((len(records), len(self.feature_names)), dtype=np.float64)
+            return sp.csr_matrix(empty) if self.encoding == "sparse" else empty
+        return self._transform(columns, encoded)
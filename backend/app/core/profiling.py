@@ -0,0 +1,57 @@
+# Dataset profiles, computed once per dataset version and cached in the store.
+# Shared by GET /data/profile and /insight/story; precomputed after upload.
+# Correlations come from the block-wise engine (app/core/correlation.py); the
+# profile carries only the strongest pairs, GET /data/correlations the rest.
+import threading
+from collections import defaultdict
+from app.core.store import DATASETS
+from app.core.metrics import stage
+from app.core.correlation import compute_correlations, get_correlations
+
+PROFILE_ARTIFACT = "profile"
+TOP_CORRELATIONS = 10
+
+_locks = defaultdict(threading.Lock)
+
+
+def compute_profile(df, correlations=None):
+    """
+    Summary statistics, column types, missing counts and the strongest numeric
+    correlations (`correlations`: a precomputed compute_correlations result).
+    """
+    profile = {
+        "columns": list(df.columns),
+        "shape": list(df.shape),
+        "dtypes": {k: str(v) for k, v in df.dtypes.items()},
+        "missing": df.isnull().sum().to_dict(),
+        "description": df.describe(include='all').fillna("NaN").to_dict()
+    }
+
+    if correlations is None:
+        correlations = compute_correlations(df, k=TOP_CORRELATIONS)
+    if correlations["columns"]:
+        profile["top_correlations"] = correlations["top"][:TOP_CORRELATIONS]
+    return profile
+
+
+def get_profile(dataset_id):
+    """
+    Return the cached profile for the current dataset version, computing it if needed.
+    Blocking: call from a worker thread. Concurrent callers share one computation.
+    """
+    cached = DATASETS.get_artifact(dataset_id, PROFILE_ARTIFACT)
+    if cached is not None:
+        return cached
+
+    with _locks[dataset_id]:
+        # Another thread may have finished it while we waited for the lock
+        cached = DATASETS.get_artifact(dataset_id, PROFILE_ARTIFACT)
+        if cached is not None:
+            return cached
+        version = DATASETS.version(dataset_id)
+        # Cached on its own too: GET /data/correlations serves more pairs from it
+        correlations = get_correlations(dataset_id)
+        with stage("profile.compute"):
+            profile = compute_profile(DATASETS.get_frame(dataset_id), correlations)
+        DATASETS.put_artifact(dataset_id, PROFILE_ARTIFACT, profile, version=version)
+        return profile
@@ -0,0 +1,151 @@
+# Model registry.
+# Every trained model (estimator + fitted pipeline + metadata) is serialized to
+# `<INSIGHTLENS_DATA_DIR>/models`. Models are loaded lazily on first use and kept
+# in a bounded LRU; evicted models are simply re-read from disk when needed.
+# The files are the source of truth, so several worker processes can share one
+# INSIGHTLENS_DATA_DIR: a model rewritten or deleted by another process is noticed
+# through the artifact's mtime.
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from app.core.store import DATA_DIR
+
+MODEL_CACHE_SIZE = int(os.getenv("INSIGHTLENS_MODEL_CACHE_SIZE", "8"))
+MODEL_CACHE_MB = float(os.getenv("INSIGHTLENS_MODEL_CACHE_MB", "0")) # 0 = no memory budget
+
+# Metadata fields kept in the JSON sidecar (listable without loading the model)
+METADATA_FIELDS = ("name", "type", "target", "features", "input_schema", "metrics", "dataset_id", "created_at", "version")
+
+
+class ModelRegistry:
+    """
+    Mapping-style access to trained models: `MODELS[model_id]` returns the model info
+    dict ("model", "pipeline", "name", "type", "features", "input_schema", "target", ...).
+    """
+
+    def __init__(self, root=DATA_DIR, max_models=MODEL_CACHE_SIZE, max_mb=MODEL_CACHE_MB):
+        self.root = os.path.join(root, "models")
+        os.makedirs(self.root, exist_ok=True)
+        self.max_models = max_models
+        self.max_bytes = max_mb * 1024 * 1024
+        self._cache = OrderedDict() # model_id -> (size_bytes, info, artifact mtime)
+        self._lock = threading.Lock()
+
+    def _path(self, model_id, ext):
+        if os.path.basename(model_id) != model_id:
+            raise KeyError(model_id)
+        return os.path.join(self.root, f"{model_id}.{ext}")
+
+    def _write_atomic(self, path, write):
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            write(tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def __contains__(self, model_id):
+        try:
+            return os.path.exists(self._path(model_id, "json"))
+        except KeyError:
+            return False
+
+    def __setitem__(self, model_id, info):
+        import joblib
+
+        # Every write (including a refit replacing a model in place) gets a new version
+        info = {"created_at": time.time(), **info, "version": uuid.uuid4().hex}
+        artifact = self._path(model_id, "joblib")
+        self._write_atomic(artifact, lambda path: joblib.dump(info, path))
+        stat = os.stat(artifact)
+        size = stat.st_size
+
+        meta = {k: info[k] for k in METADATA_FIELDS if k in info}
+        meta["model_id"] = model_id
+        meta["size_bytes"] = size
+
+        def write_metadata(path):
+            with open(path, "w") as f:
+                json.dump(meta, f, default=str)
+
+        # Artifact first, metadata last: a model is only listed once it can be loaded
+        self._write_atomic(self._path(model_id, "json"), write_metadata)
+        self._remember(model_id, size, info, stat.st_mtime_ns)
+
+    def __getitem__(self, model_id):
+        import joblib
+
+        if model_id not in self:
+            with self._lock:
+                self._cache.pop(model_id, None) # Deleted by another process
+            raise KeyError(model_id)
+        artifact = self._path(model_id, "joblib")
+        try:
+            stat = os.stat(artifact)
+        except FileNotFoundError:
+            raise KeyError(model_id)
+
+        with self._lock:
+            cached = self._cache.get(model_id)
+            if cached is not None and cached[2] == stat.st_mtime_ns:
+                self._cache.move_to_end(model_id)
+                return cached[1]
+
+        info = joblib.load(artifact)
+        self._remember(model_id, stat.st_size, info, stat.st_mtime_ns)
+        return info
+
+    def __delitem__(self, model_id):
+        if model_id not in self:
+            raise KeyError(model_id)
+        with self._lock:
+            self._cache.pop(model_id, None)
+        for ext in ("json", "joblib"):
+            try:
+                os.remove(self._path(model_id, ext))
+            except FileNotFoundError:
+                pass
+
+    def _remember(self, model_id, size, info, mtime):
+        with self._lock:
+            self._cache[model_id] = (size, info, mtime)
+            self._cache.move_to_end(model_id)
+            # Serialized size is the memory proxy; always keep the most recent model
+            while len(self._cache) > 1 and (
+                len(self._cache) > self.max_models
+                or (self.max_bytes and sum(entry[0] for entry in self._cache.values()) > self.max_bytes)
+            ):
+                self._cache.popitem(last=False)
+
+    def is_loaded(self, model_id):
+        return model_id in self._cache
+
+    def version(self, model_id):
+        return self.metadata(model_id).get("version", "0") # Models saved before versioning
+
+    def metadata(self, model_id):
+        try:
+            with open(self._path(model_id, "json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise KeyError(model_id)
+
+    def list(self):
+        models = []
+        for name in os.listdir(self.root):
+            if name.endswith(".json"):
+                try:
+                    meta = self.metadata(name[:-5])
+                except (KeyError, ValueError): # Deleted or half-written meanwhile
+                    continue
+                meta["loaded"] = self.is_loaded(meta["model_id"])
+                models.append(meta)
+        models.sort(key=lambda m: m.get("created_at", 0), reverse=True)
+        return models
+
+
+MODELS = ModelRegistry()
@@ -0,0 +1,61 @@
+# Fast JSON responses.
+# orjson serializes NaN/Inf as null and numpy arrays natively, so payloads no
+# longer need a recursive clean-up pass. Routers return FastJSONResponse(...)
+# directly: returning a plain dict would still go through FastAPI's
+# jsonable_encoder, which walks the whole payload in Python again.
+import datetime
+import decimal
+import sys
+import numpy as np
+import orjson
+from fastapi.responses import JSONResponse
+from app.core.metrics import stage
+
+OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj):
+    """
+    Fallback for types orjson does not handle natively. Returned values are
+    serialized again by orjson (NaN inside them still becomes null).
+    """
+    # Pandas objects can only exist once pandas is loaded: not imported here for them
+    pd = sys.modules.get("pandas")
+    if pd is not None:
+        if isinstance(obj, pd.DataFrame):
+            return obj.to_dict(orient="records")
+        if isinstance(obj, (pd.Series, pd.Index)):
+            return obj.tolist()
+        if obj is pd.NaT or obj is pd.NA:
+            return None
+        if isinstance(obj, (pd.Timedelta, pd.Interval, pd.Period)):
+            return str(obj)
+    if isinstance(obj, np.ndarray):
+        # Object/datetime arrays are not covered by OPT_SERIALIZE_NUMPY
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content):
+    return orjson.dumps(content, default=_default, option=OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered in one pass by orjson, with NaN/Inf -> null and
+    native support for numpy scalars/arrays and pandas objects.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content):
+        with stage("serialize"):
+            return dumps(content)
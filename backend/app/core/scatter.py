@@ -0,0 +1,125 @@
+# Server-side reduction of scatter plot data.
+# "sample" mode returns a deterministic, shape-preserving subset of points
+# (one representative per occupied grid cell plus the extremes); "density" mode
+# returns a 2D histogram. Results are cached per dataset version and parameters.
+import threading
+from collections import OrderedDict
+import numpy as np
+
+DEFAULT_BUDGET = 1000
+MAX_BUDGET = 20000
+DEFAULT_BINS = 50
+MAX_BINS = 500
+CACHE_SIZE = 64
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def cached(key, compute):
+    """
+    Small LRU keyed on (dataset_id, version, x, y, mode, size).
+    """
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    value = compute()
+    with _lock:
+        _cache[key] = value
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return value
+
+
+def _cell_ids(x, y, cells):
+    # Bin both axes into `cells` equal-width bins over their ranges
+    def bins(values):
+        low, high = values.min(), values.max()
+        if high == low:
+            return np.zeros(len(values), dtype=np.int64)
+        return np.minimum(((values - low) / (high - low) * cells).astype(np.int64), cells - 1)
+    return bins(x) * cells + bins(y)
+
+
+def grid_downsample(x, y, budget=DEFAULT_BUDGET):
+    """
+    Indices of at most `budget` points that preserve the shape of the cloud:
+    the extremes of both axes plus the first point of every occupied grid cell.
+    The grid is refined until about `budget` cells are occupied, so sparse
+    regions and outliers are kept while dense regions are thinned.
+    """
+    n = len(x)
+    if n <= budget:
+        return np.arange(n)
+
+    extremes = np.unique([x.argmin(), x.argmax(), y.argmin(), y.argmax()])
+    remaining = max(budget - len(extremes), 0)
+
+    cells = max(int(np.sqrt(remaining)), 1)
+    while True:
+        _, first = np.unique(_cell_ids(x, y, cells), return_index=True)
+        # Stop once the grid is fine enough (or cannot usefully get finer)
+        if len(first) >= remaining // 2 or cells >= 4096:
+            break
+        cells *= 2
+
+    if len(first) > remaining:
+        # Evenly thin the representatives (cell order is spatial, so this stays stratified)
+        first = first[np.linspace(0, len(first) - 1, remaining).astype(np.int64)]
+    return np.union1d(first, extremes)
+
+
+def density_grid(x, y, bins=DEFAULT_BINS):
+    """
+    2D histogram of the points as bin edges plus a (bins x bins) count matrix.
+    counts[i][j] is the number of points with x in bin i and y in bin j.
+    """
+    counts, x_edges, y_edges = np.histogram2d(x, y, bins=bins)
+    return {
+        "x_edges": x_edges,
+        "y_edges": y_edges,
+        "counts": counts.astype(np.int64),
+        "total": int(len(x)),
+    }
+
+
+def numeric_xy(df, x, y):
+    """
+    Finite numeric x/y arrays plus their row positions (NaN/Inf and non-numeric
+    values are dropped), or None if either column is not numeric at all.
+    """
+    import pandas as pd
+
+    xs = pd.to_numeric(df[x], errors="coerce").to_numpy(dtype=np.float64)
+    ys = pd.to_numeric(df[y], errors="coerce").to_numpy(dtype=np.float64)
+    if np.isnan(xs).all() or np.isnan(ys).all():
+        return None
+    finite = np.isfinite(xs) & np.isfinite(ys)
+    return xs[finite], ys[finite], np.flatnonzero(finite)
+
+
+def scatter_points(df, x, y, budget=DEFAULT_BUDGET):
+    """
+    At most `budget` {x, y} records. Numeric pairs use `grid_downsample`;
+    other columns fall back to a seeded (so still repeatable) random sample.
+    """
+    columns = list(dict.fromkeys([x, y]))
+    arrays = numeric_xy(df, x, y)
+    if arrays is None:
+        plot_df = df[columns].sample(budget, random_state=0) if len(df) > budget else df[columns]
+        return plot_df.to_dict(orient="records")
+    xs, ys, rows = arrays
+    keep = rows[grid_downsample(xs, ys, budget)]
+    return df[columns].iloc[keep].to_dict(orient="records")
+
+
+def scatter_density(df, x, y, bins=DEFAULT_BINS):
+    """
+    `density_grid` over the finite numeric x/y pairs. Raises ValueError for non-numeric columns.
+    """
+    arrays = numeric_xy(df, x, y)
+    if arrays is None:
+        raise ValueError("Density mode needs numeric x and y columns")
+    xs, ys, _ = arrays
+    return {"x": x, "y": y, "bins": bins, **density_grid(xs, ys, bins)}
@@ -1,2 +1,365 @@
-# In-memory storage for simple demo purposes (production would use a database or S3)
-DATASETS = {}
+# Dataset storage.
+# The default in-memory backend keeps the original demo behaviour. Set
+# INSIGHTLENS_STORE=disk to persist uploads as Arrow IPC files that are loaded
+# with memory mapping and column projection; a small LRU keeps hot DataFrames
+# resident. Files are written atomically, so several worker processes can share
+# one INSIGHTLENS_DATA_DIR (`uvicorn --workers N`); a `<id>.pending` marker makes
+# other processes wait for an upload that is still being parsed. `iter_batches`
+# streams a dataset in row chunks for out-of-core training.
+import json
+import os
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+STORE_BACKEND = os.getenv("INSIGHTLENS_STORE", "memory")
+DATA_DIR = os.getenv("INSIGHTLENS_DATA_DIR", "data")
+CACHE_SIZE = int(os.getenv("INSIGHTLENS_STORE_CACHE_SIZE", "4"))
+
+
+class DatasetStore(ABC):
+    """
+    Mapping-style interface shared by all backends.
+
+    Records are dicts with "id", "filename", "data" (a DataFrame), "columns" and "shape".
+    Every write stamps a new "version". `get_frame` returns only the DataFrame, optionally
+    projected to some columns. Derived results (profiles, ...) are cached per dataset
+    version with `put_artifact`/`get_artifact` and dropped when the dataset changes.
+    """
+
+    @abstractmethod
+    def __contains__(self, dataset_id):
+        ...
+
+    @abstractmethod
+    def __getitem__(self, dataset_id):
+        ...
+
+    @abstractmethod
+    def __setitem__(self, dataset_id, record):
+        ...
+
+    @abstractmethod
+    def __delitem__(self, dataset_id):
+        ...
+
+    @abstractmethod
+    def ids(self):
+        ...
+
+    def metadata(self, dataset_id):
+        """
+        The record without its DataFrame (cheap: never loads the data).
+        """
+        return {k: v for k, v in self[dataset_id].items() if k != "data"}
+
+    def get_frame(self, dataset_id, columns=None):
+        df = self[dataset_id]["data"]
+        return df[list(columns)] if columns is not None else df
+
+    def iter_batches(self, dataset_id, batch_rows, columns=None):
+        """
+        Yield the dataset in row order as DataFrames of at most `batch_rows` rows,
+        indexed by row position. Backends that read from disk hold one batch at a time.
+        """
+        df = self.get_frame(dataset_id, columns)
+        for start in range(0, len(df), batch_rows):
+            chunk = df.iloc[start:start + batch_rows]
+            yield chunk.set_axis(range(start, start + len(chunk)))
+
+    def version(self, dataset_id):
+        return self.metadata(dataset_id).get("version")
+
+    @abstractmethod
+    def get_artifact(self, dataset_id, name):
+        """
+        Cached value for the current dataset version, or None.
+        """
+
+    @abstractmethod
+    def put_artifact(self, dataset_id, name, value, version=None):
+        """
+        Cache `value` for `version` (default: the current one). Values computed from an
+        older version are ignored on read.
+        """
+
+    def mark_pending(self, dataset_id, error=None):
+        """
+        Record that `dataset_id` is being parsed (or failed to parse with `error`) so that
+        requests (in other processes too, for the disk store) wait for it or report the
+        error instead of answering 404.
+        """
+
+    def clear_pending(self, dataset_id):
+        pass
+
+    def pending(self, dataset_id):
+        """
+        {"error": None or message} while the dataset is being parsed or after parsing failed, else None.
+        """
+        return None
+
+
+class MemoryDatasetStore(DatasetStore):
+    """
+    Everything stays resident in this process (lost on restart).
+    """
+
+    def __init__(self):
+        self._records = {}
+        self._artifacts = {}
+        self._pending = {}
+
+    def __contains__(self, dataset_id):
+        return dataset_id in self._records
+
+    def __getitem__(self, dataset_id):
+        return self._records[dataset_id]
+
+    def __setitem__(self, dataset_id, record):
+        self._records[dataset_id] = {**record, "version": uuid.uuid4().hex}
+
+    def __delitem__(self, dataset_id):
+        del self._records[dataset_id]
+        for key in [k for k in self._artifacts if k[0] == dataset_id]:
+            del self._artifacts[key]
+
+    def metadata(self, dataset_id):
+        return {k: v for k, v in self._records[dataset_id].items() if k != "data"}
+
+    def get_artifact(self, dataset_id, name):
+        cached = self._artifacts.get((dataset_id, name))
+        if cached is not None and dataset_id in self and cached[0] == self.version(dataset_id):
+            return cached[1]
+        return None
+
+    def put_artifact(self, dataset_id, name, value, version=None):
+        self._artifacts[(dataset_id, name)] = (version or self.version(dataset_id), value)
+
+    def ids(self):
+        return list(self._records)
+
+    def mark_pending(self, dataset_id, error=None):
+        self._pending[dataset_id] = {"error": error}
+
+    def clear_pending(self, dataset_id):
+        self._pending.pop(dataset_id, None)
+
+    def pending(self, dataset_id):
+        return self._pending.get(dataset_id)
+
+
+def _to_arrow_table(df):
+    import pandas as pd
+    import pyarrow as pa
+
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+    # Mixed-type object columns (common in JSON uploads) have no Arrow type: store those as text
+    df = df.copy()
+    for col in df.columns:
+        try:
+            pa.array(df[col], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            df[col] = df[col].map(lambda v: None if pd.isna(v) else str(v))
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+class DiskDatasetStore(DatasetStore):
+    """
+    One `<id>.arrow` (Arrow IPC file format, memory-mappable) plus `<id>.json`
+    metadata per dataset under `<root>/datasets`.
+    """
+
+    def __init__(self, root=DATA_DIR, cache_size=CACHE_SIZE):
+        self.root = os.path.join(root, "datasets")
+        os.makedirs(self.root, exist_ok=True)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, dataset_id, ext):
+        # Ids are generated server-side; reject anything that could escape the store directory
+        if os.path.basename(dataset_id) != dataset_id:
+            raise KeyError(dataset_id)
+        return os.path.join(self.root, f"{dataset_id}.{ext}")
+
+    def _write_atomic(self, path, write):
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            write(tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def __contains__(self, dataset_id):
+        try:
+            return os.path.exists(self._path(dataset_id, "json"))
+        except KeyError:
+            return False
+
+    def metadata(self, dataset_id):
+        try:
+            with open(self._path(dataset_id, "json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise KeyError(dataset_id)
+
+    def __getitem__(self, dataset_id):
+        record = self.metadata(dataset_id)
+        record["data"] = self.get_frame(dataset_id)
+        return record
+
+    def __setitem__(self, dataset_id, record):
+        import pyarrow as pa
+
+        df = record["data"]
+        table = _to_arrow_table(df)
+
+        def write_table(path):
+            with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table, max_chunksize=64 * 1024)
+
+        def write_metadata(path):
+            meta = {k: v for k, v in record.items() if k != "data"}
+            meta["shape"] = list(meta.get("shape", df.shape))
+            meta["version"] = uuid.uuid4().hex
+            with open(path, "w") as f:
+                json.dump(meta, f, default=str)
+
+        # Data first, metadata last: a dataset is only visible once both exist
+        self._write_atomic(self._path(dataset_id, "arrow"), write_table)
+        self._write_atomic(self._path(dataset_id, "json"), write_metadata)
+        with self._lock:
+            self._cache.pop(dataset_id, None)
+
+    def __delitem__(self, dataset_id):
+        if dataset_id not in self:
+            raise KeyError(dataset_id)
+        with self._lock:
+            self._cache.pop(dataset_id, None)
+        for ext in ["json", "arrow", "pending"] + [f"{name}.json" for name in self._artifact_names(dataset_id)]:
+            try:
+                os.remove(self._path(dataset_id, ext))
+            except FileNotFoundError:
+                pass
+
+    def _artifact_names(self, dataset_id):
+        prefix, suffix = f"{dataset_id}.", ".json"
+        return [
+            name[len(prefix):-len(suffix)] for name in os.listdir(self.root)
+            if name.startswith(prefix) and name.endswith(suffix) and name != f"{dataset_id}.json"
+        ]
+
+    def get_artifact(self, dataset_id, name):
+        # Artifacts live next to the data (`<id>.<name>.json`) so every worker process shares them
+        try:
+            with open(self._path(dataset_id, f"{name}.json")) as f:
+                cached = json.load(f)
+        except (FileNotFoundError, KeyError, ValueError):
+            return None
+        if dataset_id in self and cached["version"] == self.version(dataset_id):
+            return cached["value"]
+        return None
+
+    def put_artifact(self, dataset_id, name, value, version=None):
+        version = version or self.version(dataset_id)
+
+        def write(path):
+            with open(path, "w") as f:
+                json.dump({"version": version, "value": value}, f, default=str)
+
+        self._write_atomic(self._path(dataset_id, f"{name}.json"), write)
+
+    def ids(self):
+        return [name[:-5] for name in os.listdir(self.root) if name.endswith(".json") and name.count(".") == 1]
+
+    def mark_pending(self, dataset_id, error=None):
+        def write(path):
+            with open(path, "w") as f:
+                json.dump({"error": error}, f)
+
+        self._write_atomic(self._path(dataset_id, "pending"), write)
+
+    def clear_pending(self, dataset_id):
+        try:
+            os.remove(self._path(dataset_id, "pending"))
+        except FileNotFoundError:
+            pass
+
+    def pending(self, dataset_id):
+        try:
+            with open(self._path(dataset_id, "pending")) as f:
+                return json.load(f)
+        except (FileNotFoundError, KeyError, ValueError):
+            return None
+
+    def get_frame(self, dataset_id, columns=None):
+        try:
+            # The file's mtime detects datasets rewritten by another worker process
+            mtime = os.stat(self._path(dataset_id, "arrow")).st_mtime_ns
+        except FileNotFoundError:
+            raise KeyError(dataset_id)
+
+        with self._lock:
+            cached = self._cache.get(dataset_id)
+            if cached is not None and cached[0] == mtime:
+                self._cache.move_to_end(dataset_id)
+                df = cached[1]
+                return df[list(columns)] if columns is not None else df
+
+        df = self._read(dataset_id, columns)
+        if columns is None:
+            # Only full frames are cached; projections are cheap to re-read from the memory map
+            with self._lock:
+                self._cache[dataset_id] = (mtime, df)
+                self._cache.move_to_end(dataset_id)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return df
+
+    def _read(self, dataset_id, columns=None):
+        import pyarrow as pa
+
+        with pa.memory_map(self._path(dataset_id, "arrow"), "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+            if columns is not None:
+                table = table.select(list(columns))
+            return table.to_pandas()
+
+    def iter_batches(self, dataset_id, batch_rows, columns=None):
+        import pyarrow as pa
+
+        try:
+            source = pa.OSFile(self._path(dataset_id, "arrow"), "r")
+        except FileNotFoundError:
+            raise KeyError(dataset_id)
+        # Plain reads rather than a memory map: pages of a streamed pass should not stay
+        # resident in this process. Record batches (64k rows at most) are converted one
+        # slice at a time; the open file stays valid if another worker replaces it meanwhile
+        with source:
+            reader = pa.ipc.open_file(source)
+            start = 0
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                if columns is not None:
+                    batch = batch.select(list(columns))
+                for offset in range(0, batch.num_rows, batch_rows):
+                    chunk = batch.slice(offset, batch_rows).to_pandas()
+                    yield chunk.set_axis(range(start, start + len(chunk)))
+                    start += len(chunk)
+
+
+def create_store(backend=STORE_BACKEND):
+    if backend == "memory":
+        return MemoryDatasetStore()
+    if backend == "disk":
+        return DiskDatasetStore()
+    raise ValueError(f"Unknown INSIGHTLENS_STORE backend '{backend}'")
+
+
+DATASETS = create_store()
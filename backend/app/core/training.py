@@ -0,0 +1,212 @@
+# Candidate estimators for the AutoML leaderboard.
+# `fit_candidate` and `search_candidate` run inside the training process pool, so
+# they must stay top-level, picklable functions that only receive plain data.
+# sklearn and xgboost are imported inside the functions: the API process loads this
+# module at startup but only the pool workers fit models.
+import math
+import time
+import numpy as np
+
+CANDIDATES = {
+    "classification": ["Logistic Regression", "Random Forest", "XGBoost"],
+    "regression": ["Linear Regression", "Random Forest", "XGBoost"],
+}
+
+
+# Hyperparameter search spaces (search mode only)
+SEARCH_SPACES = {
+    "Logistic Regression": {"C": [0.01, 0.1, 1.0, 10.0, 100.0]},
+    "Linear Regression": {},
+    "Random Forest": {
+        "n_estimators": [100, 200, 400],
+        "max_depth": [None, 8, 16],
+        "min_samples_leaf": [1, 2, 5],
+        "max_features": ["sqrt", 0.5, 1.0],
+    },
+    "XGBoost": {
+        "n_estimators": [100, 300],
+        "max_depth": [3, 6, 9],
+        "learning_rate": [0.03, 0.1, 0.3],
+        "subsample": [0.8, 1.0],
+        "colsample_bytree": [0.8, 1.0],
+    },
+}
+SEARCH_CONFIGS = 27 # Configurations sampled per family for the first rung
+HALVING_FACTOR = 3 # Successive halving keeps the best 1/3 and triples the rows
+MIN_SEARCH_ROWS = 500 # Smallest training subset used by the first rung
+
+
+def build_estimator(name, problem_type, params=None, n_jobs=None):
+    """
+    Return an unfitted estimator for a leaderboard candidate.
+    `params` override the defaults; `n_jobs` sets the thread count of RF/XGBoost.
+    """
+    from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+    from sklearn.linear_model import LogisticRegression, LinearRegression
+    import xgboost as xgb
+
+    params = params or {}
+    threads = {} if n_jobs is None else {"n_jobs": n_jobs}
+    if problem_type == "classification":
+        if name == "Logistic Regression":
+            return LogisticRegression(max_iter=1000, **params)
+        if name == "Random Forest":
+            return RandomForestClassifier(**{"n_estimators": 100, **params}, **threads)
+        if name == "XGBoost":
+            return xgb.XGBClassifier(eval_metric='logloss', **params, **threads)
+    else:
+        if name == "Linear Regression":
+            return LinearRegression(**params)
+        if name == "Random Forest":
+            return RandomForestRegressor(**{"n_estimators": 100, **params}, **threads)
+        if name == "XGBoost":
+            return xgb.XGBRegressor(**params, **threads)
+    raise ValueError(f"Unknown model '{name}' for {problem_type}")
+
+
+def score_predictions(problem_type, y_true, preds):
+    """
+    Leaderboard metrics for a set of test predictions.
+    """
+    from sklearn.metrics import accuracy_score, f1_score, r2_score, mean_squared_error
+
+    if problem_type == "classification":
+        return {
+            "accuracy": float(accuracy_score(y_true, preds)),
+            "f1": float(f1_score(y_true, preds, average='weighted')),
+        }
+    return {
+        "r2": float(r2_score(y_true, preds)),
+        "mse": float(mean_squared_error(y_true, preds)),
+    }
+
+
+def primary_metric(problem_type):
+    return "accuracy" if problem_type == "classification" else "r2"
+
+
+def ranking_metric(problem_type, search=False):
+    """
+    Leaderboard sort key: the less noisy CV mean in search mode, else the hold-out metric.
+    """
+    return "cv_mean" if search else primary_metric(problem_type)
+
+
+def fit_candidate(name, problem_type, X_train, y_train, X_test, y_test, params=None, n_jobs=None):
+    """
+    Fit one candidate and evaluate it on the held-out split.
+    Returns the fitted model together with its metrics.
+    """
+    model = build_estimator(name, problem_type, params, n_jobs)
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    preds = model.predict(X_test)
+    predict_seconds = time.perf_counter() - start
+    return {
+        "model": model,
+        "metrics": score_predictions(problem_type, y_test, preds),
+        "fit_seconds": fit_seconds,
+        "predict_seconds": predict_seconds,
+    }
+
+
+def _sample_configs(space, n, seed):
+    from sklearn.model_selection import ParameterGrid, ParameterSampler
+
+    if not space:
+        return [{}]
+    n = min(n, len(ParameterGrid(space)))
+    return list(ParameterSampler(space, n_iter=n, random_state=seed))
+
+
+def stratified_subsample(problem_type, X, y, rows, seed=42):
+    """
+    `rows` rows of (X, y), stratified by class for classification when possible.
+    """
+    from sklearn.model_selection import train_test_split
+
+    if rows >= X.shape[0]:
+        return X, y
+    stratify = None
+    if problem_type == "classification" and np.unique(y, return_counts=True)[1].min() >= 2:
+        stratify = y
+    try:
+        X_sub, _, y_sub, _ = train_test_split(X, y, train_size=rows, stratify=stratify, random_state=seed)
+    except ValueError: # Too few rows to hold every class
+        X_sub, _, y_sub, _ = train_test_split(X, y, train_size=rows, random_state=seed)
+    return X_sub, y_sub
+
+
+def cross_validate_config(name, problem_type, params, X, y, cv_folds, n_jobs=None, seed=42):
+    """
+    Per-fold scores of one configuration (primary metric; NaN for folds that failed).
+    """
+    from sklearn.model_selection import KFold, StratifiedKFold, cross_val_score
+
+    splitter = KFold(cv_folds, shuffle=True, random_state=seed)
+    if problem_type == "classification" and np.unique(y, return_counts=True)[1].min() >= cv_folds:
+        splitter = StratifiedKFold(cv_folds, shuffle=True, random_state=seed)
+    return cross_val_score(
+        build_estimator(name, problem_type, params, n_jobs), X, y,
+        cv=splitter, scoring=primary_metric(problem_type), error_score=np.nan,
+    )
+
+
+def search_candidate(name, problem_type, X_train, y_train, X_test, y_test,
+                     cv_folds=5, time_budget=60.0, n_jobs=None, seed=42):
+    """
+    Successive-halving hyperparameter search with k-fold CV for one family.
+    Sampled configurations are scored on a small subset first; the best
+    1/HALVING_FACTOR advance to a HALVING_FACTOR-times larger subset. The search
+    stops early once `time_budget` seconds are spent (at least one configuration
+    is always scored). The winner is refit on the whole training split and
+    evaluated on the held-out split like `fit_candidate`, plus its CV mean/variance.
+    """
+    start = time.perf_counter()
+    deadline = start + time_budget
+    survivors = _sample_configs(SEARCH_SPACES.get(name, {}), SEARCH_CONFIGS, seed)
+    y_train = np.asarray(y_train)
+
+    rungs = 1 + int(math.log(len(survivors), HALVING_FACTOR)) if len(survivors) > 1 else 1
+    rung_rows = [
+        min(X_train.shape[0], max(MIN_SEARCH_ROWS, int(X_train.shape[0] / HALVING_FACTOR ** (rungs - 1 - r))))
+        for r in range(rungs)
+    ]
+
+    best = None # (cv scores, params, rows)
+    evaluated = 0
+    stopped_early = False
+    for rows in rung_rows:
+        X_rung, y_rung = stratified_subsample(problem_type, X_train, y_train, rows, seed)
+        scored = []
+        for params in survivors:
+            if evaluated and time.perf_counter() >= deadline:
+                stopped_early = True
+                break
+            scores = cross_validate_config(name, problem_type, params, X_rung, y_rung, cv_folds, n_jobs, seed)
+            evaluated += 1
+            mean = np.nanmean(scores) if not np.isnan(scores).all() else -np.inf
+            scored.append((mean, scores, params))
+        if scored:
+            scored.sort(key=lambda item: item[0], reverse=True)
+            best = (scored[0][1], scored[0][2], X_rung.shape[0])
+        if stopped_early:
+            break
+        survivors = [params for _, _, params in scored[:max(1, math.ceil(len(scored) / HALVING_FACTOR))]]
+
+    scores, params, rows = best
+    result = fit_candidate(name, problem_type, X_train, y_train, X_test, y_test, params=params, n_jobs=n_jobs)
+    valid = scores[~np.isnan(scores)]
+    result["metrics"]["cv_mean"] = float(valid.mean()) if len(valid) else None
+    result["metrics"]["cv_variance"] = float(valid.var()) if len(valid) else None
+    result["search"] = {
+        "best_params": params,
+        "configs_evaluated": evaluated,
+        "cv_folds": cv_folds,
+        "cv_rows": rows,
+        "stopped_early": stopped_early,
+        "search_seconds": time.perf_counter() - start,
+    }
+    return result
@@ -0,0 +1,314 @@
+# Compiled tree ensembles for low-latency scoring.
+# A fitted Random Forest or XGBoost model is flattened once into NumPy arrays
+# (feature, threshold, left, right, default-left, leaf value) covering all of its
+# trees. Rows are then scored by walking every (row, tree) pair down one level per
+# step, so a single-row prediction costs a few array operations per tree level
+# instead of sklearn/XGBoost input validation and thread dispatch.
+# Opt-in with INSIGHTLENS_COMPILED_TREES=1; used for requests of at most
+# INSIGHTLENS_COMPILED_MAX_ROWS rows: around 100 rows the native, compiled-C
+# traversal catches up and large batches are several times faster natively.
+import json
+import logging
+import os
+import threading
+import weakref
+import numpy as np
+
+COMPILED_TREES = os.getenv("INSIGHTLENS_COMPILED_TREES", "0") == "1"
+COMPILED_MAX_ROWS = int(os.getenv("INSIGHTLENS_COMPILED_MAX_ROWS", "100"))
+FIXED_DEPTH = 12 # Up to this depth every pair steps every level; deeper ensembles compact the active set
+PAIRS_PER_CHUNK = 1 << 16
+
+logger = logging.getLogger(__name__)
+
+
+def _float32_at_most(values):
+    """
+    Largest float32 <= each value: for float32 inputs, `x <= t` then matches the
+    float64 comparison sklearn makes.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    t32 = values.astype(np.float32)
+    too_big = t32.astype(np.float64) > values
+    t32[too_big] = np.nextafter(t32[too_big], np.float32(-np.inf))
+    return t32
+
+
+class CompiledEnsemble:
+    """
+    Flat arrays for all trees of one model. Leaves point to themselves and have
+    feature -1; `roots[t]` is the first node of tree t. `values[node]` holds one
+    number per output (class probabilities for RF, margins for XGBoost).
+
+    Mimics the estimator: `predict`, `predict_proba` (classifiers) and `classes_`.
+    Safe to share between threads: scoring never writes to the ensemble's arrays.
+    """
+
+    def __init__(self, kind, roots, feature, threshold, left, right, default_left, values,
+                 tree_outputs=None, base_margin=None, objective=None, classes=None, absent_is_missing=False):
+        self.kind = kind # "rf_classifier", "rf_regressor", "xgb_classifier", "xgb_regressor"
+        self.roots = roots
+        self.feature = feature
+        # Traversal compares in float32 and only needs the clamped feature index
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.default_left = default_left
+        self.values = values
+        self.tree_outputs = tree_outputs # XGBoost: output (class) each tree adds to
+        self.base_margin = base_margin
+        self.objective = objective
+        self.classes_ = classes
+        self.absent_is_missing = absent_is_missing # XGBoost reads unstored sparse entries as missing
+        self._feature_index = np.maximum(feature, 0)
+        self._is_leaf = feature < 0
+        # children[2 * node + went_right]: one gather per level instead of two plus a select
+        self._children = np.column_stack([left, right]).ravel()
+        self.n_nodes = len(feature)
+        self.max_depth = self._depth()
+        self._pair_cache = None # (n_features, start nodes, row offsets), see _pairs
+
+    def _depth(self):
+        depth, frontier = 0, self.roots[~self._is_leaf[self.roots]]
+        while frontier.size:
+            children = np.concatenate([self.left[frontier], self.right[frontier]])
+            frontier = children[~self._is_leaf[children]]
+            depth += 1
+        return depth
+
+    def _matrix(self, X):
+        import scipy.sparse as sp
+
+        if sp.issparse(X):
+            X = X.tocsr()
+            if self.absent_is_missing:
+                dense = np.full(X.shape, np.nan, dtype=np.float32)
+                rows = np.repeat(np.arange(X.shape[0]), np.diff(X.indptr))
+                dense[rows, X.indices] = X.data
+                return dense
+            return X.toarray().astype(np.float32, copy=False)
+        return np.ascontiguousarray(X, dtype=np.float32)
+
+    def leaves(self, X):
+        """
+        (n_rows, n_trees) array of the leaf each row reaches in each tree.
+        """
+        X = self._matrix(X)
+        n_rows = X.shape[0]
+        if n_rows == 0:
+            return np.empty((0, len(self.roots)), dtype=np.int64)
+        # Row chunks keep the (row, tree) working set cache-sized
+        chunk = max(1, PAIRS_PER_CHUNK // len(self.roots))
+        if n_rows <= chunk:
+            return self._walk(X)
+        return np.concatenate([self._walk(X[start:start + chunk]) for start in range(0, n_rows, chunk)])
+
+    def _pairs(self, n_rows, n_features):
+        """
+        Start node and row offset into the flattened matrix of every (row, tree) pair.
+        Batches of up to COMPILED_MAX_ROWS rows (the requests this is used for) slice
+        arrays built once per ensemble: they are read-only, so the threadpool workers
+        share them without locking. Larger batches build their own.
+        """
+        n_trees = len(self.roots)
+        max_rows = min(COMPILED_MAX_ROWS, max(1, PAIRS_PER_CHUNK // n_trees))
+        if n_rows > max_rows:
+            return np.tile(self.roots, n_rows), np.repeat(np.arange(n_rows, dtype=np.int64) * n_features, n_trees)
+        cached = self._pair_cache
+        if cached is None or cached[0] != n_features:
+            nodes = np.tile(self.roots, max_rows)
+            offsets = np.repeat(np.arange(max_rows, dtype=np.int64) * n_features, n_trees)
+            nodes.flags.writeable = offsets.flags.writeable = False
+            # A single assignment: a thread racing here builds the same arrays
+            cached = self._pair_cache = (n_features, nodes, offsets)
+        return cached[1][:n_rows * n_trees], cached[2][:n_rows * n_trees]
+
+    def _walk(self, X):
+        n_rows, n_features = X.shape
+        n_trees = len(self.roots)
+        nodes, offsets = self._pairs(n_rows, n_features)
+        flat = X.ravel()
+        has_missing = np.isnan(flat).any()
+
+        if self.max_depth <= FIXED_DEPTH:
+            # Shallow trees (boosting): step every pair max_depth times; leaves loop on themselves
+            for _ in range(self.max_depth):
+                nodes = self._step(nodes, flat[offsets + self._feature_index[nodes]], has_missing)
+            return nodes.reshape(n_rows, n_trees)
+
+        # Deep trees (forests): pairs that reached a leaf drop out of the active set
+        nodes = nodes.copy() # Updated in place
+        active = np.flatnonzero(~self._is_leaf[nodes])
+        while active.size:
+            current = nodes[active]
+            nxt = self._step(current, flat[offsets[active] + self._feature_index[current]], has_missing)
+            nodes[active] = nxt
+            active = active[~self._is_leaf[nxt]]
+        return nodes.reshape(n_rows, n_trees)
+
+    def _step(self, nodes, x, has_missing):
+        go_left = x <= self.threshold[nodes]
+        if has_missing:
+            go_left |= np.isnan(x) & self.default_left[nodes]
+        return self._children[2 * nodes + ~go_left]
+
+    def _raw(self, X):
+        leaves = self.leaves(X)
+        if self.kind.startswith("rf"):
+            # Forest: average of the per-tree leaf values
+            return self.values[leaves].mean(axis=1)
+        # Boosting: base margin plus the leaf values of each output's trees
+        margins = np.tile(self.base_margin, (leaves.shape[0], 1))
+        leaf_values = self.values[leaves, 0]
+        for k in range(margins.shape[1]):
+            margins[:, k] += leaf_values[:, self.tree_outputs == k].sum(axis=1, dtype=np.float64)
+        return margins
+
+    def predict_proba(self, X):
+        raw = self._raw(X)
+        if self.kind == "rf_classifier":
+            return raw
+        if self.objective == "binary:logistic":
+            positive = 1.0 / (1.0 + np.exp(-raw[:, 0]))
+            return np.column_stack([1.0 - positive, positive])
+        shifted = np.exp(raw - raw.max(axis=1, keepdims=True)) # multi:softprob
+        return shifted / shifted.sum(axis=1, keepdims=True)
+
+    def predict(self, X):
+        if self.classes_ is not None:
+            return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+        return self._raw(X)[:, 0]
+
+
+def _compile_forest(model):
+    classifier = hasattr(model, "classes_")
+    if getattr(model, "n_outputs_", 1) != 1:
+        return None
+    roots, features, thresholds, lefts, rights, default_lefts, values = [], [], [], [], [], [], []
+    offset = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        n = tree.node_count
+        leaf = tree.children_left < 0
+        index = np.arange(n)
+        roots.append(offset)
+        features.append(np.where(leaf, -1, tree.feature))
+        thresholds.append(np.where(leaf, np.inf, tree.threshold))
+        lefts.append(offset + np.where(leaf, index, tree.children_left))
+        rights.append(offset + np.where(leaf, index, tree.children_right))
+        missing_left = getattr(tree, "missing_go_to_left", None)
+        default_lefts.append(np.asarray(missing_left, dtype=bool) if missing_left is not None else np.zeros(n, dtype=bool))
+        value = tree.value[:, 0, :]
+        if classifier:
+            # Class fractions (older sklearn versions store counts)
+            value = value / np.maximum(value.sum(axis=1, keepdims=True), 1e-300)
+        values.append(value)
+        offset += n
+    return CompiledEnsemble(
+        "rf_classifier" if classifier else "rf_regressor",
+        roots=np.asarray(roots, dtype=np.int64),
+        feature=np.concatenate(features).astype(np.int64),
+        threshold=_float32_at_most(np.concatenate(thresholds)),
+        left=np.concatenate(lefts).astype(np.int64),
+        right=np.concatenate(rights).astype(np.int64),
+        default_left=np.concatenate(default_lefts),
+        values=np.concatenate(values).astype(np.float64),
+        classes=model.classes_ if classifier else None,
+    )
+
+
+def _parse_base_score(text):
+    return np.atleast_1d(np.asarray(json.loads(text.replace("E", "e")) if text.startswith("[") else float(text), dtype=np.float64))
+
+
+def _compile_xgboost(model):
+    booster = model.get_booster()
+    learner = json.loads(booster.save_raw("json"))["learner"]
+    objective = learner["objective"]["name"]
+    gradient_booster = learner["gradient_booster"]
+    if gradient_booster["name"] != "gbtree" or objective not in ("binary:logistic", "multi:softprob", "reg:squarederror"):
+        return None
+    trees = gradient_booster["model"]["trees"]
+    tree_info = np.asarray(gradient_booster["model"]["tree_info"], dtype=np.int64)
+    if any(tree.get("categories_nodes") for tree in trees):
+        return None
+
+    n_outputs = max(int(learner["learner_model_param"].get("num_class", "0")), 1)
+    base_score = _parse_base_score(learner["learner_model_param"]["base_score"])
+    if objective == "binary:logistic":
+        # Stored as a probability; trees add to its log-odds
+        base_score = np.log(base_score / (1.0 - base_score))
+    base_margin = np.broadcast_to(base_score, (n_outputs,)).astype(np.float64)
+
+    roots, features, thresholds, lefts, rights, default_lefts, values = [], [], [], [], [], [], []
+    offset = 0
+    for tree in trees:
+        left = np.asarray(tree["left_children"], dtype=np.int64)
+        n = len(left)
+        leaf = left < 0
+        index = np.arange(n)
+        conditions = np.asarray(tree["split_conditions"], dtype=np.float32)
+        roots.append(offset)
+        features.append(np.where(leaf, -1, np.asarray(tree["split_indices"], dtype=np.int64)))
+        # XGBoost goes left when x < split: for float32 x that is x <= the previous float32
+        thresholds.append(np.where(leaf, np.float32(np.inf), np.nextafter(conditions, np.float32(-np.inf))))
+        lefts.append(offset + np.where(leaf, index, left))
+        rights.append(offset + np.where(leaf, index, np.asarray(tree["right_children"], dtype=np.int64)))
+        default_lefts.append(np.asarray(tree["default_left"], dtype=bool))
+        # Leaves keep their value in split_conditions
+        values.append(np.where(leaf, conditions, 0.0).astype(np.float32))
+        offset += n
+
+    classifier = hasattr(model, "classes_")
+    return CompiledEnsemble(
+        "xgb_classifier" if classifier else "xgb_regressor",
+        roots=np.asarray(roots, dtype=np.int64),
+        feature=np.concatenate(features),
+        threshold=np.concatenate(thresholds).astype(np.float32),
+        left=np.concatenate(lefts),
+        right=np.concatenate(rights),
+        default_left=np.concatenate(default_lefts),
+        values=np.concatenate(values)[:, None],
+        tree_outputs=tree_info,
+        base_margin=base_margin,
+        objective=objective,
+        classes=np.asarray(model.classes_) if classifier else None,
+        absent_is_missing=True,
+    )
+
+
+def compile_model(model):
+    """
+    CompiledEnsemble for a fitted RandomForest{Classifier,Regressor} or
+    XGB{Classifier,Regressor} (gbtree, logistic/softprob/squared error), else None.
+    """
+    from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+    if isinstance(model, (RandomForestClassifier, RandomForestRegressor)):
+        return _compile_forest(model)
+    if type(model).__module__.startswith("xgboost") and hasattr(model, "get_booster"):
+        return _compile_xgboost(model)
+    return None
+
+
+# Keyed by the estimator object: a model evicted from (or reloaded into) the registry
+# cache takes its compiled form with it
+_compiled = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+_UNSUPPORTED = object()
+
+
+def compiled_for(model):
+    """
+    Cached compiled form of `model`, or None when it cannot be compiled.
+    """
+    with _lock:
+        compiled = _compiled.get(model)
+    if compiled is None:
+        try:
+            compiled = compile_model(model) or _UNSUPPORTED
+        except Exception:
+            logger.warning("Tree compilation failed, using the estimator", exc_info=True)
+            compiled = _UNSUPPORTED
+        with _lock:
+            _compiled[model] = compiled
+    return None if compiled is _UNSUPPORTED else compiled
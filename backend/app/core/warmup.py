@@ -0,0 +1,56 @@
+# Background warm-up of the heavy libraries.
+# pandas, scipy, sklearn, xgboost and shap are imported where they are used, so the
+# API starts answering as soon as FastAPI itself is loaded. With INSIGHTLENS_WARMUP=1
+# a daemon thread then imports them right after startup, so the first upload or
+# training request does not pay for it. A request that needs a module the thread is
+# still importing waits on the same import lock; other requests run meanwhile, a
+# little slower while the imports hold the GIL.
+import importlib
+import os
+import threading
+from app.core.metrics import stage
+
+WARMUP_ENABLED = os.getenv("INSIGHTLENS_WARMUP", "1") == "1"
+# In the order a new session needs them: upload and profile, train, explain
+MODULES = (
+    "pandas",
+    "pyarrow",
+    "scipy.sparse",
+    "sklearn.model_selection",
+    "sklearn.linear_model",
+    "sklearn.ensemble",
+    "sklearn.metrics",
+    "xgboost",
+    "joblib",
+    "shap",
+)
+
+
+def warm_up(modules=MODULES, hooks=()):
+    """
+    Import `modules`, then call each of `hooks` (e.g. building the LLM client), timing
+    each step as stage "warmup.<name>" and the whole run as "warmup". Failures are
+    skipped: the request that needs the module reports them.
+    """
+    with stage("warmup"):
+        for name in modules:
+            with stage(f"warmup.{name}"):
+                try:
+                    importlib.import_module(name)
+                except ImportError:
+                    pass
+        for hook in hooks:
+            with stage(f"warmup.{hook.__name__}"):
+                try:
+                    hook()
+                except Exception:
+                    pass
+
+
+def start_warmup(*hooks):
+    """
+    Run `warm_up` in a daemon thread (it never delays startup or shutdown).
+    """
+    thread = threading.Thread(target=warm_up, kwargs={"hooks": hooks}, name="warmup", daemon=True)
+    thread.start()
+    return thread
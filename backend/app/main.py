@@ -1,14 +1,29 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 import os
 from dotenv import load_dotenv
+from app.core.responses import FastJSONResponse
+from app.core.metrics import MetricsMiddleware, render_prometheus
+from app.core.warmup import WARMUP_ENABLED, start_warmup
 
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app):
+    # Routers import pandas/sklearn/xgboost/shap on first use: load them in the
+    # background now instead of in the first request that needs them
+    if WARMUP_ENABLED:
+        start_warmup(insight.get_llm)
+    yield
+
 app = FastAPI(
     title="InsightLens AI API",
     description="Backend for InsightLens AI - Machine Learning & Data Insights Platform",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -18,16 +33,26 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost: request latency includes CORS handling; opt-in profiling via X-Profile
+app.add_middleware(MetricsMiddleware)
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to InsightLens AI API", "status": "running"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Request and stage latency histograms in the Prometheus text format.
+    """
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
 # Placeholder for importing routers later
-from app.routers import data, train, explain, predict, insight
+from app.routers import data, train, explain, predict, insight, models
 
 app.include_router(data.router)
 app.include_router(train.router)
 app.include_router(explain.router)
 app.include_router(predict.router)
 app.include_router(insight.router)
+app.include_router(models.router)
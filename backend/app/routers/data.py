@@ -1,9 +1,9 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
-import pandas as pd
-import io
+from fastapi.concurrency import run_in_threadpool
+import asyncio
 import os
 import uuid
-import json
+from typing import Optional
 
 router = APIRouter(
     prefix="/data",
@@ -12,108 +12,159 @@ router = APIRouter(
 )
 
 from app.core.store import DATASETS
+from app.core.responses import FastJSONResponse
+from app.core.profiling import get_profile
+from app.core.correlation import MAX_TOP_K, MAX_MATRIX_COLUMNS, get_correlations
+from app.core.metrics import stage
+from app.core.scatter import (
+    DEFAULT_BUDGET, MAX_BUDGET, DEFAULT_BINS, MAX_BINS, cached as scatter_cached,
+    scatter_points, scatter_density
+)
+from app.core.ingest import (
+    SUPPORTED_EXTENSIONS, spool_upload, read_sample, start_ingest, should_wait, require_dataset
+)
 
 @router.post("/upload")
 async def upload_dataset(file: UploadFile = File(...)):
     """
-    Upload a CSV or Excel file and load it into a pandas DataFrame.
+    Upload a CSV, Excel or JSON file and load it into a pandas DataFrame.
+    The upload is spooled to disk and parsed off the event loop. Large files
+    return as soon as the schema and preview are known ("ready": false) while
+    the full parse finishes in the background. Stored columns are compacted
+    (see ingest.optimize_dtypes); "memory" reports the bytes before and after.
     Returns: Dataset ID, columns, and shape.
     """
-    try:
-        content = await file.read()
-        filename = file.filename
-        
-        if filename.endswith(".csv"):
-            df = pd.read_csv(io.BytesIO(content))
-        elif filename.endswith((".xls", ".xlsx")):
-            df = pd.read_excel(io.BytesIO(content))
-        elif filename.endswith(".json"):
-             df = pd.read_json(io.BytesIO(content))
-        else:
-            raise HTTPException(status_code=400, detail="Invalid file type. Please upload csv, excel, or json.")
-
-        # Assign a generic ID
-        dataset_id = str(uuid.uuid4())
-        
-        # Store metadata and data (in memory for now)
-        DATASETS[dataset_id] = {
-            "id": dataset_id,
-            "filename": filename,
-            "data": df, # Be careful with memory usage in production
-            "columns": df.columns.tolist(),
-            "shape": df.shape
-        }
-
-        return clean_nan({
-            "status": "success",
-            "dataset_id": dataset_id,
-            "filename": filename,
-            "columns": df.columns.tolist(),
-            "shape": df.shape,
-            "preview": df.head(5).to_dict(orient="records")
-        })
+    filename = file.filename or ""
+    if not filename.endswith(SUPPORTED_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Invalid file type. Please upload csv, excel, or json.")
 
+    try:
+        with stage("data.spool"):
+            path = await run_in_threadpool(spool_upload, file)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to process file: {str(e)}")
+    parsed = False
+    try:
+        with stage("data.sample"):
+            sample, df = await run_in_threadpool(read_sample, path, filename)
+        parsed = True
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to process file: {str(e)}")
+    finally:
+        # From here on the ingest owns the spool and removes it
+        if not parsed:
+            os.remove(path)
 
-import math
+    # Assign a generic ID
+    dataset_id = str(uuid.uuid4())
+    wait = should_wait(path)
+    future = start_ingest(dataset_id, path, filename, df)
 
-def clean_nan(obj):
-    """
-    Recursively replace NaN float values with None (which becomes null in JSON).
-    """
-    if isinstance(obj, float):
-        return None if math.isnan(obj) or math.isinf(obj) else obj
-    elif isinstance(obj, dict):
-        return {k: clean_nan(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [clean_nan(v) for v in obj]
-    return obj
+    shape = None
+    dtypes = sample.dtypes
+    memory = None # Known once the full parse is done
+    if wait:
+        try:
+            df = await asyncio.wrap_future(future)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to process file: {str(e)}")
+        shape, dtypes = df.shape, df.dtypes
+        memory = DATASETS.metadata(dataset_id).get("memory")
+
+    return FastJSONResponse({
+        "status": "success",
+        "dataset_id": dataset_id,
+        "filename": filename,
+        "ready": shape is not None,
+        "columns": sample.columns.tolist(),
+        "dtypes": {k: str(v) for k, v in dtypes.items()},
+        "shape": shape,
+        "memory": memory,
+        "preview": sample.head(5).to_dict(orient="records")
+    })
 
 @router.get("/profile/{dataset_id}")
 async def profile_dataset(dataset_id: str):
     """
     Return summary statistics and column types for a dataset.
     """
-    if dataset_id not in DATASETS:
-        raise HTTPException(status_code=404, detail="Dataset not found")
-    
-    df = DATASETS[dataset_id]["data"]
+    await require_dataset(dataset_id)
     
-    profile = {
-        "columns": list(df.columns),
-        "dtypes": {k: str(v) for k, v in df.dtypes.items()},
-        "missing": df.isnull().sum().to_dict(),
-        "description": df.describe(include='all').fillna("NaN").to_dict()
-    }
-    
-    # Calculate simple correlations for numeric columns
-    numeric_df = df.select_dtypes(include=['number'])
-    if not numeric_df.empty:
-        profile["correlations"] = numeric_df.corr().fillna(0).to_dict()
-    
-    return clean_nan(profile)
+    # Computed once per dataset version (usually precomputed right after upload)
+    profile = await run_in_threadpool(get_profile, dataset_id)
+
+    return FastJSONResponse(profile)
+
+@router.get("/correlations/{dataset_id}")
+async def get_correlation_pairs(dataset_id: str, k: int = 10, full: bool = False, sample_rows: Optional[int] = None):
+    """
+    Strongest Pearson correlations between numeric columns: `k` pairs, largest |r| first.
+    full=true adds the whole matrix as a list of rows in `columns` order (at most
+    MAX_MATRIX_COLUMNS numeric columns). sample_rows computes on a uniform row sample
+    and adds 95% confidence intervals and an overall error bound.
+    Cached per dataset version and sample size.
+    """
+    if not 1 <= k <= MAX_TOP_K:
+        raise HTTPException(status_code=400, detail=f"k must be 1-{MAX_TOP_K}")
+    if sample_rows is not None and sample_rows < 10:
+        raise HTTPException(status_code=400, detail="sample_rows must be at least 10")
+
+    await require_dataset(dataset_id)
+
+    def compute():
+        if full:
+            numeric = DATASETS.metadata(dataset_id).get("numeric_columns")
+            if numeric is None: # Stored before the numeric columns were recorded
+                numeric = DATASETS.get_frame(dataset_id).select_dtypes(include=["number"]).columns
+            width = len(numeric)
+            if width > MAX_MATRIX_COLUMNS:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"{width} numeric columns: the full matrix is limited to {MAX_MATRIX_COLUMNS}; request the top pairs instead",
+                )
+        return get_correlations(dataset_id, k, full, sample_rows)
+
+    return FastJSONResponse(await run_in_threadpool(compute))
 
 @router.get("/scatter/{dataset_id}")
-async def get_scatter_data(dataset_id: str, x: str, y: str):
+async def get_scatter_data(
+    dataset_id: str,
+    x: str,
+    y: str,
+    mode: str = "sample",
+    budget: int = DEFAULT_BUDGET,
+    bins: int = DEFAULT_BINS,
+):
     """
     Return x and y values for a scatter plot.
-    Limit to 1000 points for performance.
+    mode="sample": at most `budget` points, deterministic and shape-preserving
+    (extremes and sparse regions are kept). mode="density": a bins x bins 2D histogram.
+    Results are cached per dataset version, columns and budget.
     """
-    if dataset_id not in DATASETS:
-        raise HTTPException(status_code=404, detail="Dataset not found")
-    
-    df = DATASETS[dataset_id]["data"]
+    if mode not in ("sample", "density"):
+        raise HTTPException(status_code=400, detail="mode must be 'sample' or 'density'")
+    if not 1 <= budget <= MAX_BUDGET or not 1 <= bins <= MAX_BINS:
+        raise HTTPException(status_code=400, detail=f"budget must be 1-{MAX_BUDGET} and bins 1-{MAX_BINS}")
+
+    await require_dataset(dataset_id)
     
-    if x not in df.columns or y not in df.columns:
+    columns = DATASETS.metadata(dataset_id)["columns"]
+
+    if x not in columns or y not in columns:
         raise HTTPException(status_code=400, detail="Columns not found")
-    
-    # Sample if too large
-    if len(df) > 1000:
-        plot_df = df[[x, y]].sample(1000)
-    else:
-        plot_df = df[[x, y]]
-        
-    data = plot_df.to_dict(orient="records")
-    # key mapping to ensure frontend reusability if needed, but records are {x: val, y: val}
-    return clean_nan(data)
+
+    def compute():
+        # Only load the two plotted columns (a projection on disk-backed stores)
+        df = DATASETS.get_frame(dataset_id, columns=list(dict.fromkeys([x, y])))
+        if mode == "density":
+            return scatter_density(df, x, y, bins)
+        # records are {x: val, y: val} for the frontend
+        return scatter_points(df, x, y, budget)
+
+    size = bins if mode == "density" else budget
+    key = (dataset_id, DATASETS.version(dataset_id), x, y, mode, size)
+    try:
+        data = await run_in_threadpool(scatter_cached, key, compute)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse(data)
@@ -1,11 +1,11 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-import pandas as pd
-import numpy as np
-import shap
-from .train import MODELS
-from .data import clean_nan
-from app.core.store import DATASETS
+from typing import Dict, List, Optional, Union
+from app.core.responses import FastJSONResponse
+from app.core.ingest import require_dataset
+from app.core.registry import MODELS
+from app.core.explanations import get_global_importance, explain_rows, ExplanationInputError, ExplanationError
 
 router = APIRouter(
     prefix="/explain",
@@ -17,79 +17,57 @@ class ExplainRequest(BaseModel):
     model_id: str
     dataset_id: str
 
+class LocalExplainRequest(BaseModel):
+    model_id: str
+    features: Optional[Dict[str, Union[int, float, str]]] = None # One row, as in /predict/
+    rows: Optional[List[Dict[str, Union[int, float, str]]]] = None # Or many
+
 @router.post("/")
 async def explain_model(request: ExplainRequest):
     """
     Generate SHAP feature importance for a trained model.
+    Computed once per model and dataset version (usually right after training) and cached.
     """
     if request.model_id not in MODELS:
         raise HTTPException(status_code=404, detail="Model not found")
     
-    if request.dataset_id not in DATASETS:
-        raise HTTPException(status_code=404, detail="Dataset not found")
-
-    model_info = MODELS[request.model_id]
-    model = model_info["model"]
-    feature_names = model_info["features"]
-    
-    # Get data
-    df = DATASETS[request.dataset_id]["data"]
-    # Preprocess similarly to training (basic)
-    df_clean = df.dropna()
-    # We need to make sure we only use the features the model was trained on
-    # This is tricky without a persistent pipeline object, but we'll attempt to match columns
-    try:
-        X = pd.get_dummies(df_clean, drop_first=True)
-        # Filter to keep only columns that are in feature_names, adding missing ones as 0
-        for col in feature_names:
-            if col not in X.columns:
-                X[col] = 0
-        X = X[feature_names]
-    except Exception as e:
-         raise HTTPException(status_code=400, detail=f"Data mismatch or preprocessing error: {str(e)}")
-
-    # Use a sample for speed
-    X_sample = X.sample(min(100, len(X)), random_state=42)
+    await require_dataset(request.dataset_id)
 
     try:
-        # Generic SHAP explainer
-        # For Tree models (XGB, RF) TreeExplainer is best, otherwise KernelExplainer
-        if "XGB" in model_info["name"] or "Random Forest" in model_info["name"]:
-            explainer = shap.TreeExplainer(model)
-            shap_values = explainer.shap_values(X_sample)
-        else:
-             # Logistic/Linear use LinearExplainer or Kernel
-            explainer = shap.Explainer(model, X_sample)
-            shap_values = explainer(X_sample).values
+        importance = await run_in_threadpool(get_global_importance, request.model_id, request.dataset_id)
+    except ExplanationInputError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ExplanationError as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # Calculate mean absolute SHAP values for global feature importance
-        if isinstance(shap_values, list): # For classification with multiple classes
-            shap_values = shap_values[1] # Take positive class
+    return FastJSONResponse({
+        "status": "success",
+        "model_name": MODELS.metadata(request.model_id)["name"],
+        "feature_importance": importance
+    })
 
-        if len(shap_values.shape) > 2:
-             # Handle 3D output (e.g. from interaction values or multi-class)
-             shap_values = np.mean(np.abs(shap_values), axis=2) # simplified
+@router.post("/local")
+async def explain_predictions(request: LocalExplainRequest):
+    """
+    Per-row SHAP contributions explaining individual predictions.
+    Accepts a single `features` row (like /predict/) or a list of `rows`.
+    """
+    if request.model_id not in MODELS:
+        raise HTTPException(status_code=404, detail="Model not found")
 
-        # Summarize importance
-        # shap_values is (n_samples, n_features)
-        # We want mean(|shap|) per feature
-        if isinstance(shap_values, np.ndarray):
-            mean_shap = np.mean(np.abs(shap_values), axis=0)
-        else:
-             # Handle shap.Explanation object
-             mean_shap = np.mean(np.abs(shap_values.values), axis=0)
+    rows = request.rows if request.rows is not None else [request.features] if request.features is not None else []
+    if not rows:
+        raise HTTPException(status_code=400, detail="Provide 'features' or a non-empty 'rows' list")
 
-        importance_dict = dict(zip(feature_names, mean_shap))
-        
-        # Sort by importance
-        sorted_importance = sorted(importance_dict.items(), key=lambda item: item[1], reverse=True)
-        
-        return clean_nan({
-            "status": "success",
-            "model_name": model_info["name"],
-            "feature_importance": [{"feature": k, "importance": float(v)} for k, v in sorted_importance]
-        })
+    try:
+        explanations = await run_in_threadpool(explain_rows, request.model_id, rows)
+    except ExplanationInputError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ExplanationError as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-    except Exception as e:
-        print(e)
-        raise HTTPException(status_code=500, detail=f"Explainability failed: {str(e)}")
+    return FastJSONResponse({
+        "status": "success",
+        "model_name": MODELS.metadata(request.model_id)["name"],
+        "explanations": explanations
+    })
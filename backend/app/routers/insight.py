@@ -1,10 +1,15 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+import asyncio
+import functools
+import json
+import logging
 import os
-import google.generativeai as genai
-from app.core.store import DATASETS
-import pandas as pd
-import numpy as np
+from app.core.ingest import require_dataset
+from app.core.profiling import get_profile
+from app.core.llm import build_client
 
 router = APIRouter(
     prefix="/insight",
@@ -12,45 +17,60 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-api_key = os.getenv("GEMINI_API_KEY")
-model = None
+logger = logging.getLogger(__name__)
 
-if api_key:
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-2.5-flash')
+@functools.lru_cache(maxsize=None)
+def get_llm():
+    """
+    The LLM client, or None without an API key (and no mock provider): simulation mode.
+    Built on first use, since the Gemini SDK is slow to import: call from a worker thread.
+    """
+    return build_client()
+
+# Simulation-mode stream pacing (seconds per word), so streaming works and can be benchmarked offline
+SIMULATION_WORD_DELAY = float(os.getenv("INSIGHTLENS_SIMULATION_WORD_DELAY", "0.02"))
 
 class InsightRequest(BaseModel):
     context: str
     query: str
 
+def insight_prompt(request: InsightRequest):
+    return f"""
+        System: You are an expert data science advisor named InsightLens. Your goal is to explain machine learning models and data trends to business users clearly and concisely.
+        
+        Context: {request.context}
+        
+        Question: {request.query}
+        """
+
+def simulation_response(request: InsightRequest):
+    return f"**Note: GEMINI API Key not found. Running in simulation mode.**\n\nBased on your query '{request.query}', the model appears to be performing well with the provided context. Feature importances suggest that the top variables are driving the predictions effectively."
+
+def llm_mode(llm):
+    if llm is None:
+        return "simulation"
+    return "mock" if llm.provider.name == "mock" else "live"
+
 @router.post("/")
 async def generate_insight(request: InsightRequest):
     """
     Generate a text summary or answer utilizing Google Gemini API.
     Falls back to a mock response if no API key is set.
     """
-    if not model:
+    llm = await run_in_threadpool(get_llm)
+    if llm is None:
         # Mock response for demo/testing without API key
         return {
-            "response": f"**Note: GEMINI API Key not found. Running in simulation mode.**\n\nBased on your query '{request.query}', the model appears to be performing well with the provided context. Feature importances suggest that the top variables are driving the predictions effectively.",
+            "response": simulation_response(request),
             "mode": "simulation"
         }
     
     try:
-        # Construct prompt
-        prompt = f"""
-        System: You are an expert data science advisor named InsightLens. Your goal is to explain machine learning models and data trends to business users clearly and concisely.
-        
-        Context: {request.context}
-        
-        Question: {request.query}
-        """
-        
-        response = model.generate_content(prompt)
+        text = await llm.generate(insight_prompt(request))
         
         return {
-            "response": response.text,
-            "mode": "live"
+            "response": text,
+            "mode": llm_mode(llm)
         }
     except Exception as e:
         # Graceful degradation
@@ -59,30 +79,62 @@ async def generate_insight(request: InsightRequest):
             "mode": "error"
         }
 
+def sse_event(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+async def _simulated_chunks(text):
+    words = text.split(" ")
+    for i, word in enumerate(words):
+        await asyncio.sleep(SIMULATION_WORD_DELAY)
+        yield word if i == 0 else " " + word
+
+async def _insight_events(request: InsightRequest):
+    # Starlette cancels this generator when the client disconnects; closing the
+    # LLM stream then stops the provider call at its next chunk
+    llm = await run_in_threadpool(get_llm)
+    chunks = _simulated_chunks(simulation_response(request)) if llm is None else llm.stream(insight_prompt(request))
+    try:
+        async for chunk in chunks:
+            yield sse_event({"token": chunk})
+        yield sse_event({"mode": llm_mode(llm)}, event="done")
+    except Exception as e:
+        # Headers are already sent: report the failure as an event
+        yield sse_event({"detail": f"Error generating insight: {str(e)}"}, event="error")
+    finally:
+        await chunks.aclose()
+
+@router.post("/stream")
+async def stream_insight(request: InsightRequest):
+    """
+    Same as POST /insight/, streamed as Server-Sent Events while the model writes:
+    `data: {"token": ...}` per chunk, then `event: done` (or `event: error`).
+    """
+    return StreamingResponse(
+        _insight_events(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.get("/story/{dataset_id}")
 async def generate_story(dataset_id: str):
     """
     Generate a narrative story about the dataset using Gemini.
     """
-    if dataset_id not in DATASETS:
-        raise HTTPException(status_code=404, detail="Dataset not found")
-    
-    df = DATASETS[dataset_id]["data"]
+    await require_dataset(dataset_id)
     
+    # Reuse the cached dataset profile instead of recomputing the correlation matrix
+    profile = await run_in_threadpool(get_profile, dataset_id)
+
     # Calculate basic stats for context
-    n_rows, n_cols = df.shape
-    columns = list(df.columns)
-    numeric_df = df.select_dtypes(include=['number'])
-    
-    correlations = {}
-    if not numeric_df.empty:
-        corr_matrix = numeric_df.corr().abs()
-        # Find top correlation pairs (excluding diagonal)
-        sol = (corr_matrix.where(np.triu(np.ones(corr_matrix.shape), k=1).astype(bool))
-               .stack()
-               .sort_values(ascending=False))
-        top_correlations = sol.head(3).to_dict()
-        correlations = {f"{k[0]} & {k[1]}": v for k, v in top_correlations.items()}
+    n_rows, n_cols = profile["shape"]
+    columns = profile["columns"]
+
+    # Top correlation pairs (excluding diagonal)
+    correlations = {
+        f"{pair['x']} & {pair['y']}": pair["value"]
+        for pair in profile.get("top_correlations", [])[:3]
+    }
 
     context = f"""
     Dataset Overview:
@@ -92,7 +144,8 @@ async def generate_story(dataset_id: str):
     - Strongest Correlations: {correlations}
     """
 
-    if not model:
+    llm = await run_in_threadpool(get_llm)
+    if llm is None:
         # Fallback procedural story
         sections = [
             {
@@ -132,8 +185,8 @@ async def generate_story(dataset_id: str):
         {context}
         """
 
-        response = model.generate_content(prompt)
-        content = response.text
+        # Cached per prompt: the same dataset version yields the same prompt
+        content = await llm.generate(prompt)
         
         # Clean up possible markdown fences if Gemini adds them
         if content.startswith("```json"):
@@ -143,11 +196,10 @@ async def generate_story(dataset_id: str):
         if content.endswith("```"):
             content = content[:-3]
             
-        import json
         return json.loads(content) # Expecting {"sections": [...]}
         
-    except Exception as e:
-        print(f"Error generating story: {e}")
+    except Exception:
+        logger.exception("Error generating story for dataset %s", dataset_id)
         return {
             "story": [
                 {"title": "Error", "text": "Could not generate story via AI. Please check logs/API key."}
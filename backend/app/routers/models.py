@@ -0,0 +1,34 @@
+from fastapi import APIRouter, HTTPException
+from app.core.registry import MODELS
+from app.core.responses import FastJSONResponse
+
+router = APIRouter(
+    prefix="/models",
+    tags=["models"],
+    responses={404: {"description": "Not found"}},
+)
+
+@router.get("/")
+async def list_models():
+    """
+    List every trained model in the registry (metadata only, nothing is loaded).
+    """
+    return FastJSONResponse({"models": MODELS.list()})
+
+@router.get("/{model_id}")
+async def get_model(model_id: str):
+    if model_id not in MODELS:
+        raise HTTPException(status_code=404, detail="Model not found")
+    meta = MODELS.metadata(model_id)
+    meta["loaded"] = MODELS.is_loaded(model_id)
+    return meta
+
+@router.delete("/{model_id}")
+async def delete_model(model_id: str):
+    """
+    Remove a model from memory and from disk.
+    """
+    if model_id not in MODELS:
+        raise HTTPException(status_code=404, detail="Model not found")
+    del MODELS[model_id]
+    return {"status": "deleted", "model_id": model_id}
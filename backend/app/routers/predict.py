@@ -1,9 +1,17 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any, Union
-import pandas as pd
-from .train import MODELS
-from .data import clean_nan
+from typing import Dict, Union, Optional
+import numpy as np
+from app.core.responses import FastJSONResponse
+from app.core.store import DATASETS
+from app.core.ingest import require_dataset
+from app.core.registry import MODELS
+from app.core.batching import MicroBatcher, BATCHING_ENABLED
+from app.core.preprocessing import rows_with_missing
+from app.core.metrics import stage
+from app.core.trees import COMPILED_TREES, COMPILED_MAX_ROWS, compiled_for
 
 router = APIRouter(
     prefix="/predict",
@@ -11,16 +19,61 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+# Rows scored per vectorized model call in batch mode
+BATCH_CHUNK_SIZE = 10000
+
 class PredictRequest(BaseModel):
     model_id: str
     features: Dict[str, Union[int, float, str]]
 
+def score_matrix(model_info, X):
+    """
+    Score an encoded feature matrix in one model pass.
+    Classifiers with predict_proba derive the labels from the probabilities
+    instead of calling predict separately. Returns (predictions, probabilities or None).
+    """
+    model = model_info["model"]
+    if COMPILED_TREES and X.shape[0] <= COMPILED_MAX_ROWS:
+        # Flat-array traversal: same predictions without the per-call estimator overhead
+        model = compiled_for(model) or model
+    if model_info["type"] == "classification" and hasattr(model, "predict_proba"):
+        probs = model.predict_proba(X)
+        return model.classes_[np.argmax(probs, axis=1)], probs
+    return model.predict(X), None
+
+def _format_result(model_info, prediction, probs=None):
+    result = {
+        "prediction": float(prediction) if isinstance(prediction, (float, int)) else str(prediction),
+        "model_type": model_info["type"]
+    }
+    if probs is not None:
+        result["probabilities"] = probs.tolist()
+    return result
+
+def _score_rows(model_id, rows):
+    """
+    Score a list of feature dicts for one model. Blocking (it may load the model from
+    disk): runs in a worker thread.
+    """
+    model_info = MODELS[model_id]
+    with stage("predict.transform"):
+        X = model_info["pipeline"].transform_records(rows)
+    with stage("predict.score"):
+        predictions, probs = score_matrix(model_info, X)
+    return [
+        _format_result(model_info, predictions[i], probs[i] if probs is not None else None)
+        for i in range(len(rows))
+    ]
+
+# Opt-in (INSIGHTLENS_PREDICT_BATCHING=1): concurrent single-row requests share one model call
+BATCHER = MicroBatcher(_score_rows) if BATCHING_ENABLED else None
+
 @router.get("/metadata/{model_id}")
 async def get_model_metadata(model_id: str):
     if model_id not in MODELS:
         raise HTTPException(status_code=404, detail="Model not found")
     
-    info = MODELS[model_id]
+    info = MODELS.metadata(model_id) # Sidecar metadata: no need to load the model
     return {
         "model_id": model_id,
         "type": info["type"],
@@ -37,34 +90,118 @@ async def make_prediction(request: PredictRequest):
     if request.model_id not in MODELS:
         raise HTTPException(status_code=404, detail="Model not found")
 
-    model_info = MODELS[request.model_id]
-    model = model_info["model"]
-    expected_features = model_info["features"]
-    
-    # alignment check
-    input_data = pd.DataFrame([request.features])
-    
-    # Preprocessing (Match training)
-    # 1. Handle Categorical: Ideally we need the same dummy columns. 
-    # This is a simplification. In prod, we'd save the OneHotEncoder.
-    input_dummies = pd.get_dummies(input_data)
-    
-    # Reindex to match training columns, filling missing with 0
-    final_input = input_dummies.reindex(columns=expected_features, fill_value=0)
-    
     try:
-        prediction = model.predict(final_input)[0]
-        
-        result = {
-            "prediction": float(prediction) if isinstance(prediction, (float, int)) else str(prediction),
-            "model_type": model_info["type"]
-        }
-        
-        if model_info["type"] == "classification" and hasattr(model, "predict_proba"):
-            probs = model.predict_proba(final_input)[0]
-            result["probabilities"] = probs.tolist()
-            
-        return clean_nan(result)
+        if BATCHER is not None:
+            result = await BATCHER.submit(request.model_id, request.features)
+        else:
+            result = (await run_in_threadpool(_score_rows, request.model_id, [request.features]))[0]
+        return FastJSONResponse(result)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+
+@router.get("/batching/stats")
+async def get_batching_stats():
+    """
+    Latency and batch-size histograms of the micro-batching scheduler, for tuning the window.
+    """
+    if BATCHER is None:
+        return {"enabled": False}
+    return {"enabled": True, **BATCHER.stats()}
+
+def _iter_chunks(dataset_id=None, file=None, chunk_size=BATCH_CHUNK_SIZE, df=None):
+    """
+    Yield DataFrame chunks from a stored dataset, an uploaded file or a frame.
+    Stored datasets are read batch by batch (one batch in memory on the disk store)
+    and CSV uploads are parsed incrementally, so memory stays flat.
+    """
+    import pandas as pd
+
+    if dataset_id is not None:
+        yield from DATASETS.iter_batches(dataset_id, chunk_size)
+        return
+    if df is not None:
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+        return
+
+    filename = file.filename or ""
+    if filename.endswith(".csv"):
+        yield from pd.read_csv(file.file, chunksize=chunk_size)
+        return
+    # Excel/JSON cannot be parsed incrementally; read once, score in chunks
+    if filename.endswith((".xls", ".xlsx")):
+        data = pd.read_excel(file.file)
+    else:
+        data = pd.read_json(file.file)
+    yield from _iter_chunks(df=data, chunk_size=chunk_size)
+
+def _score_chunks(model_info, chunks, output_format):
+    """
+    Encode and score each chunk, then serialize it as CSV or NDJSON.
+    Rows with missing values get an empty prediction (training drops them too).
+    """
+    import pandas as pd
+
+    pipeline = model_info["pipeline"]
+    row_offset = 0
+    for chunk in chunks:
+        with stage("predict.batch_transform"):
+            X = pipeline.transform(chunk)
+        valid = ~rows_with_missing(X)
+
+        out = pd.DataFrame({"row": np.arange(row_offset, row_offset + len(chunk))})
+        out["prediction"] = None
+        probs = None
+        if valid.any():
+            with stage("predict.batch_score"):
+                predictions, probs = score_matrix(model_info, X[valid])
+            out.loc[valid, "prediction"] = predictions
+        if probs is not None:
+            for i, cls in enumerate(model_info["model"].classes_):
+                column = np.full(len(chunk), np.nan)
+                column[valid] = probs[:, i]
+                out[f"probability_{cls}"] = column
+
+        if output_format == "csv":
+            yield out.to_csv(index=False, header=row_offset == 0)
+        else:
+            lines = out.to_json(orient="records", lines=True)
+            yield lines if lines.endswith("\n") or not lines else lines + "\n"
+        row_offset += len(chunk)
+
+@router.post("/batch")
+async def batch_prediction(
+    model_id: str = Form(...),
+    dataset_id: Optional[str] = Form(None),
+    file: Optional[UploadFile] = File(None),
+    output_format: str = Form("ndjson"),
+    chunk_size: int = Form(BATCH_CHUNK_SIZE),
+):
+    """
+    Score every row of a stored dataset or an uploaded file.
+    Rows are scored in fixed-size vectorized chunks and streamed back as NDJSON or CSV.
+    """
+    if model_id not in MODELS:
+        raise HTTPException(status_code=404, detail="Model not found")
+    if (dataset_id is None) == (file is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of 'dataset_id' or 'file'.")
+    if output_format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="output_format must be 'ndjson' or 'csv'.")
+    if chunk_size < 1:
+        raise HTTPException(status_code=400, detail="chunk_size must be positive.")
+
+    if dataset_id is not None:
+        await require_dataset(dataset_id)
+    elif not (file.filename or "").endswith((".csv", ".xls", ".xlsx", ".json")):
+        raise HTTPException(status_code=400, detail="Invalid file type. Please upload csv, excel, or json.")
+
+    # StreamingResponse iterates a sync generator in a worker thread, off the event loop:
+    # the dataset is only read there
+    chunks = _iter_chunks(dataset_id=dataset_id, file=file, chunk_size=chunk_size)
+    media_type = "text/csv" if output_format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _score_chunks(MODELS[model_id], chunks, output_format),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=predictions.{output_format}"}
+    )
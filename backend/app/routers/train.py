@@ -1,16 +1,25 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Optional, List, Dict
-import pandas as pd
+from typing import TYPE_CHECKING, Optional
 import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LogisticRegression, LinearRegression
-from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
-from sklearn.metrics import accuracy_score, f1_score, r2_score, mean_squared_error
-import xgboost as xgb
+import os
 import uuid
-from .data import clean_nan
-from app.core.store import DATASETS
+from app.core.responses import FastJSONResponse
+from app.core.store import DATASETS, STORE_BACKEND
+from app.core.ingest import require_dataset
+from app.core.jobs import JOBS, MAX_WORKERS
+from app.core.registry import MODELS
+from app.core.preprocessing import FeaturePipeline, coerce_numeric, is_text_column, ENCODINGS, HIGH_CARDINALITY
+from app.core.training import (
+    CANDIDATES, fit_candidate, search_candidate, ranking_metric, stratified_subsample
+)
+from app.core.explanations import sample_rows, precompute_global_importance
+from app.core.metrics import stage, observe_stage
+from app.core import incremental
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 router = APIRouter(
     prefix="/train",
@@ -18,72 +27,46 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-# In-memory model storage
-MODELS = {}
+# Default training-row budget of the fast leaderboard mode
+FAST_SAMPLE_ROWS = int(os.getenv("INSIGHTLENS_FAST_SAMPLE_ROWS", "50000"))
 
 class TrainRequest(BaseModel):
     dataset_id: str
     target_column: str
     problem_type: Optional[str] = None # "classification" or "regression" (optional, auto-detect)
+    search: bool = False # Cross-validated hyperparameter search instead of default parameters
+    time_budget_seconds: float = 60.0 # Per-family search budget
+    cv_folds: int = 5
+    fast: bool = False # Rank on a stratified subsample, then refit the winner on all rows in the background
+    sample_rows: Optional[int] = None # Training-row budget of fast mode (default FAST_SAMPLE_ROWS)
+    encoding: str = "dense" # "dense" or "sparse" (scipy CSR one-hot blocks)
+    high_cardinality: str = "drop" # "drop", "frequency" or "target" encoding of wide categoricals
+    out_of_core: bool = False # Stream the stored dataset in chunks (SGD and external-memory XGBoost)
+    memory_budget_mb: Optional[float] = None # Out-of-core memory budget (default INSIGHTLENS_TRAIN_MEMORY_MB)
 
-@router.post("/")
-async def train_model(request: TrainRequest):
+def resolve_target(y: "pd.Series", request: TrainRequest):
     """
-    Train multiple models on the dataset and return the best one's metrics.
+    Coerce formatted numbers, resolve the problem type and encode class labels.
+    Returns (y, problem_type, spec); `spec` replays the same encoding on chunks
+    of the column (out-of-core training). Raises HTTPException for targets that
+    cannot be modelled.
     """
-    if request.dataset_id not in DATASETS:
-        raise HTTPException(status_code=404, detail="Dataset not found")
-    
-    df = DATASETS[request.dataset_id]["data"]
-    
-    if request.target_column not in df.columns:
-         raise HTTPException(status_code=400, detail=f"Target column '{request.target_column}' not found in dataset")
-    
-    # Simple preprocessing: Drop NA, encoding (dummies)
-    # In a real app, this pipeline would be much more robust
-    df_clean = df.dropna()
-    
-    # Pre-cleaning: Attempt to convert object columns to numeric if they look like numbers (e.g. "1,234", "$500")
-    for col in df_clean.columns:
-        if df_clean[col].dtype == 'object':
-            try:
-                # Check if stripping symbol/comma makes it numeric
-                cleaned = df_clean[col].astype(str).str.replace(r'[$,]', '', regex=True)
-                # If we can convert the entire column without error, it's numeric
-                df_clean[col] = pd.to_numeric(cleaned)
-            except:
-                # If conversion fails (e.g. real text), keep as is
-                pass
-
-    X = df_clean.drop(columns=[request.target_column])
-    y = df_clean[request.target_column]
-    
-    # Optimize: Drop high-cardinality columns (e.g., IDs, Names) to prevent MemoryError
-    # causing massive expansion with get_dummies (e.g., 23k+ columns)
-    categorical_cols = X.select_dtypes(include=['object', 'category']).columns
-    dropped_cols = []
-    for col in categorical_cols:
-        if X[col].nunique() > 50: # Threshold for "too many categories"
-            X = X.drop(columns=[col])
-            dropped_cols.append(col)
-
-    # Capture Input Schema (Before get_dummies)
-    # This tells the frontend exactly what fields to show (e.g. "Currency" dropdown)
-    input_schema = []
-    for col in X.columns:
-        if pd.api.types.is_numeric_dtype(X[col]):
-            input_schema.append({"name": col, "type": "numeric"})
-        else:
-            # It's categorical
-            unique_vals = X[col].dropna().unique().tolist()
-            input_schema.append({"name": col, "type": "categorical", "options": unique_vals})
-            
-    X = pd.get_dummies(X, drop_first=True)
+    import pandas as pd
+
+    spec = {"coerced": False, "categories": None, "classes": None}
+
+    # Targets that look like formatted numbers (e.g. "1,234", "$500") are numeric.
+    # Uploads are converted on load; this covers datasets stored before that
+    if is_text_column(y):
+        y_numeric = coerce_numeric(y)
+        if y_numeric is not None:
+            y = y_numeric
+            spec["coerced"] = True
 
     # Determine problem type if not provided
     problem_type = request.problem_type
     unique_y_count = y.nunique()
-    
+
     if not problem_type:
         if pd.api.types.is_numeric_dtype(y):
              if unique_y_count > 20:
@@ -92,20 +75,12 @@ async def train_model(request: TrainRequest):
                  problem_type = "classification"
         else:
              # Non-numeric target
-             if unique_y_count > 50: 
-                  # Try to convert to numeric (maybe it's a numeric string with $ or ,?)
-                  try:
-                      # explicit clean up for common currency/formatting
-                      y_clean = y.astype(str).str.replace(r'[$,]', '', regex=True)
-                      y_numeric = pd.to_numeric(y_clean, errors='raise')
-                      y = y_numeric
-                      problem_type = "regression"
-                  except:
-                      # Truly high-cardinality categorical target
-                      raise HTTPException(status_code=400, detail=f"Target '{request.target_column}' has {unique_y_count} unique values. Too high for classification. Please select a numeric target or one with fewer categories.")
+             if unique_y_count > 50:
+                  # Truly high-cardinality categorical target (formatted numbers were already coerced above)
+                  raise HTTPException(status_code=400, detail=f"Target '{request.target_column}' has {unique_y_count} unique values. Too high for classification. Please select a numeric target or one with fewer categories.")
              else:
                   problem_type = "classification"
-            
+
     # If classification was decided (or requested) but cardinality is still huge, fail fast
     if problem_type == "classification" and unique_y_count > 100:
          raise HTTPException(status_code=400, detail=f"Target '{request.target_column}' has {unique_y_count} classes. This is too many for classification. Did you mean regression?")
@@ -113,87 +88,315 @@ async def train_model(request: TrainRequest):
     if problem_type == "classification":
         # Encode y if classification but not numeric
         if not pd.api.types.is_numeric_dtype(y):
-                y = y.astype('category').cat.codes
-                 
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    
-    results = []
-    
-    try:
-        if problem_type == "classification":
-            models = {
-                "Logistic Regression": LogisticRegression(max_iter=1000),
-                "Random Forest": RandomForestClassifier(n_estimators=100),
-                "XGBoost": xgb.XGBClassifier(use_label_encoder=False, eval_metric='logloss')
+                # Categorical columns keep labels only seen in dropped rows: codes must stay contiguous
+                y = y.astype('category').cat.remove_unused_categories()
+                spec["categories"] = y.cat.categories.tolist()
+                y = y.cat.codes
+        spec["classes"] = np.unique(y).tolist()
+
+    return y, problem_type, spec
+
+def prepare_training_data(request: TrainRequest):
+    """
+    Load and clean the dataset, encode features and resolve the problem type.
+    Blocking (a full read on the disk store): call it from a worker thread.
+    Raises HTTPException for targets that cannot be modelled.
+    """
+    # Simple preprocessing: Drop NA, then a fitted feature pipeline
+    # (numeric coercion, high-cardinality handling, one-hot with a fixed vocabulary)
+    df_clean = DATASETS.get_frame(request.dataset_id).dropna()
+
+    X_raw = df_clean.drop(columns=[request.target_column])
+    y, problem_type, _ = resolve_target(df_clean[request.target_column], request)
+
+    # Fitted after the problem type is known: target encoding depends on it
+    pipeline = FeaturePipeline(encoding=request.encoding, high_cardinality=request.high_cardinality)
+    X = pipeline.fit_transform(X_raw, y, problem_type)
+
+    return {
+        "X": X,
+        "y": y,
+        "problem_type": problem_type,
+        "pipeline": pipeline,
+    }
+
+def split_training_data(X, y):
+    """
+    80/20 train/test split of the encoded rows. Loads sklearn on first use: call it
+    from a worker thread.
+    """
+    from sklearn.model_selection import train_test_split
+
+    return train_test_split(X, y, test_size=0.2, random_state=42)
+
+def prepare_out_of_core(request: TrainRequest):
+    """
+    Resolve the target on its own column and fit the feature pipeline on an even
+    sample of rows; the full dataset is never loaded. The chunk size follows
+    from the memory budget.
+    """
+    y_all = DATASETS.get_frame(request.dataset_id, columns=[request.target_column])[request.target_column]
+    _, problem_type, spec = resolve_target(y_all.dropna(), request)
+    del y_all
+
+    sample = incremental.sample_frame(request.dataset_id).dropna()
+    if sample.empty:
+        raise HTTPException(status_code=400, detail="The dataset has no rows without missing values")
+    X_raw = sample.drop(columns=[request.target_column])
+    y = incremental.encode_target(sample[request.target_column], spec)
+    pipeline = FeaturePipeline(encoding=request.encoding, high_cardinality=request.high_cardinality)
+    pipeline.fit(X_raw, y, problem_type)
+
+    budget = request.memory_budget_mb or incremental.MEMORY_BUDGET_MB
+    return {
+        "problem_type": problem_type,
+        "target": spec,
+        "pipeline": pipeline,
+        "background": sample_rows(pipeline.transform(X_raw)),
+        "chunk_rows": incremental.chunk_rows_for_budget(sample, pipeline, budget),
+        "memory_budget_mb": budget,
+    }
+
+def feature_matrix_report(X, pipeline):
+    """
+    Size of the encoded training matrix next to what the dense float64 layout would take.
+    """
+    import scipy.sparse as sp
+
+    if sp.issparse(X):
+        nbytes = X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    else:
+        nbytes = X.nbytes
+    return {
+        "encoding": pipeline.encoding,
+        "shape": list(X.shape),
+        "bytes": int(nbytes),
+        "dense_bytes": int(X.shape[0] * X.shape[1] * 8),
+        "encoded_columns": pipeline.encoded_columns,
+    }
+
+@router.post("/")
+async def train_model(request: TrainRequest):
+    """
+    Queue AutoML training for a dataset and return a job id immediately.
+    The candidate models train in parallel in a process pool; poll
+    GET /train/jobs/{job_id} for progress and the (partial) leaderboard.
+    """
+    if request.search and not (2 <= request.cv_folds <= 10 and request.time_budget_seconds > 0):
+        raise HTTPException(status_code=400, detail="cv_folds must be 2-10 and time_budget_seconds positive")
+    if request.encoding not in ENCODINGS or request.high_cardinality not in HIGH_CARDINALITY:
+        raise HTTPException(status_code=400, detail=f"encoding must be one of {ENCODINGS} and high_cardinality one of {HIGH_CARDINALITY}")
+    row_budget = request.sample_rows or FAST_SAMPLE_ROWS
+    if request.fast and row_budget < 100:
+        raise HTTPException(status_code=400, detail="sample_rows must be at least 100")
+
+    if request.out_of_core:
+        if request.search or request.fast:
+            raise HTTPException(status_code=400, detail="out_of_core cannot be combined with search or fast mode")
+        if STORE_BACKEND != "disk":
+            raise HTTPException(status_code=400, detail="out_of_core training streams the dataset from disk: set INSIGHTLENS_STORE=disk")
+        if request.memory_budget_mb is not None and request.memory_budget_mb < 16:
+            raise HTTPException(status_code=400, detail="memory_budget_mb must be at least 16")
+
+    await require_dataset(request.dataset_id)
+
+    if request.target_column not in DATASETS.metadata(request.dataset_id)["columns"]:
+        raise HTTPException(status_code=400, detail=f"Target column '{request.target_column}' not found in dataset")
+
+    refit_data = []
+    if request.out_of_core:
+
+        # Only the target column and a row sample are loaded here; the pool workers stream the rest
+        with stage("train.preprocess"):
+            prepared = await run_in_threadpool(prepare_out_of_core, request)
+        problem_type = prepared["problem_type"]
+        pipeline = prepared["pipeline"]
+        background = prepared["background"]
+        subsample = False
+        training_rows = None # Counted by the workers
+        model_ids = {name: str(uuid.uuid4()) for name in incremental.CANDIDATES[problem_type]}
+        tasks = {
+            name: (incremental.fit_out_of_core, (name, problem_type, request.dataset_id, request.target_column,
+                                                 prepared["target"], pipeline, prepared["chunk_rows"]))
+            for name in model_ids
+        }
+        feature_matrix = {
+            "encoding": pipeline.encoding,
+            "features": len(pipeline.feature_names),
+            "encoded_columns": pipeline.encoded_columns,
+            "chunk_rows": prepared["chunk_rows"],
+            "memory_budget_mb": prepared["memory_budget_mb"],
+        }
+    else:
+        # Loading and preprocessing are cheap relative to fitting but still blocking: keep them off the event loop
+        with stage("train.preprocess"):
+            prepared = await run_in_threadpool(prepare_training_data, request)
+        problem_type = prepared["problem_type"]
+        pipeline = prepared["pipeline"]
+
+        with stage("train.split"):
+            X_train, X_test, y_train, y_test = await run_in_threadpool(split_training_data, prepared["X"], prepared["y"])
+
+        background = sample_rows(X_train)
+
+        # Fast mode: the leaderboard is decided on a stratified subsample of both splits
+        subsample = request.fast and X_train.shape[0] > row_budget
+        if subsample:
+            X_fit, y_fit = stratified_subsample(problem_type, X_train, y_train, row_budget)
+            X_eval, y_eval = stratified_subsample(problem_type, X_test, y_test, max(row_budget // 4, 1))
+        else:
+            X_fit, y_fit, X_eval, y_eval = X_train, y_train, X_test, y_test
+
+        model_ids = {name: str(uuid.uuid4()) for name in CANDIDATES[problem_type]}
+        if request.search:
+            # Families search in parallel; each one gets its share of the cores for RF/XGBoost threads
+            n_jobs = max(1, MAX_WORKERS // len(model_ids))
+            tasks = {
+                name: (search_candidate, (name, problem_type, X_fit, y_fit, X_eval, y_eval,
+                                          request.cv_folds, request.time_budget_seconds, n_jobs))
+                for name in model_ids
             }
-            
-            for name, model in models.items():
-                model.fit(X_train, y_train)
-                preds = model.predict(X_test)
-                acc = accuracy_score(y_test, preds)
-                f1 = f1_score(y_test, preds, average='weighted')
-                results.append({
-                    "model": name,
-                    "accuracy": float(acc),
-                    "f1": float(f1),
-                    "model_id": str(uuid.uuid4()), # We need to generate ID before storing
-                    "type": "classification"
-                })
-                # Store model
-                model_id = results[-1]["model_id"]
-                MODELS[model_id] = {
-                    "model": model, 
-                    "name": name, 
-                    "type": "classification", 
-                    "features": X.columns.tolist(), # Expected dummy columns for backend validation
-                    "input_schema": input_schema,   # User-facing form schema
-                    "target": request.target_column
-                }
-
-        else: # Regression
-            models = {
-                "Linear Regression": LinearRegression(),
-                "Random Forest": RandomForestRegressor(n_estimators=100),
-                "XGBoost": xgb.XGBRegressor()
+        else:
+            tasks = {
+                name: (fit_candidate, (name, problem_type, X_fit, y_fit, X_eval, y_eval))
+                for name in model_ids
             }
-            
-            for name, model in models.items():
-                model.fit(X_train, y_train)
-                preds = model.predict(X_test)
-                r2 = r2_score(y_test, preds)
-                mse = mean_squared_error(y_test, preds)
-                results.append({
-                    "model": name,
-                    "r2": float(r2),
-                    "mse": float(mse),
-                    "model_id": str(uuid.uuid4()),
-                    "type": "regression"
-                })
-                # Store model
-                model_id = results[-1]["model_id"]
-                MODELS[model_id] = {
-                    "model": model, 
-                    "name": name, 
-                    "type": "regression", 
-                    "features": X.columns.tolist(),
-                    "input_schema": input_schema,
-                    "target": request.target_column
-                }
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Training failed: {str(e)}")
-
-    # Sort results by primary metric
-    if problem_type == "classification":
-        results.sort(key=lambda x: x['accuracy'], reverse=True)
-    else:
-        results.sort(key=lambda x: x['r2'], reverse=True)
+        training_rows = X_fit.shape[0]
+        feature_matrix = feature_matrix_report(prepared["X"], pipeline)
+        # Whole splits for the fast-mode refit, handed over once: the callbacks below must
+        # not capture them, or every finished job would keep its training data in memory
+        if subsample:
+            refit_data.append((X_train, y_train, X_test, y_test))
+
+    def store_model(job, name, result):
+        # Runs in the parent process once a candidate (or a refit) finishes.
+        # Writing under an existing id replaces the model atomically.
+        model_id = model_ids[name]
+        # Timed inside the pool worker; recorded here where the metrics live
+        stage_name = name.lower().replace(" ", "_")
+        observe_stage(f"train.fit.{stage_name}", result["fit_seconds"])
+        if "predict_seconds" in result:
+            observe_stage(f"train.predict.{stage_name}", result["predict_seconds"])
+        with stage("train.store"):
+            MODELS[model_id] = {
+                # Popped: the pool's result object must not keep the model alive
+                "model": result.pop("model"),
+                "name": name,
+                "type": problem_type,
+                "pipeline": pipeline, # Fitted preprocessing applied by predict/explain
+                "features": pipeline.feature_names, # Expected dummy columns for backend validation
+                "input_schema": pipeline.input_schema, # User-facing form schema
+                "target": request.target_column,
+                "metrics": result["metrics"],
+                "dataset_id": request.dataset_id,
+                "background": background, # SHAP background sample for non-tree explainers
+            }
+        return {
+            "model": name,
+            **result["metrics"],
+            "model_id": model_id,
+            "type": problem_type,
+            "fit_seconds": result["fit_seconds"],
+            "training_rows": result.get("training_rows", training_rows),
+            **({"search": result["search"]} if "search" in result else {})
+        }
+
+    def ranked(results):
+        metric = ranking_metric(problem_type, request.search)
+        completed = [r for r in results.values() if r is not None]
+        return sorted(completed, key=lambda r: r[metric] if r.get(metric) is not None else float("-inf"), reverse=True)
+
+    def explain_models(results):
+        # Warm the SHAP cache, best model first. Only once the job is done: TreeExplainer
+        # holds the GIL and would otherwise slow down the remaining fits and the API
+        for result in ranked(results):
+            precompute_global_importance(result["model_id"], request.dataset_id)
+
+    def finish_job(job_id, results):
+        completed = ranked(results)
+        if not completed:
+            return
+        if not subsample:
+            # Out-of-core jobs skip the SHAP warm-up: it would encode the whole dataset at once
+            if not request.out_of_core:
+                explain_models(results)
+            return
+
+        # Fast mode: only the winner is refit on every training row, then swapped in under the same id
+        X_train, y_train, X_test, y_test = refit_data.pop()
+        best = completed[0]
+        name = best["model"]
+        params = best["search"]["best_params"] if "search" in best else None
+        full_rows = X_train.shape[0]
+
+        def store_refit(job, name, result):
+            result["training_rows"] = full_rows
+            return store_model(job, name, result)
 
-    return clean_nan({
-        "status": "success",
+        refit_id = JOBS.submit(
+            {name: (fit_candidate, (name, problem_type, X_train, y_train, X_test, y_test, params, MAX_WORKERS))},
+            on_task_done=store_refit,
+            on_job_done=lambda refit_id, results: explain_models(results),
+            dataset_id=request.dataset_id,
+            target_column=request.target_column,
+            problem_type=problem_type,
+            model_ids={name: model_ids[name]},
+            dropped_columns=pipeline.dropped_columns,
+            search=False,
+            refit_of=job_id,
+        )
+        JOBS.update(job_id, refit={"job_id": refit_id, "model": name, "model_id": model_ids[name]})
+
+    job_id = JOBS.submit(
+        tasks,
+        on_task_done=store_model,
+        on_job_done=finish_job,
+        dataset_id=request.dataset_id,
+        target_column=request.target_column,
+        problem_type=problem_type,
+        model_ids=model_ids,
+        dropped_columns=pipeline.dropped_columns,
+        search=request.search,
+        subsampled_rows=training_rows if subsample else None,
+        out_of_core=request.out_of_core,
+    )
+
+    return FastJSONResponse({
+        "status": "queued",
+        "job_id": job_id,
         "dataset_id": request.dataset_id,
         "problem_type": problem_type,
-        "results": results,
-        "best_model": results[0] if results else None,
-        "dropped_columns": dropped_cols
+        "models": [{"model": name, "model_id": model_id} for name, model_id in model_ids.items()],
+        "dropped_columns": pipeline.dropped_columns,
+        "feature_matrix": feature_matrix
     })
+
+@router.get("/jobs/{job_id}")
+async def get_training_job(job_id: str):
+    """
+    Report per-model progress of a training job and the leaderboard so far.
+    """
+    if job_id not in JOBS:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    job = JOBS.snapshot(job_id)
+    tasks = job.pop("tasks")
+    model_ids = job.pop("model_ids")
+
+    # Sort results by primary metric (the less noisy CV mean in search mode)
+    metric = ranking_metric(job["problem_type"], job.get("search"))
+    results = [t["result"] for t in tasks if t["result"] is not None]
+    results.sort(key=lambda x: x[metric] if x.get(metric) is not None else float("-inf"), reverse=True)
+
+    job["models"] = [
+        {
+            "model": t["name"],
+            "model_id": model_ids[t["name"]],
+            "status": t["status"],
+            **({"error": t["error"]} if t["error"] else {})
+        }
+        for t in tasks
+    ]
+    job["results"] = results
+    job["best_model"] = results[0] if results else None
+    return FastJSONResponse(job)
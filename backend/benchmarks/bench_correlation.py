@@ -0,0 +1,79 @@
+"""
+Correlation engine (app/core/correlation.py) versus the previous profile path:
+`numeric_df.corr()` as nested dicts plus the triu/stack/sort top pairs. Wall time,
+peak traced memory (tracemalloc sees numpy and pandas buffers) and JSON payload size
+for wide numeric frames, exact and on a row sample.
+
+Run from backend/:  python -m benchmarks.bench_correlation
+"""
+import os
+import tempfile
+import time
+import tracemalloc
+os.environ.setdefault("INSIGHTLENS_DATA_DIR", tempfile.mkdtemp(prefix="insightlens-bench-"))
+
+import numpy as np
+import pandas as pd
+from app.core.correlation import compute_correlations
+from app.core.responses import dumps
+
+SHAPES = ((20_000, 200), (20_000, 1000), (20_000, 3000))
+SAMPLE_ROWS = 5000
+LEGACY_MAX_COLUMNS = 1000 # The quadratic path takes minutes beyond this
+
+
+def make_frame(rows, cols, seed=0):
+    rng = np.random.default_rng(seed)
+    factors = rng.normal(size=(rows, 20)).astype(np.float32)
+    values = factors[:, rng.integers(0, 20, cols)] + rng.normal(size=(rows, cols)).astype(np.float32)
+    return pd.DataFrame(values.astype(np.float64), columns=[f"f{i}" for i in range(cols)])
+
+
+def legacy(df, k=10):
+    corr_matrix = df.corr()
+    abs_corr = corr_matrix.abs()
+    sol = (abs_corr.where(np.triu(np.ones(abs_corr.shape), k=1).astype(bool))
+           .stack()
+           .sort_values(ascending=False))
+    top = [{"x": a, "y": b, "value": float(v)} for (a, b), v in sol.head(k).items()]
+    return {"correlations": corr_matrix.fillna(0).to_dict(), "top_correlations": top}
+
+
+def measure(fn):
+    # Timed without tracing (tracemalloc slows down Python-object allocation), then traced
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak / 1e6
+
+
+def main():
+    print(f"{'shape':>14}  {'method':<26}{'seconds':>9}{'peak MB':>9}{'payload':>11}  top-10 pairs  max |r error|")
+    for rows, cols in SHAPES:
+        df = make_frame(rows, cols)
+        runs = [
+            ("engine top-10", lambda: compute_correlations(df, k=10)),
+            (f"engine top-10, {SAMPLE_ROWS} rows", lambda: compute_correlations(df, k=10, sample_rows=SAMPLE_ROWS)),
+        ]
+        if cols <= LEGACY_MAX_COLUMNS:
+            runs.insert(0, ("corr + triu/stack/sort", lambda: legacy(df)))
+            runs.append(("engine full matrix", lambda: compute_correlations(df, k=10, full=True)))
+        reference = None
+        for label, fn in runs:
+            result, seconds, peak = measure(fn)
+            top = result.get("top_correlations") or result["top"]
+            pairs = [(p["x"], p["y"]) for p in top]
+            reference = reference or pairs
+            # Against the exact float64 correlation of the same pairs
+            error = max(abs(p["value"] - df[p["x"]].corr(df[p["y"]])) for p in top)
+            extra = f" (bound {result['error_bound']:.3f})" if result.get("error_bound") else ""
+            print(f"{rows:>7}x{cols:<6}  {label:<26}{seconds:>9.2f}{peak:>9.0f}{len(dumps(result)) / 1e6:>9.2f}MB"
+                  f"  {len(set(pairs) & set(reference)):>6}/10  {error:>12.1e}{extra}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+End-to-end endpoint benchmark: runs `app.main:app` in-process through an ASGI
+client on a synthetic dataset and measures latency, throughput and peak RSS for
+upload, profile, scatter, train, predict, batch predict and explain. Results are
+written as JSON; `--compare` flags endpoints whose median latency regressed.
+
+Run from backend/:
+    python -m benchmarks.bench_endpoints --rows 100000 --output results.json
+    python -m benchmarks.bench_endpoints --rows 100000 --compare results.json
+
+Models and disk-store data go to a temporary INSIGHTLENS_DATA_DIR unless one is set.
+Peak RSS covers this process only (training runs in pool worker processes).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+
+def make_dataset(rows, numeric=8, categorical=4, levels=10, seed=0):
+    """
+    `numeric` float columns, `categorical` string columns with `levels` values each,
+    a binary "target" that depends on both, and ~1% missing values.
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({f"num{i}": rng.normal(size=rows) for i in range(numeric)})
+    logit = df.iloc[:, :min(numeric, 3)].sum(axis=1).to_numpy() if numeric else np.zeros(rows)
+    for i in range(categorical):
+        codes = rng.integers(0, levels, rows)
+        df[f"cat{i}"] = np.asarray([f"level{c}" for c in range(levels)], dtype=object)[codes]
+        logit = logit + (codes % 3 - 1) * 0.5
+    df["target"] = (logit + rng.normal(size=rows) > 0).astype(int)
+    if numeric:
+        df.loc[rng.random(rows) < 0.01, "num0"] = np.nan
+    return df
+
+
+def current_rss():
+    """
+    Resident set size of this process in bytes (Linux /proc; high-water mark elsewhere).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        scale = 1 if sys.platform == "darwin" else 1024 # ru_maxrss is KB on Linux, bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class RSSSampler:
+    """
+    Samples RSS in a background thread while the block runs; `peak` is the maximum seen.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+
+    def __enter__(self):
+        self.start = self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+def summarize(latencies, wall_seconds, sampler, units=1, errors=0):
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "latency_ms": {
+            "mean": float(latencies_ms.mean()),
+            "p50": float(np.percentile(latencies_ms, 50)),
+            "p95": float(np.percentile(latencies_ms, 95)),
+            "min": float(latencies_ms.min()),
+            "max": float(latencies_ms.max()),
+        },
+        # Requests per second (or rows per second for batch scoring)
+        "throughput_per_s": len(latencies) * units / wall_seconds,
+        "peak_rss_mb": sampler.peak / 2**20,
+        "rss_delta_mb": (sampler.peak - sampler.start) / 2**20,
+    }
+
+
+async def measure(send, count, concurrency=1, units=1):
+    """
+    Call `send(i)` `count` times with at most `concurrency` in flight.
+    `send` returns an httpx response; non-2xx responses count as errors.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await send(i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 300:
+                errors += 1
+                print(f"  {response.request.method} {response.request.url.path}: {response.status_code} {response.text[:200]}")
+
+    with RSSSampler() as sampler:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(count)))
+        wall = time.perf_counter() - start
+    return summarize(latencies, wall, sampler, units, errors)
+
+
+async def wait_for_job(client, job_id, poll_seconds=0.1):
+    while True:
+        job = (await client.get(f"/train/jobs/{job_id}")).json()
+        if job["status"] in ("completed", "failed"):
+            return job
+        await asyncio.sleep(poll_seconds)
+
+
+async def run(args):
+    import httpx
+    from app.main import app
+
+    df = make_dataset(args.rows, args.numeric, args.categorical, args.levels)
+    csv_bytes = df.to_csv(index=False).encode()
+    rows = df.drop(columns=["target"]).dropna().head(args.requests).to_dict(orient="records")
+    results = {}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        dataset_ids = []
+
+        async def upload(i):
+            response = await client.post("/data/upload", files={"file": ("bench.csv", csv_bytes, "text/csv")})
+            dataset_ids.append(response.json().get("dataset_id"))
+            return response
+
+        print("upload")
+        results["upload"] = await measure(upload, args.repeat)
+        dataset_id = dataset_ids[0]
+
+        print("profile")
+        results["profile"] = await measure(lambda i: client.get(f"/data/profile/{dataset_id}"), args.repeat)
+
+        print("scatter")
+        results["scatter"] = await measure(
+            lambda i: client.get(f"/data/scatter/{dataset_id}", params={"x": "num0", "y": "num1"}), args.repeat
+        )
+
+        jobs = []
+
+        async def train(i):
+            # End-to-end: queue the job and wait for the whole leaderboard
+            response = await client.post("/train/", json={"dataset_id": dataset_id, "target_column": "target", **args.train_options})
+            if response.status_code < 300:
+                jobs.append(await wait_for_job(client, response.json()["job_id"]))
+            return response
+
+        print("train")
+        results["train"] = await measure(train, args.train_repeat)
+        job = jobs[-1]
+        if not job["best_model"]:
+            raise SystemExit(f"Training failed: {job['models']}")
+        model_id = job["best_model"]["model_id"]
+        results["train"]["models"] = {r["model"]: r.get("fit_seconds") for r in job["results"]}
+
+        print("predict")
+        results["predict"] = await measure(
+            lambda i: client.post("/predict/", json={"model_id": model_id, "features": rows[i % len(rows)]}),
+            args.requests, concurrency=args.concurrency,
+        )
+
+        print("predict_batch")
+        results["predict_batch"] = await measure(
+            lambda i: client.post("/predict/batch", data={"model_id": model_id, "dataset_id": dataset_id}),
+            args.repeat, units=args.rows,
+        )
+        results["predict_batch"]["throughput_unit"] = "rows"
+
+        print("explain")
+        results["explain"] = await measure(
+            lambda i: client.post("/explain/", json={"model_id": model_id, "dataset_id": dataset_id}), args.repeat
+        )
+
+        print("explain_local")
+        results["explain_local"] = await measure(
+            lambda i: client.post("/explain/local", json={"model_id": model_id, "features": rows[i % len(rows)]}),
+            args.requests, concurrency=args.concurrency,
+        )
+    return results
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """
+    Endpoints whose median latency grew by more than `threshold`x and by more than
+    `min_delta_ms` (so sub-millisecond jitter on cached endpoints is not flagged).
+    """
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            continue
+        ratio = current["latency_ms"]["p50"] / max(before["latency_ms"]["p50"], 1e-9)
+        print(f"{name:<16}{before['latency_ms']['p50']:>12.1f}{current['latency_ms']['p50']:>12.1f}{ratio:>9.2f}x")
+        if ratio > threshold and current["latency_ms"]["p50"] - before["latency_ms"]["p50"] > min_delta_ms:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--numeric", type=int, default=8, help="numeric feature columns")
+    parser.add_argument("--categorical", type=int, default=4, help="categorical feature columns")
+    parser.add_argument("--levels", type=int, default=10, help="distinct values per categorical column")
+    parser.add_argument("--repeat", type=int, default=5, help="calls per endpoint (upload, profile, scatter, batch, explain)")
+    parser.add_argument("--train-repeat", type=int, default=1)
+    parser.add_argument("--train-options", type=json.loads, default={}, help='extra /train/ fields as JSON, e.g. \'{"fast": true}\'')
+    parser.add_argument("--requests", type=int, default=200, help="single-row predict / local explain requests")
+    parser.add_argument("--concurrency", type=int, default=8, help="in-flight single-row requests")
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    parser.add_argument("--compare", help="baseline results JSON to compare median latencies against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="p50 ratio counted as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="ignore p50 increases smaller than this")
+    args = parser.parse_args()
+
+    os.environ.setdefault("INSIGHTLENS_DATA_DIR", tempfile.mkdtemp(prefix="insightlens-bench-"))
+    results = asyncio.run(run(args))
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "threshold", "min_delta_ms")},
+            "env": {k: v for k, v in os.environ.items() if k.startswith("INSIGHTLENS_")},
+        },
+        "results": results,
+    }
+
+    print(f"{'endpoint':<16}{'p50 ms':>10}{'p95 ms':>10}{'per s':>12}{'peak RSS MB':>13}")
+    for name, r in results.items():
+        print(f"{name:<16}{r['latency_ms']['p50']:>10.1f}{r['latency_ms']['p95']:>10.1f}{r['throughput_per_s']:>12.1f}{r['peak_rss_mb']:>13.0f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\n{'endpoint':<16}{'base p50':>12}{'p50':>12}{'ratio':>10}")
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"Regressions (> {args.threshold}x): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
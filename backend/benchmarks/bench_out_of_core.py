@@ -0,0 +1,75 @@
+"""
+Peak memory of training versus dataset size: the in-memory path (prepare_training_data,
+train_test_split, fit) against out-of-core training (app/core/incremental.py) with a
+64 MB budget. Each fit runs in a fresh process that reports its peak RSS; "imports"
+is the footprint of a process that only loads the libraries.
+
+Run from backend/:  python -m benchmarks.bench_out_of_core
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+ROW_COUNTS = (250_000, 2_000_000)
+MODES = ("imports", "in-memory XGBoost", "out-of-core XGBoost", "out-of-core SGD")
+BUDGET_MB = 64
+
+
+def make_dataset(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({f"x{i}": rng.normal(size=rows) for i in range(8)})
+    df["city"] = rng.choice([f"city_{i}" for i in range(20)], rows)
+    df["target"] = (df["x0"] + df["x1"] * df["x2"] + (df["city"] == "city_3") > 0).astype(int)
+    return df
+
+
+def run(mode):
+    # Runs in the child process (INSIGHTLENS_STORE=disk, shared data directory)
+    from app.core import incremental
+    from app.core.training import fit_candidate
+    from app.routers.train import TrainRequest, prepare_training_data, prepare_out_of_core
+    from sklearn.model_selection import train_test_split
+
+    start = time.perf_counter()
+    metrics = {}
+    if mode == "in-memory XGBoost":
+        request = TrainRequest(dataset_id="bench", target_column="target")
+        prepared = prepare_training_data(request)
+        X_train, X_test, y_train, y_test = train_test_split(prepared["X"], prepared["y"], test_size=0.2, random_state=42)
+        metrics = fit_candidate("XGBoost", "classification", X_train, y_train, X_test, y_test)["metrics"]
+    elif mode != "imports":
+        request = TrainRequest(dataset_id="bench", target_column="target", out_of_core=True, memory_budget_mb=BUDGET_MB)
+        prepared = prepare_out_of_core(request)
+        name = "XGBoost" if mode.endswith("XGBoost") else "SGD Classifier"
+        metrics = incremental.fit_out_of_core(name, "classification", "bench", "target", prepared["target"],
+                                              prepared["pipeline"], prepared["chunk_rows"])["metrics"]
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{peak_mb:.0f} {time.perf_counter() - start:.1f} {metrics.get('accuracy', float('nan')):.4f}")
+
+
+def main():
+    with tempfile.TemporaryDirectory(prefix="insightlens-bench-") as data_dir:
+        env = {**os.environ, "INSIGHTLENS_STORE": "disk", "INSIGHTLENS_DATA_DIR": data_dir}
+        print(f"{'rows':>10}  {'mode':<22}{'peak RSS MB':>12}{'seconds':>9}{'accuracy':>10}")
+        for rows in ROW_COUNTS:
+            writer = "from app.core.store import DATASETS; from benchmarks.bench_out_of_core import make_dataset; " \
+                     f"df = make_dataset({rows}); DATASETS['bench'] = {{'id': 'bench', 'filename': 'bench.csv', " \
+                     "'data': df, 'columns': df.columns.tolist(), 'shape': list(df.shape)}"
+            subprocess.run([sys.executable, "-c", writer], env=env, check=True)
+            for mode in MODES:
+                out = subprocess.run([sys.executable, "-m", "benchmarks.bench_out_of_core", "--run", mode],
+                                     env=env, check=True, capture_output=True, text=True).stdout.split()
+                peak, seconds, accuracy = out[-3:]
+                print(f"{rows:>10}  {mode:<22}{peak:>12}{seconds:>9}{accuracy:>10}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--run":
+        run(sys.argv[2])
+    else:
+        main()
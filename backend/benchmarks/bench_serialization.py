@@ -0,0 +1,74 @@
+"""
+Serialization benchmark: legacy `clean_nan` + FastAPI's default JSON path
+versus the orjson-based FastJSONResponse, on large profile and scatter payloads.
+
+Run from backend/:  python -m benchmarks.bench_serialization
+"""
+import math
+import os
+import tempfile
+import time
+os.environ.setdefault("INSIGHTLENS_DATA_DIR", tempfile.mkdtemp(prefix="insightlens-bench-"))
+
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.core.profiling import compute_profile
+from app.core.responses import FastJSONResponse
+
+
+def clean_nan(obj):
+    """
+    The recursive NaN clean-up previously applied to every payload (kept here for comparison).
+    """
+    if isinstance(obj, float):
+        return None if math.isnan(obj) or math.isinf(obj) else obj
+    elif isinstance(obj, dict):
+        return {k: clean_nan(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [clean_nan(v) for v in obj]
+    return obj
+
+
+def legacy_render(payload):
+    # What FastAPI did for `return clean_nan(...)`: clean, jsonable_encoder, json.dumps
+    return JSONResponse(jsonable_encoder(clean_nan(payload))).body
+
+
+def fast_render(payload):
+    return FastJSONResponse(payload).body
+
+
+def make_payloads(rows=100_000, cols=150, seed=0):
+    rng = np.random.default_rng(seed)
+    wide = pd.DataFrame(rng.normal(size=(2000, cols)), columns=[f"f{i}" for i in range(cols)])
+    wide.iloc[::7, ::3] = np.nan
+    scatter = pd.DataFrame({"x": rng.normal(size=rows), "y": rng.normal(size=rows)})
+    scatter.iloc[::50, 0] = np.nan
+    return {
+        f"profile ({cols} columns)": compute_profile(wide),
+        f"scatter ({rows} points)": scatter.to_dict(orient="records"),
+    }
+
+
+def bench(fn, payload, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(payload)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    print(f"{'payload':<28}{'legacy ms':>12}{'orjson ms':>12}{'speedup':>10}{'size KB':>10}")
+    for name, payload in make_payloads().items():
+        legacy = bench(legacy_render, payload)
+        fast = bench(fast_render, payload)
+        size = len(fast_render(payload)) / 1024
+        print(f"{name:<28}{legacy * 1000:>12.1f}{fast * 1000:>12.1f}{legacy / fast:>9.1f}x{size:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Startup cost of the API. First a `python -X importtime` breakdown of `import app.main`
+(cumulative milliseconds of each package, charged to whichever module imports it
+first) next to the plain wall time of the import. Then fresh uvicorn servers, with the
+background warm-up off and on: time to the first response of `/`, process RSS at that
+point, and the latency of the first upload, training run (until the job completes),
+prediction and explanation, sent THINK_SECONDS after the first response like a user
+opening the app.
+
+Run from backend/:  python -m benchmarks.bench_startup
+"""
+import io
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import requests
+
+RUNS = 3
+PORT = 8031
+THINK_SECONDS = 5
+TOP_PACKAGES = 12
+IMPORTTIME_LINE = re.compile(r"import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_breakdown():
+    """
+    Cumulative import time (ms) of `app.main`, of each third-party package and of
+    each app module directly imported by app.main (app.core.*, app.routers.*).
+    """
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"],
+                            capture_output=True, text=True, check=True).stderr
+    total, modules = 0.0, {}
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        ms, name = int(match[1]) / 1000, match[3]
+        if name == "app.main":
+            total = ms
+        elif ("." not in name and name not in sys.stdlib_module_names) or (name.startswith("app.") and len(match[2]) == 3):
+            modules[name] = ms
+    return total, sorted(modules.items(), key=lambda item: -item[1])
+
+
+def import_wall_ms():
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import app.main"], check=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def make_csv(rows=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"a": rng.normal(size=rows), "b": rng.normal(size=rows), "c": rng.choice(["x", "y", "z"], rows)})
+    df["target"] = (df["a"] + (df["c"] == "x") > 0).astype(int)
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False)
+    return buffer.getvalue()
+
+
+def rss_mb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    result.raise_for_status()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def first_requests(warmup, data_dir):
+    """
+    One fresh server: milliseconds to the first `/` response, RSS then, and the
+    latency of each first heavy request.
+    """
+    env = {**os.environ, "INSIGHTLENS_WARMUP": warmup, "INSIGHTLENS_DATA_DIR": data_dir,
+           "INSIGHTLENS_TRAIN_WORKERS": "1"}
+    url = f"http://127.0.0.1:{PORT}"
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(PORT)],
+                               env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                if requests.get(url + "/", timeout=1).status_code == 200:
+                    break
+            except requests.ConnectionError:
+                time.sleep(0.005)
+        result = {"first response": (time.perf_counter() - start) * 1000, "RSS MB": rss_mb(process.pid)}
+        time.sleep(THINK_SECONDS)
+
+        res, result["upload"] = timed(lambda: requests.post(
+            f"{url}/data/upload", files={"file": ("data.csv", make_csv(), "text/csv")}))
+        dataset_id = res.json()["dataset_id"]
+
+        def train():
+            job = requests.post(f"{url}/train/", json={"dataset_id": dataset_id, "target_column": "target"})
+            job_id = job.json()["job_id"]
+            while job.ok and job.json()["status"] not in ("completed", "failed"):
+                time.sleep(0.05)
+                job = requests.get(f"{url}/train/jobs/{job_id}")
+            return job
+
+        res, result["train"] = timed(train)
+        model_id = res.json()["best_model"]["model_id"]
+        _, result["predict"] = timed(lambda: requests.post(
+            f"{url}/predict/", json={"model_id": model_id, "features": {"a": 0.5, "b": -1.0, "c": "x"}}))
+        _, result["explain"] = timed(lambda: requests.post(
+            f"{url}/explain/", json={"model_id": model_id, "dataset_id": dataset_id}))
+        return result
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    total, modules = import_breakdown()
+    print(f"import app.main: {import_wall_ms():.0f} ms wall, {total:.0f} ms under -X importtime")
+    for name, ms in modules[:TOP_PACKAGES]:
+        print(f"  {name:<28}{ms:>8.0f} ms")
+
+    columns = ("first response", "RSS MB", "upload", "train", "predict", "explain")
+    print(f"\nFresh server, median of {RUNS} (ms; requests sent {THINK_SECONDS} s after the first response)")
+    print(f"{'warm-up':<10}" + "".join(f"{c:>16}" for c in columns))
+    for warmup in ("0", "1"):
+        runs = []
+        for _ in range(RUNS):
+            with tempfile.TemporaryDirectory(prefix="insightlens-bench-") as data_dir:
+                runs.append(first_requests(warmup, data_dir))
+        print(f"{'on' if warmup == '1' else 'off':<10}"
+              + "".join(f"{statistics.median(r[c] for r in runs):>16.0f}" for c in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Compiled tree-ensemble scoring (app/core/trees.py) versus the estimators' own
+predict_proba for 1, 100 and 100k-row inputs. Median latency per call on a
+binary task with default leaderboard parameters (Random Forest: 100 unpruned
+trees; XGBoost: 100 trees of depth 6).
+
+Run from backend/:  python -m benchmarks.bench_trees
+"""
+import os
+import tempfile
+import time
+os.environ.setdefault("INSIGHTLENS_DATA_DIR", tempfile.mkdtemp(prefix="insightlens-bench-"))
+
+import numpy as np
+from app.core.training import build_estimator
+from app.core.trees import compile_model
+
+ROW_COUNTS = (1, 100, 100_000)
+
+
+def make_dataset(rows=20_000, features=20, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(rows, features))
+    y = (X[:, 0] + X[:, 1] * X[:, 2] + rng.normal(scale=0.5, size=rows) > 0).astype(int)
+    return X, y
+
+
+def median_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)) * 1000
+
+
+def main():
+    X, y = make_dataset()
+    rng = np.random.default_rng(1)
+    print(f"{'model':<16}{'rows':>8}{'native ms':>12}{'compiled ms':>13}{'speedup':>9}")
+    for name in ("Random Forest", "XGBoost"):
+        model = build_estimator(name, "classification").fit(X, y)
+        start = time.perf_counter()
+        compiled = compile_model(model)
+        compile_ms = (time.perf_counter() - start) * 1000
+        for rows in ROW_COUNTS:
+            X_score = rng.normal(size=(rows, X.shape[1]))
+            repeat = 50 if rows <= 100 else 3
+            native = median_ms(lambda: model.predict_proba(X_score), repeat)
+            fast = median_ms(lambda: compiled.predict_proba(X_score), repeat)
+            print(f"{name:<16}{rows:>8}{native:>12.2f}{fast:>13.2f}{native / fast:>8.1f}x")
+        print(f"{name:<16}{'':>8}  compile: {compile_ms:.0f} ms, {compiled.n_nodes} nodes, depth {compiled.max_depth}")
+
+
+if __name__ == "__main__":
+    main()
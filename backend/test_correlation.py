@@ -0,0 +1,115 @@
+"""
+Checks of the blocked correlation engine (app/core/correlation.py) against
+`DataFrame.corr()`: a frame with missing values (pairwise-complete observations),
+constant and empty columns and more columns than one block, for the full matrix,
+the top-k pairs and the sampled path with its confidence intervals.
+
+Run from backend/:  python test_correlation.py   (or with pytest)
+"""
+import os
+import sys
+import tempfile
+os.environ.setdefault("INSIGHTLENS_DATA_DIR", tempfile.mkdtemp(prefix="insightlens-test-"))
+
+import numpy as np
+import pandas as pd
+import pytest
+from app.core.correlation import MATRIX_DECIMALS, SAMPLE_SEED, compute_correlations
+
+BLOCK_COLUMNS = 4 # Several blocks, the last one partial
+# float32 products, then the matrix is rounded to MATRIX_DECIMALS
+TOLERANCE = 1e-5
+MATRIX_TOLERANCE = 10 ** -MATRIX_DECIMALS
+
+
+def make_frame(rows=600, seed=0):
+    rng = np.random.default_rng(seed)
+    base = rng.normal(size=(rows, 3))
+    data = {}
+    for i in range(11):
+        # Mixtures of a few shared factors: correlations of every strength and sign
+        weights = rng.normal(size=3)
+        data[f"x{i}"] = base @ weights + rng.normal(scale=0.5 + i / 4, size=rows) + rng.normal(scale=5)
+    df = pd.DataFrame(data)
+    df["counts"] = rng.integers(0, 50, rows) + (base[:, 0] > 0) * 20 # Integer column
+    df["constant"] = 3.0 # Undefined correlations
+    df["empty"] = np.nan
+    df["label"] = rng.choice(["a", "b"], rows) # Not numeric: ignored
+    # Missing values in different rows of different columns
+    for i, col in enumerate(["x1", "x4", "x5", "x9", "counts"]):
+        df.loc[rng.random(rows) < 0.05 + i * 0.05, col] = np.nan
+    return df
+
+
+def expected_pairs(corr):
+    columns = list(corr.columns)
+    pairs = [
+        (columns[i], columns[j], corr.iat[i, j])
+        for i in range(len(columns)) for j in range(i + 1, len(columns))
+        if not np.isnan(corr.iat[i, j])
+    ]
+    return sorted(pairs, key=lambda pair: -abs(pair[2]))
+
+
+def test_full_matrix_matches_pandas():
+    df = make_frame()
+    numeric = df.select_dtypes(include=["number"])
+    assert numeric.shape[1] > BLOCK_COLUMNS
+    result = compute_correlations(df, k=5, full=True, block_columns=BLOCK_COLUMNS)
+
+    expected = numeric.corr()
+    assert result["columns"] == list(numeric.columns)
+    assert (result["rows"], result["total_rows"], result["sampled"]) == (len(df), len(df), False)
+    matrix = np.array(result["matrix"], dtype=np.float64)
+    # Same undefined pairs (constant or empty columns); the diagonal of a defined column is 1
+    np.testing.assert_array_equal(np.isnan(matrix), np.isnan(expected.to_numpy()))
+    np.testing.assert_allclose(matrix, expected.to_numpy(), atol=MATRIX_TOLERANCE, equal_nan=True)
+    # Symmetric across the block boundaries
+    np.testing.assert_array_equal(matrix, matrix.T)
+
+
+@pytest.mark.parametrize("block_columns", [BLOCK_COLUMNS, 256])
+def test_top_pairs_match_pandas(block_columns):
+    df = make_frame()
+    expected = expected_pairs(df.select_dtypes(include=["number"]).corr())
+    k = 12
+    result = compute_correlations(df, k=k, block_columns=block_columns)
+
+    assert len(result["top"]) == k
+    assert [(pair["x"], pair["y"]) for pair in result["top"]] == [(x, y) for x, y, _ in expected[:k]]
+    np.testing.assert_allclose([pair["value"] for pair in result["top"]], [r for _, _, r in expected[:k]], atol=TOLERANCE)
+    assert "matrix" not in result and all("ci" not in pair for pair in result["top"])
+
+    # More pairs than are defined: every defined pair, none of the undefined ones
+    everything = compute_correlations(df, k=1000, block_columns=block_columns)
+    assert len(everything["top"]) == len(expected)
+
+
+def test_sampled_pairs_and_bounds():
+    df = make_frame(rows=5000)
+    numeric = df.select_dtypes(include=["number"])
+    sample_rows = 1000
+    result = compute_correlations(df, k=20, sample_rows=sample_rows, block_columns=BLOCK_COLUMNS)
+    assert (result["rows"], result["total_rows"], result["sampled"]) == (sample_rows, len(df), True)
+
+    # Exactly the correlations of the seeded row sample
+    rng = np.random.default_rng(SAMPLE_SEED)
+    sample = numeric.iloc[np.sort(rng.choice(len(df), sample_rows, replace=False))]
+    expected = expected_pairs(sample.corr())[:20]
+    assert [(pair["x"], pair["y"]) for pair in result["top"]] == [(x, y) for x, y, _ in expected]
+    np.testing.assert_allclose([pair["value"] for pair in result["top"]], [r for _, _, r in expected], atol=TOLERANCE)
+
+    # The intervals hold the sampled value, and the bound covers the error against all rows
+    full = numeric.corr()
+    for pair in result["top"]:
+        low, high = pair["ci"]
+        assert low < pair["value"] < high
+        assert abs(pair["value"] - full.loc[pair["x"], pair["y"]]) <= result["error_bound"]
+    assert 0 < result["error_bound"] < 0.5
+
+    # No sampling when the frame is smaller than the sample
+    assert compute_correlations(df, k=20, sample_rows=len(df))["sampled"] is False
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([os.path.abspath(__file__), "-q"]))
@@ -31,12 +31,18 @@ def test_flow():
     print("Fetching profile...")
     res = requests.get(f"{BASE_URL}/data/profile/{dataset_id}")
     profile = res.json()
-    if "correlations" in profile:
+    if "top_correlations" in profile:
         print("✅ Correlations found in profile")
-        print(profile["correlations"])
+        print(profile["top_correlations"])
     else:
         print("❌ Correlations missing in profile")
 
+    res = requests.get(f"{BASE_URL}/data/correlations/{dataset_id}?full=true")
+    if res.status_code == 200 and len(res.json()["matrix"]) == len(res.json()["columns"]):
+        print("✅ Correlation matrix received")
+    else:
+        print("❌ Correlation matrix failed:", res.text)
+
     # 4. Scatter Data
     print("Fetching scatter data (A vs B)...")
     res = requests.get(f"{BASE_URL}/data/scatter/{dataset_id}?x=A&y=B")
@@ -0,0 +1,78 @@
+"""
+Additivity check of local SHAP explanations (app/core/explanations.py): for XGBoost
+trained on sparse-encoded features, base value + contributions must equal the margin
+the served model computes for each row (XGBoost reads unstored entries as missing,
+so explaining a densified copy would explain a different function).
+
+Run from backend/:  python test_explanations.py   (or with pytest)
+"""
+import os
+import sys
+import tempfile
+os.environ.setdefault("INSIGHTLENS_DATA_DIR", tempfile.mkdtemp(prefix="insightlens-test-"))
+
+import numpy as np
+import pandas as pd
+from app.core.explanations import explain_rows
+from app.core.preprocessing import FeaturePipeline
+from app.core.registry import MODELS
+from app.core.training import build_estimator
+
+TOLERANCE = 1e-4 # XGBoost sums leaf values in float32
+
+
+def make_frame(rows, seed):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "a": np.where(rng.random(rows) < 0.4, 0.0, rng.normal(size=rows)), # Zeros are not stored in CSR
+        "b": rng.normal(size=rows),
+        "c": rng.choice([f"v{i}" for i in range(12)], rows),
+    })
+    codes = df["c"].str[1:].astype(int)
+    targets = {
+        "binary": ("classification", ((df["a"] + (codes % 3 == 0)) > 0.2).astype(int)),
+        "multiclass": ("classification", np.digitize(df["a"] + codes / 6, [0.5, 1.5])),
+        "regression": ("regression", df["a"] * 3 + df["b"] + codes / 4),
+    }
+    return df, targets
+
+
+def test_sparse_xgboost_contributions_sum_to_margin():
+    df, targets = make_frame(1500, 0)
+    records = make_frame(200, 1)[0].to_dict(orient="records")
+    ok = True
+    for target, (problem_type, y) in targets.items():
+        pipeline = FeaturePipeline(encoding="sparse")
+        X = pipeline.fit_transform(df, y, problem_type)
+        model = build_estimator("XGBoost", problem_type).fit(X, y)
+        model_id = f"test-sparse-{target}"
+        MODELS[model_id] = {
+            "model": model, "name": "XGBoost", "type": problem_type, "pipeline": pipeline,
+            "features": pipeline.feature_names, "input_schema": pipeline.input_schema,
+        }
+
+        margin = model.predict(pipeline.transform_records(records), output_margin=True)
+        explanations = explain_rows(model_id, records)
+        diffs = []
+        for i, explanation in enumerate(explanations):
+            total = explanation["base_value"] + sum(c["value"] for c in explanation["contributions"])
+            if margin.ndim > 1:
+                expected = margin[i, list(model.classes_).index(explanation["explained_class"])]
+            else:
+                expected = margin[i]
+            diffs.append(abs(total - expected))
+        diff = max(diffs)
+        passed = diff <= TOLERANCE * max(1.0, float(np.abs(margin).max()))
+        print(f"{'✅' if passed else '❌'} XGBoost {target} sparse: max |base + sum - margin| {diff:.2e}")
+        ok &= passed
+        del MODELS[model_id]
+    assert ok
+
+
+if __name__ == "__main__":
+    try:
+        test_sparse_xgboost_contributions_sum_to_margin()
+    except AssertionError:
+        print("Additivity checks failed")
+        sys.exit(1)
+    print("All additivity checks passed")
@@ -0,0 +1,159 @@
+"""
+Checks of out-of-core training (app/core/incremental.py): the hashed test split,
+chunk sizing from the memory budget, SGD with the standardisation folded back into
+the coefficients, and an end-to-end `out_of_core=True` training request on a
+server with the disk store.
+
+Run from backend/:  python test_incremental.py   (or with pytest)
+"""
+import io
+import os
+import sys
+import tempfile
+import time
+os.environ.setdefault("INSIGHTLENS_DATA_DIR", tempfile.mkdtemp(prefix="insightlens-test-"))
+
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+import scipy.sparse as sp
+from app.core import incremental
+from app.core.preprocessing import FeaturePipeline
+from test_multiworker import start_server
+
+
+def make_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "a": rng.normal(size=rows),
+        "b": rng.normal(3, 10, size=rows), # Far from standardised: the folding matters
+        "c": rng.choice([f"v{i}" for i in range(20)], rows),
+    })
+    df["label"] = ((df["a"] + df["b"] / 10 + (df["c"] < "v05")) > 0.3).astype(int)
+    df["value"] = 2 * df["a"] - df["b"] + 5 * (df["c"] == "v01") + rng.normal(size=rows)
+    return df
+
+
+def test_held_out_is_stable_and_sized():
+    positions = np.arange(200_000)
+    mask = incremental.held_out(positions)
+    assert abs(mask.mean() - incremental.TEST_FRACTION) < 0.005
+    # Same rows whatever the chunking (and in every process): the hash only sees the position
+    chunked = np.concatenate([incremental.held_out(positions[i:i + 777]) for i in range(0, len(positions), 777)])
+    np.testing.assert_array_equal(mask, chunked)
+    np.testing.assert_array_equal(mask, incremental.held_out(positions.copy()))
+    # Not a regular pattern: another seed picks other rows
+    assert (mask != incremental.held_out(positions, seed=7)).mean() > 0.2
+    assert not np.array_equal(mask[:1000], np.resize(mask[:100], 1000))
+
+
+@pytest.mark.parametrize("encoding", ["dense", "sparse"])
+def test_chunk_rows_for_budget(encoding):
+    df = make_frame(5000)
+    X_raw = df.drop(columns=["label", "value"])
+    pipeline = FeaturePipeline(encoding=encoding).fit(X_raw)
+
+    rows = incremental.chunk_rows_for_budget(X_raw, pipeline, 64)
+    assert rows > incremental.MIN_CHUNK_ROWS
+    assert abs(incremental.chunk_rows_for_budget(X_raw, pipeline, 128) / rows - 2) < 0.01
+    assert incremental.chunk_rows_for_budget(X_raw, pipeline, 0.01) == incremental.MIN_CHUNK_ROWS
+
+    # A raw chunk of that size and its encoded matrix fit in the chunk's share of the budget
+    chunk = X_raw.sample(rows, replace=True, random_state=0)
+    X = pipeline.transform(chunk)
+    encoded_bytes = X.data.nbytes + X.indices.nbytes + X.indptr.nbytes if sp.issparse(X) else X.nbytes
+    used = chunk.memory_usage(index=False, deep=True).sum() + encoded_bytes
+    assert used <= 64 * 1024 * 1024 * incremental.CHUNK_BUDGET_FRACTION
+
+
+@pytest.mark.parametrize("encoding", ["dense", "sparse"])
+@pytest.mark.parametrize("problem_type", ["classification", "regression"])
+def test_fit_sgd_matches_standardised_model(problem_type, encoding):
+    from sklearn.linear_model import SGDClassifier, SGDRegressor
+
+    df = make_frame(6000)
+    target = "label" if problem_type == "classification" else "value"
+    pipeline = FeaturePipeline(encoding=encoding).fit(df.drop(columns=["label", "value"]))
+    parts = [
+        (pipeline.transform(df.iloc[i:i + 1500].drop(columns=["label", "value"])), df[target].to_numpy()[i:i + 1500])
+        for i in range(0, len(df), 1500)
+    ]
+    classes = np.array([0, 1]) if problem_type == "classification" else None
+    epochs = 3
+    model, rows = incremental._fit_sgd(problem_type, lambda: iter(parts), classes, epochs)
+    assert rows == len(df)
+
+    # Reference: the same updates on explicitly standardised features (and target),
+    # predicting through the standardisation instead of folded coefficients. The
+    # statistics are summed chunk by chunk like the first pass: the classifier's
+    # large early steps would amplify rounding differences
+    sums = sum(np.asarray(X_part.sum(axis=0)).ravel() for X_part, _ in parts)
+    squares = sum(np.asarray(X_part.multiply(X_part).sum(axis=0) if sp.issparse(X_part) else (X_part * X_part).sum(axis=0)).ravel()
+                  for X_part, _ in parts)
+    mean = np.zeros_like(sums) if encoding == "sparse" else sums / rows # Sparse input is only scaled
+    scale = np.sqrt(np.maximum(squares / rows - mean ** 2, 0))
+    scale[scale == 0] = 1.0
+    y = df[target].to_numpy()
+    y_mean, y_scale = (y.mean(), y.std()) if problem_type == "regression" else (0.0, 1.0)
+
+    def standardise(X_part):
+        return X_part.multiply(1 / scale).tocsr() if sp.issparse(X_part) else (X_part - mean) / scale
+
+    reference = SGDClassifier(loss="log_loss", random_state=42) if classes is not None else SGDRegressor(random_state=42)
+    rng = np.random.default_rng(42)
+    for _ in range(epochs):
+        for X_part, y_part in parts:
+            order = rng.permutation(X_part.shape[0])
+            X_std = standardise(X_part)[order]
+            if classes is not None:
+                reference.partial_fit(X_std, y_part[order], classes=classes)
+            else:
+                reference.partial_fit(X_std, (y_part[order] - y_mean) / y_scale)
+
+    X = sp.vstack([X_part for X_part, _ in parts]).tocsr() if encoding == "sparse" else np.vstack([X_part for X_part, _ in parts])
+    X_std = standardise(X)
+    if classes is not None:
+        np.testing.assert_allclose(model.decision_function(X), reference.decision_function(X_std), rtol=1e-6, atol=1e-8)
+        np.testing.assert_array_equal(model.predict(X), reference.predict(X_std))
+    else:
+        np.testing.assert_allclose(model.predict(X), reference.predict(X_std) * y_scale + y_mean, rtol=1e-6, atol=1e-8)
+
+
+def test_out_of_core_training_end_to_end():
+    df = make_frame(4000)
+    buffer = io.StringIO()
+    df.drop(columns=["value"]).to_csv(buffer, index=False)
+    with tempfile.TemporaryDirectory(prefix="insightlens-test-") as data_dir:
+        process, url = start_server(8024, data_dir)
+        try:
+            upload = requests.post(f"{url}/data/upload", files={"file": ("data.csv", buffer.getvalue(), "text/csv")})
+            assert upload.status_code == 200, upload.text
+            job = requests.post(f"{url}/train/", json={
+                "dataset_id": upload.json()["dataset_id"], "target_column": "label",
+                "out_of_core": True, "memory_budget_mb": 16,
+            })
+            assert job.status_code == 200, job.text
+            deadline = time.time() + 300
+            while (status := requests.get(f"{url}/train/jobs/{job.json()['job_id']}").json())["status"] not in ("completed", "failed"):
+                assert time.time() < deadline, "out-of-core training did not finish"
+                time.sleep(0.5)
+
+            assert status["status"] == "completed", status
+            assert {r["model"] for r in status["results"]} == set(incremental.CANDIDATES["classification"])
+            for result in status["results"]:
+                assert result["accuracy"] > 0.8, result
+                # Both splits are streamed: about TEST_FRACTION of the rows are held out
+                assert abs(result["training_rows"] / len(df) - (1 - incremental.TEST_FRACTION)) < 0.03
+                prediction = requests.post(f"{url}/predict/", json={
+                    "model_id": result["model_id"], "features": {"a": 1.0, "b": 5.0, "c": "v02"},
+                })
+                assert prediction.status_code == 200, prediction.text
+                assert prediction.json()["prediction"] in ("0", "1", 0.0, 1.0)
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([os.path.abspath(__file__), "-q"]))
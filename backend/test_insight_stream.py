@@ -0,0 +1,83 @@
+"""
+POST /insight/stream through an in-process ASGI client with the mock LLM provider:
+Server-Sent Events framing, the streamed tokens and the final `done` event.
+
+Run from backend/:  python test_insight_stream.py   (or with pytest)
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+os.environ["INSIGHTLENS_LLM_PROVIDER"] = "mock"
+os.environ["INSIGHTLENS_LLM_MOCK_LATENCY"] = "0.05"
+os.environ["INSIGHTLENS_WARMUP"] = "0"
+os.environ.setdefault("INSIGHTLENS_DATA_DIR", tempfile.mkdtemp(prefix="insightlens-test-"))
+
+import httpx
+import pytest
+from app.main import app
+from app.core.llm import MockProvider
+from app.routers.insight import InsightRequest, get_llm, insight_prompt
+
+BODY = {"context": "Churn model, top feature: tenure", "query": "What drives churn?"}
+
+
+def parse_events(text):
+    """
+    Split an SSE body into (event name, data) pairs; every event must end with a blank line.
+    """
+    assert text.endswith("\n\n"), "the stream must end with a complete event"
+    events = []
+    for block in text[:-2].split("\n\n"):
+        name, data = "message", None
+        for line in block.split("\n"):
+            field, _, value = line.partition(": ")
+            assert field in ("event", "data"), f"unexpected SSE line {line!r}"
+            if field == "event":
+                name = value
+            else:
+                data = json.loads(value)
+        assert data is not None, f"event without data: {block!r}"
+        events.append((name, data))
+    return events
+
+
+async def stream_insight():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        async with client.stream("POST", "/insight/stream", json=BODY) as response:
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("text/event-stream")
+            assert response.headers["cache-control"] == "no-cache"
+            return "".join([chunk async for chunk in response.aiter_text()])
+
+
+@pytest.fixture(autouse=True)
+def mock_llm():
+    get_llm.cache_clear()
+    yield
+    get_llm.cache_clear()
+
+
+def test_stream_events():
+    events = parse_events(asyncio.run(stream_insight()))
+    tokens = [data["token"] for name, data in events[:-1] if name == "message"]
+
+    assert len(tokens) == len(events) - 1 > 1
+    assert "".join(tokens) == MockProvider._respond(insight_prompt(InsightRequest(**BODY)))
+    assert events[-1] == ("done", {"mode": "mock"})
+
+
+def test_cached_stream_is_one_token():
+    async def run():
+        return await stream_insight(), await stream_insight()
+
+    first, second = (parse_events(text) for text in asyncio.run(run()))
+    assert len(second) == 2
+    assert second[0][1]["token"] == "".join(data["token"] for _, data in first[:-1])
+    assert second[-1] == ("done", {"mode": "mock"})
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([os.path.abspath(__file__), "-q"]))
@@ -0,0 +1,148 @@
+"""
+Offline checks of the LLM client (app/core/llm.py) with the mock provider: response
+cache hits, TTL expiry and LRU eviction, shared in-flight calls, the concurrency
+cap and the timeout.
+
+Run from backend/:  python test_llm.py   (or with pytest)
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+os.environ.setdefault("INSIGHTLENS_DATA_DIR", tempfile.mkdtemp(prefix="insightlens-test-"))
+
+import pytest
+from app.core.llm import LLMClient, LLMTimeoutError, MockProvider, build_client
+
+LATENCY = 0.05
+
+
+class CountingProvider(MockProvider):
+    """
+    Mock provider that records the peak number of calls running at once.
+    """
+
+    def __init__(self, latency=LATENCY):
+        super().__init__(latency)
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def generate(self, prompt):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            return super().generate(prompt)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def test_mock_provider_from_env(monkeypatch):
+    monkeypatch.setenv("INSIGHTLENS_LLM_PROVIDER", "mock")
+    client = build_client()
+    assert client is not None and client.provider.name == "mock"
+
+
+def test_cache_hit():
+    client = LLMClient(MockProvider(LATENCY))
+
+    async def run():
+        first = await client.generate("What drives churn?")
+        start = time.perf_counter()
+        second = await client.generate("What drives churn?")
+        return first, second, time.perf_counter() - start
+
+    first, second, seconds = asyncio.run(run())
+    assert first == second
+    assert seconds < LATENCY
+    assert client.provider.calls == 1
+    assert (client.hits, client.misses) == (1, 1)
+
+
+def test_cached_stream_is_one_chunk():
+    client = LLMClient(MockProvider(LATENCY))
+
+    async def run():
+        streamed = [chunk async for chunk in client.stream("Summarize the model")]
+        return streamed, [chunk async for chunk in client.stream("Summarize the model")]
+
+    streamed, cached = asyncio.run(run())
+    assert len(streamed) > 1
+    assert cached == ["".join(streamed)]
+    assert client.provider.calls == 1
+
+
+def test_ttl_expiry():
+    client = LLMClient(MockProvider(LATENCY), cache_ttl=0.1)
+
+    async def run():
+        await client.generate("prompt")
+        assert client.cached("prompt") is not None
+        await asyncio.sleep(0.15)
+        assert client.cached("prompt") is None
+        await client.generate("prompt")
+
+    asyncio.run(run())
+    assert client.provider.calls == 2
+    assert client.stats()["cache_size"] == 1
+
+
+def test_lru_eviction():
+    client = LLMClient(MockProvider(0), cache_size=2)
+
+    async def run():
+        await client.generate("a")
+        await client.generate("b")
+        await client.generate("a") # Hit: "a" becomes the most recently used
+        await client.generate("c") # Evicts "b"
+
+    asyncio.run(run())
+    assert client.cached("a") is not None and client.cached("c") is not None
+    assert client.cached("b") is None
+    assert client.provider.calls == 3
+
+
+def test_identical_prompts_share_one_call():
+    client = LLMClient(MockProvider(LATENCY))
+
+    async def run():
+        return await asyncio.gather(*(client.generate("same prompt") for _ in range(8)))
+
+    responses = asyncio.run(run())
+    assert len(set(responses)) == 1
+    assert client.provider.calls == 1
+
+
+def test_concurrency_cap():
+    client = LLMClient(CountingProvider(), max_concurrency=2)
+
+    async def run():
+        return await asyncio.gather(*(client.generate(f"prompt {i}") for i in range(8)))
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    seconds = time.perf_counter() - start
+    assert client.provider.calls == 8
+    assert client.provider.peak == 2
+    assert seconds >= 4 * LATENCY # 8 calls, 2 at a time
+
+
+def test_timeout_still_caches():
+    client = LLMClient(MockProvider(0.3), timeout=0.05)
+
+    async def run():
+        with pytest.raises(LLMTimeoutError):
+            await client.generate("slow prompt")
+        await asyncio.sleep(0.4) # The abandoned call completes in the background
+        return await client.generate("slow prompt")
+
+    assert asyncio.run(run())
+    assert client.provider.calls == 1
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([os.path.abspath(__file__), "-q"]))
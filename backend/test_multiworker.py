@@ -0,0 +1,125 @@
+"""
+Multi-worker smoke test: shared state across uvicorn worker processes.
+
+Starts the API with INSIGHTLENS_STORE=disk on a temporary data directory, then:
+1. Two single-worker servers (separate processes, like `--workers 2` children) with
+   every step sent to the other process: upload on A, train on B, poll on A,
+   predict on B, explain on A. Uploads are parsed in the background
+   (INSIGHTLENS_ASYNC_INGEST_MB=0), so B also has to wait for A's parse.
+2. One `uvicorn --workers 3` server: repeated upload -> train -> predict flows,
+   each request on a fresh connection so the kernel spreads them over the workers.
+
+Run from backend/:  python test_multiworker.py
+"""
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import pandas as pd
+import numpy as np
+import requests
+
+HOST = "127.0.0.1"
+
+
+def start_server(port, data_dir, workers=1):
+    env = {
+        **os.environ,
+        "INSIGHTLENS_STORE": "disk",
+        "INSIGHTLENS_DATA_DIR": data_dir,
+        "INSIGHTLENS_ASYNC_INGEST_MB": "0",
+        "INSIGHTLENS_TRAIN_WORKERS": "1",
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", HOST, "--port", str(port), "--workers", str(workers)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://{HOST}:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if requests.get(url + "/", timeout=1).status_code == 200:
+                return process, url
+        except requests.ConnectionError:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def make_csv(rows=300, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"a": rng.normal(size=rows), "b": rng.normal(size=rows), "c": rng.choice(["x", "y", "z"], rows)})
+    df["target"] = (df["a"] + (df["c"] == "x") > 0).astype(int)
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False)
+    return buffer.getvalue()
+
+
+def check(label, response, failures):
+    if response.status_code == 200:
+        print(f"✅ {label}")
+    else:
+        print(f"❌ {label}: {response.status_code} {response.text[:200]}")
+        failures.append(label)
+    return response
+
+
+def flow(upload_url, train_url, poll_url, predict_url, explain_url, failures, seed=0):
+    # Connection: close forces a fresh connection per request (another worker may take it)
+    headers = {"Connection": "close"}
+    res = check("upload", requests.post(f"{upload_url}/data/upload", files={"file": ("data.csv", make_csv(seed=seed), "text/csv")}, headers=headers), failures)
+    dataset_id = res.json()["dataset_id"]
+
+    res = check("train", requests.post(f"{train_url}/train/", json={"dataset_id": dataset_id, "target_column": "target"}, headers=headers), failures)
+    job_id = res.json()["job_id"]
+
+    deadline = time.time() + 180
+    while time.time() < deadline:
+        job = requests.get(f"{poll_url}/train/jobs/{job_id}", headers=headers)
+        if job.status_code != 200 or job.json()["status"] in ("completed", "failed"):
+            break
+        time.sleep(0.5)
+    job = check("poll training job", job, failures).json()
+    if not job.get("best_model"):
+        print(f"❌ training produced no model: {job.get('models')}")
+        failures.append("training")
+        return
+
+    model_id = job["best_model"]["model_id"]
+    check("predict", requests.post(f"{predict_url}/predict/", json={"model_id": model_id, "features": {"a": 0.5, "b": -1.0, "c": "x"}}, headers=headers), failures)
+    check("explain", requests.post(f"{explain_url}/explain/", json={"model_id": model_id, "dataset_id": dataset_id}, headers=headers), failures)
+
+
+def test_multiworker():
+    failures = []
+    with tempfile.TemporaryDirectory(prefix="insightlens-multiworker-") as data_dir:
+        print("Two processes, every step on the other one")
+        servers = [start_server(8021, data_dir), start_server(8022, data_dir)]
+        try:
+            a, b = servers[0][1], servers[1][1]
+            flow(a, b, a, b, a, failures)
+        finally:
+            for process, _ in servers:
+                process.terminate()
+                process.wait()
+
+        print("uvicorn --workers 3")
+        process, url = start_server(8023, data_dir, workers=3)
+        try:
+            for i in range(3):
+                flow(url, url, url, url, url, failures, seed=i + 1)
+        finally:
+            process.terminate()
+            process.wait()
+
+    print("All checks passed" if not failures else f"Failed: {', '.join(failures)}")
+    assert not failures, failures
+
+
+if __name__ == "__main__":
+    try:
+        test_multiworker()
+    except AssertionError:
+        sys.exit(1)
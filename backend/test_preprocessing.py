@@ -0,0 +1,176 @@
+"""
+Checks of the fitted feature pipeline (app/core/preprocessing.py):
+- parity with the preprocessing it replaced: `pd.get_dummies(drop_first=True)` at
+  training time, `get_dummies` + `reindex(fill_value=0)` at prediction time;
+- frequency and target encodings of high-cardinality columns;
+- the record path (`transform_records`) against the frame path (`transform`), and
+  rows transformed together (micro-batched predictions, multi-row local
+  explanations) against the same rows one at a time, whatever keys each row has;
+all for dense and sparse encodings.
+
+Run from backend/:  python test_preprocessing.py   (or with pytest)
+"""
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+import scipy.sparse as sp
+from app.core.preprocessing import FeaturePipeline, TARGET_SMOOTHING
+
+MODES = [(encoding, high_cardinality) for encoding in ("dense", "sparse") for high_cardinality in ("drop", "frequency", "target")]
+
+# Different key sets in one batch: missing numeric, formatted, categorical and
+# high-cardinality keys, an empty row, an unseen category and an explicit None
+RECORDS = [
+    {"a": 0.5, "b": 3, "price": "$1,200", "c": "y", "code": "k7"},
+    {"a": 0.1, "b": -3},
+    {"b": 2, "c": "z", "code": "k12"},
+    {"price": "$35", "code": "unseen"},
+    {},
+    {"a": 1.5, "c": "unseen", "code": "k3"},
+    {"a": -0.2, "b": None, "price": "$0", "c": "x"},
+]
+
+
+def make_frame(rows, seed):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "a": rng.normal(size=rows),
+        "b": rng.integers(-5, 5, rows),
+        "price": [f"${v:,}" for v in rng.integers(0, 5000, rows)], # Formatted numbers
+        "c": rng.choice(["x", "y", "z", "w"], rows),
+        "grade": pd.Categorical(rng.choice(["lo", "mid", "hi"], rows), categories=["lo", "mid", "hi"]),
+        "flag": rng.random(rows) < 0.3,
+        "code": [f"k{v}" for v in rng.integers(0, 80, rows)], # High cardinality
+    })
+    y = ((df["a"] > 0) ^ (df["c"] == "y")).astype(int).to_numpy()
+    return df, y
+
+
+def dense(X):
+    return X.toarray() if sp.issparse(X) else X
+
+
+def is_text(series):
+    return pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)
+
+
+def baseline_training_matrix(df, max_categories=50):
+    """
+    The original train router: formatted numbers converted, high-cardinality text
+    columns dropped, then get_dummies(drop_first=True).
+    """
+    X = df.copy()
+    for col in X.columns:
+        if is_text(X[col]):
+            try:
+                X[col] = pd.to_numeric(X[col].astype(str).str.replace(r'[$,]', '', regex=True))
+            except ValueError:
+                pass
+    for col in X.columns:
+        if (is_text(X[col]) or isinstance(X[col].dtype, pd.CategoricalDtype)) and X[col].nunique() > max_categories:
+            X = X.drop(columns=[col])
+    return pd.get_dummies(X, drop_first=True)
+
+
+def baseline_prediction_row(record, feature_names):
+    """
+    The original predict router: get_dummies of the one-row frame, reindexed to the
+    training columns with 0 for anything missing.
+    """
+    frame = pd.get_dummies(pd.DataFrame([record])) if record else pd.DataFrame(index=[0])
+    return frame.reindex(columns=feature_names, fill_value=0)
+
+
+@pytest.mark.parametrize("encoding", ["dense", "sparse"])
+def test_get_dummies_layout_and_values(encoding):
+    df, y = make_frame(400, 0)
+    expected = baseline_training_matrix(df)
+    pipeline = FeaturePipeline(encoding=encoding)
+
+    X = pipeline.fit_transform(df, y, "classification")
+    assert pipeline.feature_names == list(expected.columns)
+    assert pipeline.dropped_columns == ["code"]
+    assert sp.issparse(X) == (encoding == "sparse")
+    np.testing.assert_array_equal(dense(X), expected.to_numpy(dtype=np.float64))
+
+    # Rows scored later (new values, same vocabulary) encode like get_dummies of the training layout
+    new, _ = make_frame(50, 1)
+    np.testing.assert_array_equal(
+        dense(pipeline.transform(new)),
+        baseline_training_matrix(pd.concat([df, new]))[-len(new):].to_numpy(dtype=np.float64),
+    )
+
+
+@pytest.mark.parametrize("encoding", ["dense", "sparse"])
+def test_records_match_baseline_prediction(encoding):
+    df, y = make_frame(400, 0)
+    pipeline = FeaturePipeline(encoding=encoding).fit(df, y, "classification")
+    # The old predict path only handled plain numbers and known categories
+    records = [
+        {"a": 0.5, "b": 3, "price": 1200, "c": "y", "grade": "hi", "flag": True},
+        {"a": 0.1, "b": -3},
+        {"b": 2, "c": "x", "grade": "lo"}, # First categories: dropped by drop_first
+        {},
+    ]
+    expected = np.vstack([
+        baseline_prediction_row(record, pipeline.feature_names).to_numpy(dtype=np.float64) for record in records
+    ])
+    np.testing.assert_array_equal(dense(pipeline.transform_records(records)), expected)
+
+
+@pytest.mark.parametrize("encoding", ["dense", "sparse"])
+@pytest.mark.parametrize("high_cardinality", ["frequency", "target"])
+def test_high_cardinality_encodings(encoding, high_cardinality):
+    df, y = make_frame(400, 0)
+    new, _ = make_frame(50, 1)
+    new.loc[0, "code"] = "unseen"
+    pipeline = FeaturePipeline(encoding=encoding, high_cardinality=high_cardinality)
+    X = dense(pipeline.fit_transform(df, y, "classification"))
+
+    name = f"code_{high_cardinality}"
+    assert pipeline.feature_names == [*baseline_training_matrix(df).columns[:4], name, *baseline_training_matrix(df).columns[4:]]
+    if high_cardinality == "frequency":
+        mapping, fallback = df["code"].value_counts(normalize=True), 0.0
+        # Frequencies do not use the target: training rows get the same values as new rows
+        np.testing.assert_allclose(X[:, 4], df["code"].map(mapping).to_numpy(dtype=np.float64))
+    else:
+        fallback = y.mean()
+        stats = pd.DataFrame({"code": df["code"], "y": y}).groupby("code")["y"].agg(["sum", "count"])
+        mapping = (stats["sum"] + TARGET_SMOOTHING * fallback) / (stats["count"] + TARGET_SMOOTHING)
+        # Training rows are encoded out of fold: never from their own label
+        assert not np.allclose(X[:, 4], df["code"].map(mapping).to_numpy(dtype=np.float64))
+
+    expected = new["code"].map(mapping).fillna(fallback).to_numpy(dtype=np.float64)
+    np.testing.assert_allclose(dense(pipeline.transform(new))[:, 4], expected)
+    # The other columns are unaffected by the encoding
+    np.testing.assert_array_equal(
+        np.delete(X, 4, axis=1), dense(FeaturePipeline(encoding=encoding).fit_transform(df, y, "classification"))
+    )
+
+
+@pytest.mark.parametrize("encoding,high_cardinality", MODES)
+def test_records_match_frame(encoding, high_cardinality):
+    df, y = make_frame(400, 0)
+    pipeline = FeaturePipeline(encoding=encoding, high_cardinality=high_cardinality).fit(df, y, "classification")
+    new, _ = make_frame(50, 1)
+    np.testing.assert_array_equal(
+        dense(pipeline.transform_records(new.to_dict(orient="records"))), dense(pipeline.transform(new))
+    )
+
+
+@pytest.mark.parametrize("encoding,high_cardinality", MODES)
+def test_batched_records_match_single_rows(encoding, high_cardinality):
+    df, y = make_frame(400, 0)
+    pipeline = FeaturePipeline(encoding=encoding, high_cardinality=high_cardinality)
+    pipeline.fit(df, y, "classification")
+
+    batched = dense(pipeline.transform_records(RECORDS))
+    single = np.vstack([dense(pipeline.transform_records([record])) for record in RECORDS])
+    assert batched.shape == (len(RECORDS), len(pipeline.feature_names))
+    np.testing.assert_array_equal(batched, single)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([os.path.abspath(__file__), "-q"]))
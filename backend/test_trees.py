@@ -0,0 +1,112 @@
+"""
+Parity check of the compiled tree-ensemble scorer (app/core/trees.py) against the
+original estimators: Random Forest and XGBoost, binary / multi-class / regression,
+with ties at split thresholds, missing values and sparse input.
+
+Run from backend/:  python test_trees.py   (or with pytest)
+"""
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+os.environ.setdefault("INSIGHTLENS_DATA_DIR", tempfile.mkdtemp(prefix="insightlens-test-"))
+
+import numpy as np
+import scipy.sparse as sp
+from app.core.training import build_estimator
+from app.core.trees import compile_model
+
+# XGBoost sums leaf values in float32; sklearn forests match exactly
+TOLERANCE = {"Random Forest": 1e-12, "XGBoost": 1e-5}
+
+
+def make_data(rows, seed, missing=0.0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(rows, 6))
+    X[:, 5] = np.round(X[:, 5], 1) # Repeated values land exactly on split thresholds
+    if missing:
+        X[rng.random(X.shape) < missing] = np.nan
+    return X
+
+
+def targets(X):
+    filled = np.nan_to_num(X)
+    return {
+        "binary": ("classification", (filled[:, 0] + filled[:, 5] > 0).astype(int)),
+        "multiclass": ("classification", np.digitize(filled[:, 0], [-0.5, 0.5])),
+        "regression": ("regression", filled[:, 0] * 3 + filled[:, 5] ** 2),
+    }
+
+
+def check_parity(model, compiled, X, tolerance, label):
+    if hasattr(model, "predict_proba"):
+        expected, actual = model.predict_proba(X), compiled.predict_proba(X)
+        labels_match = np.array_equal(model.predict(X), compiled.predict(X))
+    else:
+        expected, actual = model.predict(X), compiled.predict(X)
+        labels_match = True
+    diff = float(np.abs(expected - actual).max())
+    ok = diff <= tolerance * max(1.0, float(np.abs(expected).max())) and labels_match
+    print(f"{'✅' if ok else '❌'} {label}: max diff {diff:.2e}")
+    return ok
+
+
+def test_dense_parity():
+    ok = True
+    for missing in (0.0, 0.05):
+        X_train, X_test = make_data(3000, 0, missing), make_data(2000, 1, missing)
+        for target, (problem_type, y) in targets(X_train).items():
+            for name in ("Random Forest", "XGBoost"):
+                model = build_estimator(name, problem_type).fit(X_train, y)
+                compiled = compile_model(model)
+                ok &= check_parity(model, compiled, X_test, TOLERANCE[name], f"{name} {target} missing={missing}")
+                ok &= check_parity(model, compiled, X_test[:1], TOLERANCE[name], f"{name} {target} single row")
+    assert ok
+
+
+def test_sparse_parity():
+    ok = True
+    X = sp.random(2000, 30, density=0.1, format="csr", random_state=0)
+    y = (X.sum(axis=1).A1 > 0.3).astype(int)
+    for name in ("Random Forest", "XGBoost"):
+        # XGBoost treats unstored entries as missing, sklearn as zeros
+        model = build_estimator(name, "classification").fit(X, y)
+        ok &= check_parity(model, compile_model(model), X, TOLERANCE[name], f"{name} sparse")
+    assert ok
+
+
+def test_shared_between_threads():
+    # Small batches share the ensemble's work arrays: concurrent calls of different
+    # sizes must neither see each other's nodes nor change later results
+    X_train, X_test = make_data(3000, 0, 0.05), make_data(400, 1, 0.05)
+    y = targets(X_train)["binary"][1]
+    ok = True
+    for name in ("Random Forest", "XGBoost"):
+        model = build_estimator(name, "classification").fit(X_train, y)
+        compiled = compile_model(model)
+        batches = [X_test[i:i + size] for i, size in enumerate([1, 7, 100, 300] * 25)]
+        with ThreadPoolExecutor(8) as pool:
+            actual = list(pool.map(compiled.predict_proba, batches))
+        actual.append(compiled.predict_proba(batches[0]))
+        diff = max(float(np.abs(model.predict_proba(X) - a).max()) for X, a in zip(batches + batches[:1], actual))
+        same = diff <= TOLERANCE[name]
+        print(f"{'✅' if same else '❌'} {name} concurrent batches: max diff {diff:.2e}")
+        ok &= same
+    assert ok
+
+
+def test_unsupported_models():
+    X = make_data(200, 0)
+    model = build_estimator("Logistic Regression", "classification").fit(X, X[:, 0] > 0)
+    assert compile_model(model) is None
+
+
+if __name__ == "__main__":
+    failed = False
+    for test in (test_dense_parity, test_sparse_parity, test_shared_between_threads, test_unsupported_models):
+        try:
+            test()
+        except AssertionError:
+            failed = True
+    print("All parity checks passed" if not failed else "Parity checks failed")
+    sys.exit(1 if failed else 0)
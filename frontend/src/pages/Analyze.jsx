@@ -13,6 +13,7 @@ const COLORS = ['#007AFF', '#5856D6', '#FF2D55', '#FF9500', '#FFCC00', '#4CD964'
 const Analyze = () => {
     const [datasetId, setDatasetId] = useState(null);
     const [profile, setProfile] = useState(null);
+    const [correlations, setCorrelations] = useState(null);
     const [loading, setLoading] = useState(false);
     const [error, setError] = useState(null);
 
@@ -43,6 +44,10 @@ const Analyze = () => {
                 }
             })
             .catch(err => console.error(err));
+        // Full matrix for the heatmap (refused for very wide datasets)
+        axios.get(`http://localhost:8000/data/correlations/${id}?full=true`)
+            .then(res => setCorrelations(res.data.columns.length ? res.data : null))
+            .catch(() => setCorrelations(null));
     };
 
     useEffect(() => {
@@ -226,23 +231,23 @@ const Analyze = () => {
                     </div>
 
                     {/* Correlation Heatmap */}
-                    {profile.correlations && (
+                    {correlations && (
                         <motion.div className="bg-white p-6 rounded-2xl shadow-sm border border-gray-100 overflow-x-auto">
                             <h3 className="text-lg font-semibold text-gray-900 mb-4">Correlation Matrix</h3>
                             <div className="min-w-max">
                                 <div className="flex">
                                     <div className="w-24"></div>
-                                    {Object.keys(profile.correlations).map(col => (
+                                    {correlations.columns.map(col => (
                                         <div key={col} className="w-24 text-xs font-medium text-gray-500 text-center rotate-45 origin-bottom-left transform translate-x-4 mb-8">
                                             {col.length > 10 ? col.substring(0, 10) + '...' : col}
                                         </div>
                                     ))}
                                 </div>
-                                {Object.keys(profile.correlations).map(row => (
+                                {correlations.columns.map((row, i) => (
                                     <div key={row} className="flex items-center">
                                         <div className="w-24 text-xs font-medium text-gray-500 truncate" title={row}>{row}</div>
-                                        {Object.keys(profile.correlations).map(col => {
-                                            const val = profile.correlations[row][col];
+                                        {correlations.columns.map((col, j) => {
+                                            const val = correlations.matrix[i][j] ?? 0;
                                             return (
                                                 <div
                                                     key={`${row}-${col}`}
@@ -52,11 +52,37 @@ const Explain = () => {
         try {
             const topFeatures = importanceData.slice(0, 3).map(f => f.feature).join(', ');
             const context = `Top 3 important features are: ${topFeatures}.`;
-            const res = await axios.post('http://localhost:8000/insight/', {
-                context: context,
-                query: "What do these features imply? Provide a brief narrative."
+            // Server-Sent Events: render tokens as the model writes them
+            const res = await fetch('http://localhost:8000/insight/stream', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    context: context,
+                    query: "What do these features imply? Provide a brief narrative."
+                })
             });
-            setAiSummary(res.data.response);
+            const reader = res.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let text = '';
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                const events = buffer.split('\n\n');
+                buffer = events.pop();
+                for (const event of events) {
+                    const dataLine = event.split('\n').find(line => line.startsWith('data: '));
+                    if (!dataLine) continue;
+                    const data = JSON.parse(dataLine.slice(6));
+                    if (event.startsWith('event: error')) {
+                        text += data.detail;
+                    } else if (data.token !== undefined) {
+                        text += data.token;
+                    }
+                    setAiSummary(text);
+                }
+            }
         } catch (err) {
             console.error("AI Summary failed", err);
         }
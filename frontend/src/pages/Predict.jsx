@@ -8,6 +8,7 @@ const Predict = () => {
     const [columns, setColumns] = useState([]);
     const [formData, setFormData] = useState({});
     const [prediction, setPrediction] = useState(null);
+    const [explanation, setExplanation] = useState(null);
     const [loading, setLoading] = useState(false);
     const [error, setError] = useState(null);
 
@@ -53,6 +54,7 @@ const Predict = () => {
         setLoading(true);
         setError(null);
         setPrediction(null);
+        setExplanation(null);
 
         // Convert types (simple heuristic: if it looks like a number, parse it)
         const features = {};
@@ -70,6 +72,14 @@ const Predict = () => {
                 features: features
             });
             setPrediction(res.data);
+
+            // Why this prediction: per-feature SHAP contributions (best effort)
+            axios.post('http://localhost:8000/explain/local', {
+                model_id: modelId,
+                features: features
+            })
+                .then(r => setExplanation(r.data.explanations[0]))
+                .catch(err => console.error("Local explanation failed", err));
         } catch (err) {
             setError("Prediction failed. " + (err.response?.data?.detail || err.message));
         } finally {
@@ -161,6 +171,19 @@ const Predict = () => {
                             Confidence: {(Math.max(...prediction.probabilities) * 100).toFixed(1)}%
                         </div>
                     )}
+                    {explanation && (
+                        <div className="mt-6 text-left max-w-md mx-auto">
+                            <h4 className="text-sm font-medium text-gray-300 mb-2">Top contributing features</h4>
+                            {explanation.contributions.slice(0, 5).map(c => (
+                                <div key={c.feature} className="flex justify-between text-sm py-1 border-b border-gray-800">
+                                    <span className="text-gray-400">{c.feature}</span>
+                                    <span className={c.value >= 0 ? 'text-emerald-400' : 'text-rose-400'}>
+                                        {c.value >= 0 ? '+' : ''}{c.value.toFixed(3)}
+                                    </span>
+                                </div>
+                            ))}
+                        </div>
+                    )}
                 </motion.div>
             )}
 
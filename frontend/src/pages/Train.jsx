@@ -9,7 +9,10 @@ const Train = () => {
     const [columns, setColumns] = useState([]);
     const [loading, setLoading] = useState(false);
     const [results, setResults] = useState(null);
+    const [progress, setProgress] = useState(null);
     const [error, setError] = useState(null);
+    const [search, setSearch] = useState(false);
+    const [fast, setFast] = useState(false);
 
     useEffect(() => {
         const id = localStorage.getItem('dataset_id');
@@ -22,21 +25,43 @@ const Train = () => {
         }
     }, []);
 
+    const pollJob = async (jobId) => {
+        // Training runs in a background job; poll until every model has finished
+        while (true) {
+            const res = await axios.get(`http://localhost:8000/train/jobs/${jobId}`);
+            setProgress(res.data);
+            if (res.data.status === 'completed' || res.data.status === 'failed') {
+                return res.data;
+            }
+            await new Promise(resolve => setTimeout(resolve, 1000));
+        }
+    };
+
     const handleTrain = async () => {
         if (!datasetId || !targetColumn) return;
         setLoading(true);
         setError(null);
+        setResults(null);
+        setProgress(null);
 
         try {
             const res = await axios.post('http://localhost:8000/train/', {
                 dataset_id: datasetId,
                 target_column: targetColumn,
                 // problem_type auto-detected
+                search: search,
+                fast: fast,
             });
-            setResults(res.data);
+            const job = await pollJob(res.data.job_id);
+            if (job.status === 'failed') {
+                const reasons = job.models.map(m => `${m.model}: ${m.error}`).join('; ');
+                setError("Training failed. " + reasons);
+                return;
+            }
+            setResults(job);
             // Auto-save best model ID for explainability
-            if (res.data.best_model) {
-                localStorage.setItem('best_model_id', res.data.best_model.model_id);
+            if (job.best_model) {
+                localStorage.setItem('best_model_id', job.best_model.model_id);
             }
         } catch (err) {
             setError("Training failed. " + (err.response?.data?.detail || err.message));
@@ -71,6 +96,24 @@ const Train = () => {
                             {columns.map(col => <option key={col} value={col}>{col}</option>)}
                         </select>
                     </div>
+                    <label className="flex items-center gap-2 text-sm text-gray-700 pb-2.5">
+                        <input
+                            type="checkbox"
+                            checked={search}
+                            onChange={(e) => setSearch(e.target.checked)}
+                            className="rounded border-gray-300"
+                        />
+                        Tune hyperparameters (cross-validated, ~1 min)
+                    </label>
+                    <label className="flex items-center gap-2 text-sm text-gray-700 pb-2.5">
+                        <input
+                            type="checkbox"
+                            checked={fast}
+                            onChange={(e) => setFast(e.target.checked)}
+                            className="rounded border-gray-300"
+                        />
+                        Fast leaderboard (sample large datasets)
+                    </label>
                     <button
                         onClick={handleTrain}
                         disabled={loading || !targetColumn}
@@ -88,6 +131,15 @@ const Train = () => {
                 <div className="flex flex-col items-center justify-center py-12">
                     <div className="w-12 h-12 border-4 border-indigo-600 border-t-transparent rounded-full animate-spin"></div>
                     <p className="mt-4 text-gray-600 font-medium">Training Logistic Regression, Random Forest, and XGBoost...</p>
+                    {progress && (
+                        <div className="mt-4 flex flex-wrap justify-center gap-2">
+                            {progress.models.map(m => (
+                                <span key={m.model} className="px-3 py-1 text-xs rounded-full bg-gray-100 text-gray-700">
+                                    {m.model}: {m.status}
+                                </span>
+                            ))}
+                        </div>
+                    )}
                 </div>
             )}
 
@@ -199,6 +251,9 @@ const Train = () => {
                                                 ) : (
                                                     <span>MSE: <span className="font-medium text-gray-700">{res.mse.toFixed(3)}</span></span>
                                                 )}
+                                                {res.cv_mean != null && (
+                                                    <span>CV: <span className="font-medium text-gray-700">{res.cv_mean.toFixed(3)} ± {Math.sqrt(res.cv_variance).toFixed(3)}</span></span>
+                                                )}
                                             </div>
                                         </motion.div>
                                     );